@@ -0,0 +1,120 @@
+# analysis_windows.py - Date windows for multi-window analyses
+"""
+Date windows for LocationAnalyzer.analyze_windows(), which parses and
+geocodes a file once and reports on every window from the same points.
+
+Windows can be given as AnalysisWindow objects, (name, start, end) tuples,
+(start, end) tuples or {"name", "start", "end"} dicts, with ISO date strings
+or date objects. The helpers below build the usual reporting periods:
+
+    period_windows(start, end, "year")       2023, 2024, ...
+    period_windows(start, end, "quarter")    2024-Q1, 2024-Q2, ...
+    period_windows(start, end, "month")      2024-01, 2024-02, ...
+    tax_year_windows(start, end)             tax years starting 6 April (UK default)
+
+Windows are clipped to start..end, so the first and last may be partial.
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable, List
+
+
+@dataclass(frozen=True)
+class AnalysisWindow:
+    """One reporting period; start and end dates are both inclusive"""
+    name: str
+    start_date: date
+    end_date: date
+
+    @property
+    def directory_name(self) -> str:
+        """File-system safe form of the name, used for the window's output directory"""
+        return re.sub(r"[^A-Za-z0-9._-]+", "_", self.name).strip("_") or "window"
+
+
+def _as_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value), "%Y-%m-%d").date()
+
+
+def normalize_windows(windows: Iterable) -> List[AnalysisWindow]:
+    """AnalysisWindow list from any of the accepted forms; raises ValueError on bad input"""
+    normalized = []
+    for window in windows:
+        if isinstance(window, AnalysisWindow):
+            normalized.append(window)
+            continue
+        if isinstance(window, dict):
+            name, start, end = window.get("name"), window["start"], window["end"]
+        elif len(window) == 3:
+            name, start, end = window
+        else:
+            name, (start, end) = None, window
+        start, end = _as_date(start), _as_date(end)
+        normalized.append(AnalysisWindow(name or f"{start.isoformat()}_{end.isoformat()}", start, end))
+
+    if not normalized:
+        raise ValueError("At least one date window is required")
+    names = set()
+    for window in normalized:
+        if window.start_date > window.end_date:
+            raise ValueError(f"Window {window.name} starts after it ends")
+        if window.directory_name in names:
+            raise ValueError(f"Duplicate window name {window.name}")
+        names.add(window.directory_name)
+    return normalized
+
+
+def _clipped(name: str, start: date, end: date, first: date, last: date):
+    if end >= first and start <= last:
+        return AnalysisWindow(name, max(start, first), min(end, last))
+    return None
+
+
+def period_windows(start_date, end_date, period: str = "year") -> List[AnalysisWindow]:
+    """Calendar years, quarters or months covering start_date..end_date"""
+    first, last = _as_date(start_date), _as_date(end_date)
+    months = {"year": 12, "quarter": 3, "month": 1}.get(period)
+    if months is None:
+        raise ValueError(f"Unknown period {period!r}; use year, quarter or month")
+
+    windows = []
+    year, month = first.year, (first.month - 1) // months * months + 1
+    while date(year, month, 1) <= last:
+        next_year, next_month = (year + 1, 1) if month + months > 12 else (year, month + months)
+        if period == "year":
+            name = str(year)
+        elif period == "quarter":
+            name = f"{year}-Q{(month - 1) // 3 + 1}"
+        else:
+            name = f"{year}-{month:02d}"
+        window = _clipped(name, date(year, month, 1), date(next_year, next_month, 1) - timedelta(days=1), first, last)
+        if window:
+            windows.append(window)
+        year, month = next_year, next_month
+    return windows
+
+
+def tax_year_windows(start_date, end_date, start_month: int = 4, start_day: int = 6) -> List[AnalysisWindow]:
+    """
+    Tax years covering start_date..end_date. A tax year starting on
+    6 April 2024 is named "2024-25"; pass start_month=1, start_day=1 for
+    calendar tax years.
+    """
+    first, last = _as_date(start_date), _as_date(end_date)
+    year = first.year if first >= date(first.year, start_month, start_day) else first.year - 1
+    windows = []
+    while date(year, start_month, start_day) <= last:
+        begins = date(year, start_month, start_day)
+        ends = date(year + 1, start_month, start_day) - timedelta(days=1)
+        name = str(year) if (start_month, start_day) == (1, 1) else f"{year}-{(year + 1) % 100:02d}"
+        window = _clipped(name, begins, ends, first, last)
+        if window:
+            windows.append(window)
+        year += 1
+    return windows
@@ -5,6 +5,7 @@ from datetime import date, datetime
 import traceback
 import sys
 import os
+from analysis_windows import normalize_windows
 
 # Reduce initial verbose output
 PSUTIL_AVAILABLE = False
@@ -41,7 +42,7 @@ NEW_ANALYZER_AVAILABLE = False
 OLD_ANALYZER_AVAILABLE = False
 
 try:
-    from location_analyzer import LocationAnalyzer, AnalysisConfig
+    from location_analyzer import LocationAnalyzer, AnalysisConfig, AnalysisCancelled
     NEW_ANALYZER_AVAILABLE = True
 except ImportError:
     pass  # Silently handle missing dependencies
@@ -52,12 +53,29 @@ try:
 except ImportError:
     pass
 
+# Bump when a change alters analysis results; the web app's result cache is keyed on it
+ENGINE_VERSION = 1
+
+def engine_version():
+    """Analyzer that keyed (Geoapify) analyses are routed to, with ENGINE_VERSION"""
+    engine = "location_analyzer" if NEW_ANALYZER_AVAILABLE else "legacy_analyzer"
+    return f"{engine}-{ENGINE_VERSION}"
+
 def process_location_file(file_path, start_date, end_date, output_dir, group_by,
                          geoapify_key, google_key, onwater_key, delay, batch_size,
-                         log_func, cancel_check, include_distance=True):
+                         log_func, cancel_check, include_distance=True, dataset_id=None,
+                         checkpoint_dir=None, shard_workers=0, pipeline_mode=False):
     """
     Main bridge function that routes to the best available analyzer.
     Maintains full compatibility with existing GUI.
+    Passing dataset_id makes the new analyzer reuse per-day aggregates stored
+    for that dataset by earlier runs (see daily_aggregates.py).
+    Passing checkpoint_dir makes the new analyzer checkpoint its stages there
+    and continue an interrupted run with the same arguments (see run_checkpoint.py).
+    shard_workers > 1 makes the new analyzer process month shards across that
+    many worker processes, with the same results (see sharded_analysis.py).
+    pipeline_mode makes the new analyzer parse, filter and geocode as one
+    streaming pipeline, with the same results (see LocationAnalyzer._run_pipeline).
     """
     
     # CRITICAL FIX: Ensure dates are date objects, not strings
@@ -72,7 +90,10 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
     # Determine best analyzer with minimal logging
     if NEW_ANALYZER_AVAILABLE and geoapify_key.strip():
         return run_new_analyzer(file_path, start_date, end_date, output_dir, 
-                               geoapify_key, google_key, delay, log_func, cancel_check)
+                               geoapify_key, google_key, delay, log_func, cancel_check,
+                               onwater_key=onwater_key, dataset_id=dataset_id,
+                               checkpoint_dir=checkpoint_dir, shard_workers=shard_workers,
+                               pipeline_mode=pipeline_mode)
     elif OLD_ANALYZER_AVAILABLE:
         return run_old_analyzer(file_path, start_date, end_date, output_dir, group_by,
                                geoapify_key, google_key, onwater_key, delay, batch_size,
@@ -81,103 +102,170 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
         log_func("ERROR: No analyzer available! Install requirements: pip install aiohttp pandas")
         return {}
 
+def new_analyzer_log_filter(log_func):
+    """Log function for the new analyzer that only passes the important messages on"""
+    def filtered_log(msg):
+        # Filter out verbose debug messages
+        if any(skip in msg for skip in [
+            '🚀', '📍', '📊', '📈', '✅', '🔍', '🌍', '💾', '🗺️', '🏃',
+            'About to call', 'Method type:', 'Method module:', 'returned',
+            'Progress:', 'Parsing'
+        ]):
+            return  # Skip verbose messages
+        
+        # Only pass important messages to the original log function
+        if any(keep in msg for keep in [
+            'Starting analysis', 'Found', 'Filtered', 'filtered', 'Geocoded', 
+            'Total distance', 'Total jumps', 'Classified', 'exported', 'complete', 'Resuming',
+            'cancelled', 'miles'
+        ]):
+            log_func(msg)
+    return filtered_log
+
+def new_analyzer(geoapify_key, google_key, onwater_key, delay, log_func, cancel_check, **settings):
+    """LocationAnalyzer configured the way the bridge runs it, logging through log_func"""
+    config = AnalysisConfig(
+        geoapify_key=geoapify_key,
+        google_key=google_key,
+        onwater_key=onwater_key,
+        api_delay=max(0.1, delay/3),
+        min_distance_filter=0.5,
+        max_concurrent_requests=8,
+        **settings
+    )
+    
+    # cancel_check is polled inside parsing, geocoding and water probes
+    analyzer = LocationAnalyzer(config, cancel_check=cancel_check if callable(cancel_check) else None)
+    
+    # Override analyzer logging
+    if hasattr(analyzer, '_log'):
+        analyzer._original_log = analyzer._log
+        analyzer._log = new_analyzer_log_filter(log_func)
+    return analyzer
+
+def run_in_new_thread(make_coroutine, log_func, cancel_check):
+    """
+    Run the coroutine from make_coroutine() on a fresh event loop in its own
+    thread (thread-safe from GUI and Flask worker threads). Returns {} when
+    the run is cancelled or fails; exceptions outside the run are re-raised.
+    """
+    def run_in_thread():
+        try:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            
+            async def analysis_with_cancellation():
+                if hasattr(cancel_check, '__call__') and cancel_check():
+                    return {}
+                return await make_coroutine()
+            
+            return loop.run_until_complete(analysis_with_cancellation())
+        except AnalysisCancelled:
+            log_func("❌ Analysis cancelled")
+            return {}
+        except Exception as e:
+            log_func(f"ERROR: Analysis failed: {e}")
+            return {}
+        finally:
+            loop.close()
+    
+    # Execute in separate thread
+    result_container = [{}]
+    exception_container = [None]
+    
+    def thread_target():
+        try:
+            result_container[0] = run_in_thread()
+        except Exception as e:
+            exception_container[0] = e
+    
+    thread = threading.Thread(target=thread_target)
+    thread.daemon = True
+    thread.start()
+    thread.join()
+    
+    if exception_container[0]:
+        raise exception_container[0]
+    
+    return result_container[0]
+
 def run_new_analyzer(file_path, start_date, end_date, output_dir, 
-                    geoapify_key, google_key, delay, log_func, cancel_check):
+                    geoapify_key, google_key, delay, log_func, cancel_check, onwater_key="", dataset_id=None,
+                    checkpoint_dir=None, shard_workers=0, pipeline_mode=False):
     """Run the new async analyzer in a thread-safe way"""
     try:
         # Ensure dates are date objects
         start_date = ensure_date_object(start_date)
         end_date = ensure_date_object(end_date)
         
-        # Create configuration
-        config = AnalysisConfig(
-            geoapify_key=geoapify_key,
-            google_key=google_key,
-            api_delay=max(0.1, delay/3),
-            min_distance_filter=0.5,
-            max_concurrent_requests=8
-        )
+        analyzer = new_analyzer(geoapify_key, google_key, onwater_key, delay, log_func, cancel_check,
+                                incremental_aggregates=dataset_id is not None,
+                                shard_workers=shard_workers,
+                                pipeline_mode=pipeline_mode)
         
-        analyzer = LocationAnalyzer(config)
-        
-        # Create a filtered log function to reduce verbosity
-        def filtered_log(msg):
-            # Filter out verbose debug messages
-            if any(skip in msg for skip in [
-                '🚀', '📍', '📊', '📈', '✅', '🔍', '🌍', '💾', '🗺️', '🏃',
-                'About to call', 'Method type:', 'Method module:', 'returned',
-                'Progress:', 'Parsing'
-            ]):
-                return  # Skip verbose messages
-            
-            # Only pass important messages to the original log function
-            if any(keep in msg for keep in [
-                'Starting analysis', 'Found', 'Filtered', 'Geocoded', 
-                'Total distance', 'Total jumps', 'exported', 'complete'
-            ]):
-                log_func(msg)
-        
-        # Override analyzer logging
-        if hasattr(analyzer, '_log'):
-            analyzer._original_log = analyzer._log
-            analyzer._log = filtered_log
-        
-        # Run analysis in new event loop (thread-safe)
-        def run_in_thread():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                async def analysis_with_cancellation():
-                    if hasattr(cancel_check, '__call__') and cancel_check():
-                        return {}
-                    
-                    result = await analyzer.analyze_location_history(
-                        file_path=file_path,
-                        start_date=start_date,
-                        end_date=end_date,
-                        output_dir=output_dir
-                    )
-                    return result
-                
-                return loop.run_until_complete(analysis_with_cancellation())
-            except Exception as e:
-                log_func(f"ERROR: Analysis failed: {e}")
-                return {}
-            finally:
-                loop.close()
-        
-        # Execute in separate thread
-        result_container = [{}]
-        exception_container = [None]
-        
-        def thread_target():
-            try:
-                result_container[0] = run_in_thread()
-            except Exception as e:
-                exception_container[0] = e
-        
-        thread = threading.Thread(target=thread_target)
-        thread.daemon = True
-        thread.start()
-        thread.join()
-        
-        if exception_container[0]:
-            raise exception_container[0]
-        
-        result = result_container[0]
-        return result
+        return run_in_new_thread(
+            lambda: analyzer.analyze_location_history(
+                file_path=file_path,
+                start_date=start_date,
+                end_date=end_date,
+                output_dir=output_dir,
+                dataset_id=dataset_id,
+                checkpoint_dir=checkpoint_dir
+            ),
+            log_func, cancel_check)
         
     except Exception as e:
         log_func(f"ERROR: NEW analyzer failed: {e}")
         
+        # A cancelled run stays cancelled; don't start the legacy engine instead
+        if callable(cancel_check) and cancel_check():
+            return {}
+        
         # Try fallback if available
         if OLD_ANALYZER_AVAILABLE:
             return run_old_analyzer(file_path, start_date, end_date, output_dir, "city",
-                                  geoapify_key, google_key, "", delay, 1,
+                                  geoapify_key, google_key, onwater_key, delay, 1,
                                   log_func, cancel_check, True)
         return {}
 
+def process_location_windows(file_path, windows, output_root, geoapify_key, google_key, onwater_key,
+                             delay, log_func, cancel_check):
+    """
+    Analyze several date windows of one file (see analysis_windows.py), each
+    into output_root/<window name>/. The new analyzer parses and geocodes the
+    file once for all windows; the legacy analyzer runs once per window.
+    Returns {window name: result}.
+    """
+    windows = normalize_windows(windows)
+    if hasattr(cancel_check, '__call__') and cancel_check():
+        log_func("Analysis cancelled before start")
+        return {}
+    
+    if NEW_ANALYZER_AVAILABLE and geoapify_key.strip():
+        try:
+            analyzer = new_analyzer(geoapify_key, google_key, onwater_key, delay, log_func, cancel_check)
+            result = run_in_new_thread(lambda: analyzer.analyze_windows(file_path, windows, output_root),
+                                       log_func, cancel_check)
+            return result.get('windows', {})
+        except Exception as e:
+            log_func(f"ERROR: NEW analyzer failed: {e}")
+            if callable(cancel_check) and cancel_check():
+                return {}
+    
+    if not OLD_ANALYZER_AVAILABLE:
+        log_func("ERROR: No analyzer available! Install requirements: pip install aiohttp pandas")
+        return {}
+    results = {}
+    for window in windows:
+        if callable(cancel_check) and cancel_check():
+            break
+        output_dir = os.path.join(output_root, window.directory_name)
+        os.makedirs(output_dir, exist_ok=True)
+        results[window.name] = run_old_analyzer(file_path, window.start_date, window.end_date, output_dir, "by_city",
+                                                geoapify_key, google_key, onwater_key, delay, 1,
+                                                log_func, cancel_check, True)
+    return results
+
 def run_old_analyzer(file_path, start_date, end_date, output_dir, group_by,
                     geoapify_key, google_key, onwater_key, delay, batch_size,
                     log_func, cancel_check, include_distance=True):
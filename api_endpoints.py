@@ -0,0 +1,35 @@
+# api_endpoints.py - Base URLs of the external geocoding and water-check APIs
+"""
+Both engines build their request URLs from these helpers, so every API can
+be pointed at another host (for example the local stand-in in
+benchmarks/mock_geocoder.py) through an environment variable:
+
+    LOCATION_ANALYZER_GEOAPIFY_URL   default https://api.geoapify.com
+    LOCATION_ANALYZER_GOOGLE_URL     default https://maps.googleapis.com
+    LOCATION_ANALYZER_ONWATER_URL    default https://isitwater-com.p.rapidapi.com
+
+The variables are read on every call, so a process that sets them after
+importing the engines still picks them up.
+"""
+
+import os
+
+GEOAPIFY_BASE_URL = "https://api.geoapify.com"
+GOOGLE_BASE_URL = "https://maps.googleapis.com"
+ONWATER_BASE_URL = "https://isitwater-com.p.rapidapi.com"
+
+
+def _url(variable: str, default: str, path: str) -> str:
+    return os.environ.get(variable, default).rstrip("/") + path
+
+
+def geoapify_url(path: str) -> str:
+    return _url("LOCATION_ANALYZER_GEOAPIFY_URL", GEOAPIFY_BASE_URL, path)
+
+
+def google_url(path: str) -> str:
+    return _url("LOCATION_ANALYZER_GOOGLE_URL", GOOGLE_BASE_URL, path)
+
+
+def onwater_url(path: str = "/") -> str:
+    return _url("LOCATION_ANALYZER_ONWATER_URL", ONWATER_BASE_URL, path)
@@ -1,5 +1,5 @@
 # app.py - Enhanced Flask Application with Real-time Processing Feedback (Final Version)
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, Response
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, Response, session
 import os
 import json
 from datetime import date, datetime
@@ -9,34 +9,138 @@ import traceback
 import threading
 import time
 import uuid
+from collections import OrderedDict
 
 # Add current directory to path to import our modules
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from analyzer_bridge import process_location_file
+    from analyzer_bridge import process_location_file, engine_version
     ANALYZER_AVAILABLE = True
     print("SUCCESS: Location analyzer imported")
 except ImportError as e:
     print(f"WARNING: Could not import analyzer: {e}")
     ANALYZER_AVAILABLE = False
 
+from run_checkpoint import load_checkpoint
+from job_queue import JobScheduler, QueueFull
+from process_workers import thread_worker
+from progress_log import ProgressLog
+from retention import ResultArchive, Sweeper, evict_finished, remove_paths, select_expired, stale_entries
+from upload_store import RecentUploads, ResultCache, key_fingerprint, resolved_places, result_key, save_upload
+from input_sources import SUPPORTED_SUFFIXES, ZSTD_AVAILABLE, input_suffix
+from chunked_uploads import ChunkedUploadStore, UnknownUpload, UploadError
+
 app = Flask(__name__)
 app.secret_key = 'change-this-secret-key-in-production'
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['OUTPUT_FOLDER'] = 'outputs'
-app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['RUN_FOLDER'] = 'runs'  # per-analysis checkpoints for resuming interrupted runs
+app.config['ARCHIVE_FOLDER'] = 'archive'  # records of finished analyses, served once they leave memory
+app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size (per request)
+# Larger files are sent in chunks (see chunked_uploads.py), assembled here up to the upload limit
+app.config['CHUNK_FOLDER'] = 'upload_sessions'
+app.config['UPLOAD_CHUNK_MB'] = int(os.environ.get('LOCATION_ANALYZER_UPLOAD_CHUNK_MB', 8))
+app.config['MAX_UPLOAD_GB'] = float(os.environ.get('LOCATION_ANALYZER_MAX_UPLOAD_GB', 10))
+app.config['UPLOAD_SESSION_HOURS'] = float(os.environ.get('LOCATION_ANALYZER_UPLOAD_SESSION_HOURS', 24))
+# Analyses run on a fixed worker pool; uploads beyond the queue size are turned away
+app.config['ANALYSIS_WORKERS'] = int(os.environ.get('LOCATION_ANALYZER_WORKERS', 2))
+app.config['ANALYSIS_QUEUE_SIZE'] = int(os.environ.get('LOCATION_ANALYZER_QUEUE_SIZE', 20))
+app.config['ANALYSIS_QUEUE_PER_USER'] = int(os.environ.get('LOCATION_ANALYZER_QUEUE_PER_USER', 5))
+# Each worker runs its analyses in a child process, replaced after this many jobs (0 = analyze in-thread)
+app.config['ANALYSIS_PROCESS_JOBS'] = int(os.environ.get('LOCATION_ANALYZER_PROCESS_JOBS', 10))
+# Log lines kept in memory per analysis; older ones go to progress.log in its output folder
+app.config['PROGRESS_LOG_LINES'] = int(os.environ.get('LOCATION_ANALYZER_PROGRESS_LOG_LINES', 500))
+# Retention of finished analyses (0 = no limit): kept in memory, kept on disk, and for how long
+app.config['RESULTS_IN_MEMORY'] = int(os.environ.get('LOCATION_ANALYZER_RESULTS_IN_MEMORY', 50))
+app.config['MAX_RESULTS'] = int(os.environ.get('LOCATION_ANALYZER_MAX_RESULTS', 200))
+app.config['RESULT_TTL_HOURS'] = float(os.environ.get('LOCATION_ANALYZER_RESULT_TTL_HOURS', 168))
+app.config['CLEANUP_INTERVAL'] = int(os.environ.get('LOCATION_ANALYZER_CLEANUP_INTERVAL', 600))  # seconds
 
 # Config file for web app settings
 WEB_CONFIG_FILE = "config/web_config.json"
 
-# Global storage for analysis progress
-analysis_progress = {}
+# Global storage for analysis progress, least recently used first
+analysis_progress = OrderedDict()
+progress_lock = threading.Lock()
+
+# Cancel flags of running analyses, set by /cancel/<analysis_id>
+cancel_events = {}
+
+# Wakes the /progress/<analysis_id>/stream generators whenever any analysis logs or changes state
+progress_changed = threading.Condition()
+progress_version = 0
+STREAM_KEEPALIVE = 15  # seconds between keep-alive comments on an idle progress stream
+
+# Queued and running analyses (see job_queue.py)
+scheduler = JobScheduler(app.config['ANALYSIS_WORKERS'], app.config['ANALYSIS_QUEUE_SIZE'],
+                         app.config['ANALYSIS_QUEUE_PER_USER'])
+
+# Finished analyses, including those no longer in analysis_progress (set up by start_services)
+result_archive = None
+
+# Chunked upload sessions, resumable across reconnects and restarts (set up by start_services)
+upload_sessions = None
+
+# Result key -> analysis that produced (or is producing) it, rebuilt from the archive on start
+result_cache = ResultCache()
+# Held from the result cache lookup until a new analysis is registered under its key,
+# so identical uploads arriving together queue one analysis and attach to it
+analysis_start_lock = threading.Lock()
+
+# When stored uploads were last (re-)uploaded; the retention sweep keeps them for the TTL
+recent_uploads = RecentUploads()
 
-# Ensure directories exist
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
-os.makedirs('config', exist_ok=True)
+# Periodic retention sweep (started by start_services)
+sweeper = None
+services_lock = threading.Lock()
+services_started = False
+
+# Analysis parameters the web app uses for every upload (part of the result cache key)
+WEB_ANALYSIS_SETTINGS = {
+    'group_by': 'by_city',
+    'include_distance': True,
+    'delay': 0.1,
+    'batch_size': 1
+}
+
+# Fields of a finished analysis kept in its archive record
+ARCHIVED_FIELDS = ('status', 'message', 'progress', 'result', 'output_dir', 'generated_files', 'error',
+                   'resumable', 'complete', 'filename', 'date_range', 'queue_wait_s', 'cacheable')
+
+def start_services():
+    """
+    Create the folders, load the result archive and start the retention sweep.
+    Runs once, before the first request the server handles: worker processes
+    re-import this module as __mp_main__ and must not sweep files with
+    their own, empty view of the running analyses.
+    """
+    global result_archive, upload_sessions, sweeper, services_started
+    with services_lock:
+        if services_started:
+            return
+        
+        # Ensure directories exist
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['OUTPUT_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['RUN_FOLDER'], exist_ok=True)
+        os.makedirs('config', exist_ok=True)
+        
+        result_archive = ResultArchive(app.config['ARCHIVE_FOLDER'])
+        upload_sessions = ChunkedUploadStore(app.config['CHUNK_FOLDER'], app.config['UPLOAD_CHUNK_MB'] * 1024 * 1024,
+                                             int(app.config['MAX_UPLOAD_GB'] * 1024 ** 3))
+        for archived_id, archived in result_archive.records().items():
+            if archived.get('cache_key') and archived.get('status') == 'completed' and archived.get('cacheable'):
+                result_cache.put(archived['cache_key'], archived_id)
+        
+        sweeper = Sweeper(sweep_results, app.config['CLEANUP_INTERVAL'])
+        sweeper.start()
+        services_started = True
+
+@app.before_request
+def ensure_services():
+    if not services_started:
+        start_services()
 
 def load_web_config():
     """Load web app configuration"""
@@ -69,6 +173,128 @@ def parse_date_string(date_str):
         return date.today()
     return date.today()
 
+def run_dir_for(analysis_id):
+    """Checkpoint directory of an analysis, or None for ids that aren't ours"""
+    try:
+        return os.path.join(app.config['RUN_FOLDER'], str(uuid.UUID(analysis_id)))
+    except ValueError:
+        return None
+
+def resumable_checkpoint(analysis_id):
+    """Checkpoint of an analysis that stopped before completing, else None"""
+    run_dir = run_dir_for(analysis_id)
+    checkpoint = load_checkpoint(run_dir) if run_dir else None
+    if checkpoint is None or checkpoint.stage == 'complete':
+        return None
+    return checkpoint
+
+def notify_progress():
+    """Tell open progress streams that something changed"""
+    global progress_version
+    with progress_changed:
+        progress_version += 1
+        progress_changed.notify_all()
+
+def update_progress(analysis_id, fields):
+    """Update an analysis' progress entry and push the change to its streams"""
+    analysis_progress[analysis_id].update(fields)
+    notify_progress()
+
+def progress_state(analysis_id):
+    """Progress entry without its logs, with the queue position of a waiting analysis"""
+    state = {key: value for key, value in analysis_progress[analysis_id].items() if key not in ('logs', 'files')}
+    if state['status'] == 'queued':
+        position = scheduler.position(analysis_id)
+        if position is not None:
+            queue = scheduler.stats()
+            state['queue_position'] = position
+            state['queue_depth'] = queue['queued']
+            state['message'] = f"Waiting in queue: position {position} of {queue['queued']}"
+    return state
+
+def archived_state(record):
+    """Progress state of an archived analysis"""
+    return {key: record[key] for key in ARCHIVED_FIELDS if key in record}
+
+def touch_progress(analysis_id):
+    """Mark an in-memory analysis as recently used, so it is evicted last"""
+    with progress_lock:
+        if analysis_id in analysis_progress:
+            analysis_progress.move_to_end(analysis_id)
+
+def finish_analysis(analysis_id, entry):
+    """Archive a finished analysis and evict the least recently used finished ones from memory"""
+    record = archived_state(entry)
+    record.update({
+        'cache_key': entry.get('cache_key'),
+        'logs': entry['logs'].messages(),
+        'files': {name: os.path.abspath(path) for name, path in entry.get('files', {}).items() if path},
+        'completed_at': time.time()
+    })
+    try:
+        result_archive.save(analysis_id, record)
+    except OSError as e:
+        print(f"WARNING: Could not archive analysis {analysis_id}: {e}")
+    if entry.get('cache_key') and not (entry['status'] == 'completed' and entry.get('cacheable')):
+        # Failed, cancelled or empty: the next identical request runs again
+        result_cache.discard(entry['cache_key'], analysis_id)
+    if app.config['RESULTS_IN_MEMORY'] > 0:
+        with progress_lock:
+            evict_finished(analysis_progress, app.config['RESULTS_IN_MEMORY'])
+
+def cached_analysis(cache_key):
+    """Id of an analysis with this result key that is in flight or completed with its results on disk"""
+    analysis_id = result_cache.get(cache_key)
+    if analysis_id is None:
+        return None
+    entry = analysis_progress.get(analysis_id) or result_archive.load(analysis_id)
+    if entry is not None and not entry['complete']:
+        return analysis_id
+    if (entry is not None and entry['status'] == 'completed' and entry.get('cacheable')
+            and os.path.isdir(entry.get('files', {}).get('output', ''))):
+        return analysis_id
+    result_cache.discard(cache_key, analysis_id)
+    return None
+
+def client_id():
+    """Per-browser id the scheduler shares workers by"""
+    if 'client_id' not in session:
+        session['client_id'] = uuid.uuid4().hex
+    return session['client_id']
+
+def queue_analysis(analysis_id, filepath, start_date, end_date, output_dir,
+                   geoapify_key, google_key, filename, message='Waiting for a free worker...', cache_key=None):
+    """Create the progress entry and queue the analysis; raises QueueFull when there is no room"""
+    analysis_progress[analysis_id] = {
+        'status': 'queued',
+        'message': message,
+        'progress': 0,
+        'logs': ProgressLog(app.config['PROGRESS_LOG_LINES'], os.path.join(output_dir, 'progress.log')),
+        'result': None,
+        'output_dir': None,
+        'error': None,
+        'complete': False,
+        'queued_at': time.time(),
+        'files': {'upload': filepath, 'output': output_dir, 'run': run_dir_for(analysis_id)},
+        'cache_key': cache_key,
+        'filename': filename
+    }
+    touch_progress(analysis_id)
+    cancel_events[analysis_id] = threading.Event()
+    try:
+        position = scheduler.submit(analysis_id, client_id(), run_analysis_thread,
+                                    analysis_id, filepath, start_date, end_date, output_dir,
+                                    geoapify_key, google_key, filename)
+    except QueueFull:
+        analysis_progress.pop(analysis_id, None)
+        cancel_events.pop(analysis_id, None)
+        raise
+    if cache_key:
+        # Identical requests from now on attach to this analysis
+        result_cache.put(cache_key, analysis_id)
+    notify_progress()
+    print(f"DEBUG: Queued {analysis_id} at position {position}")
+
 @app.route('/')
 def index():
     config = load_web_config()
@@ -104,88 +330,183 @@ def upload_file():
         flash('No file selected', 'error')
         return redirect(url_for('index'))
     
-    if file and file.filename.endswith('.json'):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        print(f"DEBUG: File saved to {filepath}")
+    upload_suffix = accepted_suffix(file.filename)
+    if file and upload_suffix:
+        start_date, end_date, geoapify_key, google_key = analysis_form_settings(request.form)
+        if not geoapify_key.strip():
+            flash('Geoapify API key is required', 'error')
+            return redirect(url_for('index'))
         
-        # Get form data and parse dates properly
-        start_date_str = request.form.get('start_date', str(date.today()))
-        end_date_str = request.form.get('end_date', str(date.today()))
-        geoapify_key = request.form.get('geoapify_key', '')
-        google_key = request.form.get('google_key', '')
+        # Uploads are stored by content hash: a re-upload of the same export reuses the file.
+        # Compressed uploads stay compressed; the analyzers decompress them while parsing.
+        filename = secure_filename(file.filename)
+        content_hash, filepath, existed = save_upload(file.stream, app.config['UPLOAD_FOLDER'], upload_suffix)
+        recent_uploads.touch(filepath)
+        print(f"DEBUG: File saved to {filepath}" + (" (already uploaded)" if existed else ""))
         
-        # Convert string dates to date objects
-        start_date = parse_date_string(start_date_str)
-        end_date = parse_date_string(end_date_str)
+        try:
+            analysis_id, how = start_uploaded_analysis(content_hash, filepath, filename, start_date, end_date,
+                                                       geoapify_key, google_key)
+        except QueueFull as e:
+            flash(str(e), 'error')
+            return redirect(url_for('index'))
         
-        # Save configuration for next time
-        config = load_web_config()
-        config.update({
-            "last_start_date": start_date_str,
-            "last_end_date": end_date_str,
-            "geoapify_key": geoapify_key,
-            "google_key": google_key
-        })
-        save_web_config(config)
+        # Redirect to processing page
+        print(f"DEBUG: About to redirect to /processing/{analysis_id}")
+        return redirect(analysis_page(analysis_id, how))
+    
+    else:
+        flash(f"Please upload a location history file ({', '.join(accepted_suffixes())})", 'error')
+        return redirect(url_for('index'))
+
+def accepted_suffix(filename):
+    """Supported ending of an uploaded file's name, or None (.zst needs the zstandard package)"""
+    suffix = input_suffix(filename or '')
+    if suffix and (ZSTD_AVAILABLE or not suffix.endswith('.zst')):
+        return suffix
+    return None
+
+def accepted_suffixes():
+    return [suffix for suffix in SUPPORTED_SUFFIXES if accepted_suffix(suffix)]
+
+def analysis_form_settings(form):
+    """Dates and API keys of an upload form, saved as the defaults for next time"""
+    # Get form data and parse dates properly
+    start_date_str = form.get('start_date', str(date.today()))
+    end_date_str = form.get('end_date', str(date.today()))
+    geoapify_key = form.get('geoapify_key', '')
+    google_key = form.get('google_key', '')
+    
+    # Save configuration for next time
+    config = load_web_config()
+    config.update({
+        "last_start_date": start_date_str,
+        "last_end_date": end_date_str,
+        "geoapify_key": geoapify_key,
+        "google_key": google_key
+    })
+    save_web_config(config)
+    
+    # Convert string dates to date objects
+    return parse_date_string(start_date_str), parse_date_string(end_date_str), geoapify_key, google_key
+
+def start_uploaded_analysis(content_hash, filepath, filename, start_date, end_date, geoapify_key, google_key):
+    """
+    Reuse an identical analysis or queue a new one for a stored upload.
+    Returns (analysis_id, 'cached' | 'attached' | 'queued'); raises QueueFull.
+    """
+    # Same file, dates, settings, API keys and engine: show the existing results or follow the run in flight
+    cache_key = result_key(content_hash, start_date, end_date,
+                           {**WEB_ANALYSIS_SETTINGS, 'geoapify_key': key_fingerprint(geoapify_key),
+                            'google_key': key_fingerprint(google_key)},
+                           engine_version())
+    with analysis_start_lock:
+        cached_id = cached_analysis(cache_key)
+        if cached_id is not None:
+            print(f"DEBUG: Reusing analysis {cached_id} for an identical request")
+            entry = analysis_progress.get(cached_id)
+            return cached_id, ('cached' if entry is None or entry['complete'] else 'attached')
         
-        if not geoapify_key.strip():
-            flash('Geoapify API key is required', 'error')
-            return redirect(url_for('index'))
+        if not scheduler.has_room(client_id()):
+            raise QueueFull('Too many analyses are waiting right now, please try again in a few minutes')
         
         # Generate unique analysis ID
         analysis_id = str(uuid.uuid4())
         print(f"DEBUG: Generated analysis_id: {analysis_id}")
         
-        # Initialize progress tracking
-        analysis_progress[analysis_id] = {
-            'status': 'starting',
-            'message': 'Initializing analysis...',
-            'progress': 0,
-            'logs': [],
-            'result': None,
-            'output_dir': None,
-            'error': None,
-            'complete': False
-        }
-        print(f"DEBUG: Created progress entry for {analysis_id}")
-        
-        # Start analysis in background thread
+        # Queue the analysis for the worker pool; it is in the result cache when the lock is released
         output_dir = os.path.join(app.config['OUTPUT_FOLDER'], 
-                                f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+                                f"analysis_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{analysis_id[:8]}")
         os.makedirs(output_dir, exist_ok=True)
-        
-        thread = threading.Thread(
-            target=run_analysis_thread,
-            args=(analysis_id, filepath, start_date, end_date, output_dir, 
-                  geoapify_key, google_key, filename)
-        )
-        thread.daemon = True
-        thread.start()
-        print(f"DEBUG: Started background thread for {analysis_id}")
-        
-        # Redirect to processing page
-        print(f"DEBUG: About to redirect to /processing/{analysis_id}")
-        return redirect(url_for('processing', analysis_id=analysis_id))
+        try:
+            queue_analysis(analysis_id, filepath, start_date, end_date, output_dir,
+                           geoapify_key, google_key, filename, cache_key=cache_key)
+        except QueueFull:
+            # The upload may be shared with other analyses; the retention sweep removes it if unused
+            os.rmdir(output_dir)
+            raise
+    return analysis_id, 'queued'
+
+def analysis_page(analysis_id, how):
+    """Where to send the browser after an upload: the results of a cached analysis, else its progress"""
+    if how == 'cached':
+        flash('This file was already analyzed with the same settings; showing those results', 'success')
+        return url_for('results', analysis_id=analysis_id)
+    return url_for('processing', analysis_id=analysis_id)
+
+@app.route('/uploads', methods=['POST'])
+def init_chunked_upload():
+    """Start a chunked upload: JSON {filename, size} -> upload id, chunk size and chunk count"""
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(str(data.get('filename', '')))
+    if not accepted_suffix(filename):
+        return jsonify({'error': f"Please upload a location history file ({', '.join(accepted_suffixes())})"}), 400
+    try:
+        status = upload_sessions.init(filename, int(data.get('size', 0)))
+    except (UploadError, ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(status), 201
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    """Chunks received so far, for resuming an interrupted upload"""
+    try:
+        return jsonify(upload_sessions.status(upload_id))
+    except UnknownUpload as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    """Store one chunk, sent as the raw request body"""
+    try:
+        status = upload_sessions.put_chunk(upload_id, index, request.stream)
+    except UnknownUpload as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'index': index, 'received': len(status['received']), 'chunks': status['chunks'],
+                    'complete': status['complete']})
+
+@app.route('/uploads/<upload_id>/finalize', methods=['POST'])
+def finalize_chunked_upload(upload_id):
+    """Store the assembled upload and start (or reuse) its analysis; form fields as for /upload"""
+    if not ANALYZER_AVAILABLE:
+        return jsonify({'error': 'Location analyzer is not available. Please check setup.'}), 503
+    start_date, end_date, geoapify_key, google_key = analysis_form_settings(request.form)
+    if not geoapify_key.strip():
+        return jsonify({'error': 'Geoapify API key is required'}), 400
+    # Keep the session while the queue is full, so finalizing can simply be retried
+    if not scheduler.has_room(client_id()):
+        return jsonify({'error': 'Too many analyses are waiting right now, please try again in a few minutes'}), 503
     
-    else:
-        flash('Please upload a JSON file', 'error')
-        return redirect(url_for('index'))
+    try:
+        filename = upload_sessions.status(upload_id)['filename']
+        content_hash, filepath, existed = upload_sessions.finalize(
+            upload_id, app.config['UPLOAD_FOLDER'], accepted_suffix(filename))
+    except UnknownUpload as e:
+        return jsonify({'error': str(e)}), 404
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 409
+    recent_uploads.touch(filepath)
+    print(f"DEBUG: Chunked upload {upload_id} saved to {filepath}" + (" (already uploaded)" if existed else ""))
+    
+    try:
+        analysis_id, how = start_uploaded_analysis(content_hash, filepath, filename, start_date, end_date,
+                                                   geoapify_key, google_key)
+    except QueueFull as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'analysis_id': analysis_id, 'status': how, 'redirect': analysis_page(analysis_id, how)})
 
 def run_analysis_thread(analysis_id, filepath, start_date, end_date, output_dir, 
                        geoapify_key, google_key, filename):
-    """Run the analysis in a background thread with progress updates"""
+    """Run the analysis on a scheduler worker thread with progress updates"""
     print(f"DEBUG: Analysis thread started for {analysis_id}")
+    entry = analysis_progress[analysis_id]
     try:
         def progress_log(msg):
             """Log function that updates progress"""
-            print(f"DEBUG: Progress log for {analysis_id}: {msg}")
             if analysis_id in analysis_progress:
-                analysis_progress[analysis_id]['logs'].append({
-                    'timestamp': datetime.now().strftime('%H:%M:%S'),
-                    'message': msg
-                })
+                analysis_progress[analysis_id]['logs'].append(msg)
                 analysis_progress[analysis_id]['message'] = msg
                 
                 # Update progress based on message content
@@ -201,45 +522,85 @@ def run_analysis_thread(analysis_id, filepath, start_date, end_date, output_dir,
                     analysis_progress[analysis_id]['progress'] = 85
                 elif 'exported' in msg:
                     analysis_progress[analysis_id]['progress'] = 95
+                notify_progress()
         
-        def cancel_check():
-            return False  # No cancellation for web version
+        cancel_event = cancel_events.setdefault(analysis_id, threading.Event())
+        cancel_check = cancel_event.is_set
         
         # Update status
-        analysis_progress[analysis_id]['status'] = 'running'
-        analysis_progress[analysis_id]['message'] = 'Processing location data...'
-        analysis_progress[analysis_id]['progress'] = 5
-        print(f"DEBUG: Updated progress for {analysis_id} to 5%")
+        queue_wait = time.time() - analysis_progress[analysis_id].get('queued_at', time.time())
+        analysis_progress[analysis_id]['queue_wait_s'] = round(queue_wait, 1)
+        if queue_wait >= 1:
+            progress_log(f"Started after {queue_wait:.0f}s in the queue")
+        update_progress(analysis_id, {
+            'status': 'running',
+            'message': 'Processing location data...',
+            'progress': 5
+        })
         
         # Run the location analysis
-        result = process_location_file(
+        analysis_args = (
             filepath,
             start_date,
             end_date,
             output_dir,
-            "by_city",  # group_by
+            WEB_ANALYSIS_SETTINGS['group_by'],
             geoapify_key,
             google_key,
             "",  # onwater_key
-            0.1,  # delay
-            1,    # batch_size
-            progress_log,
-            cancel_check,
-            True  # include_distance
+            WEB_ANALYSIS_SETTINGS['delay'],
+            WEB_ANALYSIS_SETTINGS['batch_size'],
         )
+        analysis_kwargs = {
+            'include_distance': WEB_ANALYSIS_SETTINGS['include_distance'],
+            'checkpoint_dir': run_dir_for(analysis_id)
+        }
+        if app.config['ANALYSIS_PROCESS_JOBS'] > 0:
+            # Log messages stream back from the worker process into progress_log
+            result = thread_worker(app.config['ANALYSIS_PROCESS_JOBS']).run(
+                process_location_file, analysis_args, analysis_kwargs, progress_log, cancel_check)
+        else:
+            result = process_location_file(*analysis_args, log_func=progress_log, cancel_check=cancel_check,
+                                           **analysis_kwargs)
         
         print(f"DEBUG: Analysis completed for {analysis_id}, result: {result}")
+        analysis_progress[analysis_id]['logs'].close()
         
-        if result is not None:
+        # The bridge reports failures as an empty result; a checkpoint that never
+        # reached "complete" means the run stopped early and can be resumed
+        checkpoint = resumable_checkpoint(analysis_id)
+        if cancel_event.is_set():
+            update_progress(analysis_id, {
+                'status': 'cancelled',
+                'message': 'Analysis cancelled',
+                'error': 'Analysis cancelled',
+                'resumable': checkpoint is not None,
+                'complete': True
+            })
+        elif checkpoint is not None:
+            update_progress(analysis_id, {
+                'status': 'error',
+                'message': 'Analysis stopped before completing',
+                'progress': 0,
+                'error': f"Analysis stopped after its '{checkpoint.stage}' stage; it can be resumed",
+                'resumable': True,
+                'complete': True
+            })
+        elif result:
             # Get list of generated files
             generated_files = []
             if os.path.exists(output_dir):
                 for f in os.listdir(output_dir):
-                    if f.endswith('.csv') or f.endswith('.txt'):
+                    if f.endswith('.csv') or f.endswith('.txt') or f.endswith('.log'):
                         generated_files.append(f)
             
+            # Only results that found some place are reused for identical uploads
+            cacheable = resolved_places(output_dir)
+            if not cacheable:
+                entry['logs'].append("⚠️ No location could be geocoded; check the Geoapify API key")
+            
             # Update final progress
-            analysis_progress[analysis_id].update({
+            update_progress(analysis_id, {
                 'status': 'completed',
                 'message': 'Analysis completed successfully!',
                 'progress': 100,
@@ -248,11 +609,12 @@ def run_analysis_thread(analysis_id, filepath, start_date, end_date, output_dir,
                 'generated_files': generated_files,
                 'complete': True,
                 'filename': filename,
-                'date_range': f"{start_date} to {end_date}"
+                'date_range': f"{start_date} to {end_date}",
+                'cacheable': cacheable
             })
             print(f"DEBUG: Final update completed for {analysis_id}")
         else:
-            analysis_progress[analysis_id].update({
+            update_progress(analysis_id, {
                 'status': 'error',
                 'message': 'Analysis failed',
                 'progress': 0,
@@ -264,13 +626,79 @@ def run_analysis_thread(analysis_id, filepath, start_date, end_date, output_dir,
     except Exception as e:
         error_msg = f"Analysis failed: {str(e)}"
         print(f"DEBUG: Exception in analysis thread for {analysis_id}: {error_msg}")
-        analysis_progress[analysis_id].update({
+        update_progress(analysis_id, {
             'status': 'error',
             'message': error_msg,
             'progress': 0,
             'error': error_msg,
+            'resumable': resumable_checkpoint(analysis_id) is not None,
             'complete': True
         })
+    finally:
+        entry['logs'].close()
+        cancel_events.pop(analysis_id, None)
+        finish_analysis(analysis_id, entry)
+
+@app.route('/cancel/<analysis_id>', methods=['POST'])
+def cancel_analysis(analysis_id):
+    """Ask a running analysis to stop; geocoding already done stays in the cache"""
+    cancel_event = cancel_events.get(analysis_id)
+    if cancel_event is None:
+        return jsonify({'error': 'Analysis not running'}), 404
+    
+    if scheduler.cancel(analysis_id):
+        # Never started: nothing to stop or resume
+        cancel_events.pop(analysis_id, None)
+        update_progress(analysis_id, {
+            'status': 'cancelled',
+            'message': 'Analysis cancelled',
+            'error': 'Analysis cancelled before it started',
+            'complete': True
+        })
+        finish_analysis(analysis_id, analysis_progress[analysis_id])
+        return jsonify({'status': 'cancelled'})
+    
+    cancel_event.set()
+    update_progress(analysis_id, {'message': 'Cancelling analysis...'})
+    return jsonify({'status': 'cancelling'})
+
+@app.route('/resume/<analysis_id>', methods=['POST'])
+def resume_analysis(analysis_id):
+    """Continue a failed or interrupted analysis from its checkpoint, without a re-upload"""
+    progress = analysis_progress.get(analysis_id)
+    if progress is not None and not progress.get('complete'):
+        return redirect(url_for('processing', analysis_id=analysis_id))
+    
+    checkpoint = resumable_checkpoint(analysis_id)
+    if checkpoint is None:
+        flash('No interrupted analysis to resume', 'error')
+        return redirect(url_for('index'))
+    
+    params = checkpoint.params
+    if not os.path.exists(params['file_path']):
+        flash('The uploaded file for this analysis is no longer available', 'error')
+        return redirect(url_for('index'))
+    
+    # Keys are never stored with the checkpoint; use the saved web settings
+    config = load_web_config()
+    geoapify_key = config.get('geoapify_key', '')
+    if not geoapify_key.strip():
+        flash('Geoapify API key is required', 'error')
+        return redirect(url_for('index'))
+    
+    archived = result_archive.load(analysis_id) or {}
+    try:
+        with analysis_start_lock:
+            queue_analysis(analysis_id, params['file_path'], parse_date_string(params['start_date']),
+                           parse_date_string(params['end_date']), params['output_dir'],
+                           geoapify_key, config.get('google_key', ''),
+                           archived.get('filename') or os.path.basename(params['file_path']),
+                           message=f"Waiting to resume after its '{checkpoint.stage}' stage...",
+                           cache_key=archived.get('cache_key'))
+    except QueueFull as e:
+        flash(str(e), 'error')
+        return redirect(url_for('index'))
+    return redirect(url_for('processing', analysis_id=analysis_id))
 
 @app.route('/processing/<analysis_id>')
 def processing(analysis_id):
@@ -278,11 +706,30 @@ def processing(analysis_id):
     print(f"DEBUG: Processing route called with analysis_id: {analysis_id}")
     
     if analysis_id not in analysis_progress:
+        # Finished and evicted from memory: the page shows the archived state
+        if result_archive.load(analysis_id) is not None:
+            return render_template('processing.html', analysis_id=analysis_id)
+        # Lost on a restart: offer the checkpoint if the run never finished
+        checkpoint = resumable_checkpoint(analysis_id)
+        if checkpoint is not None:
+            analysis_progress[analysis_id] = {
+                'status': 'error',
+                'message': 'Analysis was interrupted',
+                'progress': 0,
+                'logs': ProgressLog(),
+                'result': None,
+                'output_dir': None,
+                'error': f"Analysis was interrupted after its '{checkpoint.stage}' stage; it can be resumed",
+                'resumable': True,
+                'complete': True
+            }
+            return render_template('processing.html', analysis_id=analysis_id)
         print(f"DEBUG: Analysis {analysis_id} not found in progress dict")
         print(f"DEBUG: Available analysis IDs: {list(analysis_progress.keys())}")
         flash('Analysis not found', 'error')
         return redirect(url_for('index'))
     
+    touch_progress(analysis_id)
     print(f"DEBUG: Rendering processing.html for {analysis_id}")
     try:
         return render_template('processing.html', analysis_id=analysis_id)
@@ -292,28 +739,82 @@ def processing(analysis_id):
 
 @app.route('/progress/<analysis_id>')
 def get_progress(analysis_id):
-    """API endpoint to get analysis progress"""
-    print(f"DEBUG: Progress API called for {analysis_id}")
+    """API endpoint to get analysis progress (polling fallback for the stream below)
     
+    ?since=<seq> returns only log lines after that sequence number.
+    """
     if analysis_id not in analysis_progress:
-        print(f"DEBUG: Analysis {analysis_id} not found for progress API")
-        return jsonify({'error': 'Analysis not found'}), 404
-    
-    progress_data = analysis_progress[analysis_id].copy()
-    print(f"DEBUG: Returning progress data: {progress_data['progress']}% - {progress_data['message']}")
+        record = result_archive.load(analysis_id)
+        if record is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        return jsonify({**archived_state(record), 'logs': [], 'log_seq': 0, 'logs_skipped': 0})
     
+    touch_progress(analysis_id)
+    progress_data = progress_state(analysis_id)
+    progress_data.update(analysis_progress[analysis_id]['logs'].since(request.args.get('since', 0, type=int)))
     return jsonify(progress_data)
 
+@app.route('/progress/<analysis_id>/stream')
+def stream_progress(analysis_id):
+    """Server-Sent Events: new log lines ("log") and state changes ("state") as they happen"""
+    if analysis_id not in analysis_progress:
+        record = result_archive.load(analysis_id)
+        if record is None:
+            return jsonify({'error': 'Analysis not found'}), 404
+        # Finished long ago: its final state is all there is to send
+        return Response(f"event: state\ndata: {json.dumps(archived_state(record))}\n\n",
+                        mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+    
+    # A reconnecting EventSource sends the id of the last log batch it got: its last sequence number
+    try:
+        sent_seq = max(0, int(request.headers.get('Last-Event-ID', 0)))
+    except ValueError:
+        sent_seq = 0
+    
+    def events():
+        nonlocal sent_seq
+        last_state = None
+        while True:
+            with progress_changed:
+                seen_version = progress_version
+            progress = analysis_progress.get(analysis_id)
+            if progress is None:
+                return
+            new_logs = progress['logs'].since(sent_seq)
+            if new_logs['log_seq'] > sent_seq:
+                sent_seq = new_logs['log_seq']
+                yield f"id: {sent_seq}\nevent: log\ndata: {json.dumps(new_logs)}\n\n"
+            state = progress_state(analysis_id)
+            if state != last_state:
+                last_state = state
+                yield f"event: state\ndata: {json.dumps(state, default=str)}\n\n"
+            if state['complete']:
+                return
+            with progress_changed:
+                changed = progress_changed.wait_for(lambda: progress_version != seen_version,
+                                                    timeout=STREAM_KEEPALIVE)
+            if not changed:
+                yield ": keep-alive\n\n"
+    
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/results/<analysis_id>')
 def results(analysis_id):
     """Show final results page"""
     print(f"DEBUG: Results route called for {analysis_id}")
     
-    if analysis_id not in analysis_progress:
-        flash('Analysis not found', 'error')
-        return redirect(url_for('index'))
-    
-    progress_data = analysis_progress[analysis_id]
+    progress_data = analysis_progress.get(analysis_id)
+    if progress_data is not None:
+        touch_progress(analysis_id)
+        logs = progress_data['logs'].messages()
+    else:
+        # Evicted from memory: serve the archived record
+        progress_data = result_archive.load(analysis_id)
+        if progress_data is None:
+            flash('Analysis not found', 'error')
+            return redirect(url_for('index'))
+        logs = progress_data.get('logs', [])
     
     if not progress_data['complete']:
         print(f"DEBUG: Analysis {analysis_id} not complete, redirecting to processing")
@@ -321,7 +822,7 @@ def results(analysis_id):
     
     return render_template('results.html', 
                          result=progress_data.get('result'),
-                         logs=[log['message'] for log in progress_data.get('logs', [])],
+                         logs=logs,
                          output_dir=progress_data.get('output_dir'),
                          generated_files=progress_data.get('generated_files', []),
                          success=progress_data['status'] == 'completed')
@@ -358,26 +859,75 @@ def health_check():
         'status': 'healthy',
         'analyzer_available': ANALYZER_AVAILABLE,
         'uploads_dir': os.path.exists(app.config['UPLOAD_FOLDER']),
-        'outputs_dir': os.path.exists(app.config['OUTPUT_FOLDER'])
+        'outputs_dir': os.path.exists(app.config['OUTPUT_FOLDER']),
+        'queue': scheduler.stats(),
+        'retention': sweeper.stats()
     }
 
+@app.route('/queue')
+def queue_status():
+    """Worker pool and queue state: depth, running jobs and recent wait times"""
+    return jsonify(scheduler.stats())
+
 @app.route('/test-processing')
 def test_processing():
     """Test route to verify processing page works"""
     test_id = "test-123"
+    logs = ProgressLog()
+    logs.append('Starting test analysis')
+    logs.append('Processing test data')
     analysis_progress[test_id] = {
         'status': 'running',
         'message': 'Test analysis in progress...',
         'progress': 50,
-        'logs': [
-            {'timestamp': '12:34:56', 'message': 'Starting test analysis'},
-            {'timestamp': '12:35:10', 'message': 'Processing test data'},
-        ],
+        'logs': logs,
         'complete': False
     }
     print(f"DEBUG: Created test analysis with ID: {test_id}")
     return redirect(url_for('processing', analysis_id=test_id))
 
+def sweep_results():
+    """Delete finished analyses past their retention, and files no analysis refers to any more"""
+    now = time.time()
+    ttl_seconds = app.config['RESULT_TTL_HOURS'] * 3600
+    active = {analysis_id: entry for analysis_id, entry in list(analysis_progress.items())
+              if not entry.get('complete')}
+    records = {analysis_id: record for analysis_id, record in result_archive.records().items()
+               if analysis_id not in active}
+    expired = {analysis_id: records.pop(analysis_id)
+               for analysis_id in select_expired(records, ttl_seconds, app.config['MAX_RESULTS'], now)}
+    
+    # Files still used by other analyses stay, e.g. an upload shared through its content hash
+    keep = {os.path.abspath(path) for record in records.values() for path in record.get('files', {}).values() if path}
+    keep.update(os.path.abspath(path) for entry in active.values() for path in entry.get('files', {}).values() if path)
+    if ttl_seconds > 0:
+        # Uploads sent again within the TTL count as fresh, even when the file itself is older
+        keep.update(recent_uploads.since(now - ttl_seconds))
+    for analysis_id, record in expired.items():
+        remove_paths(path for path in record.get('files', {}).values() if path and os.path.abspath(path) not in keep)
+        result_archive.remove(analysis_id)
+        if record.get('cache_key'):
+            result_cache.discard(record['cache_key'], analysis_id)
+        with progress_lock:
+            analysis_progress.pop(analysis_id, None)
+    
+    # Leftovers of analyses without a record, e.g. interrupted by a restart, once older than the TTL
+    orphans = 0
+    if ttl_seconds > 0:
+        for folder in (app.config['UPLOAD_FOLDER'], app.config['OUTPUT_FOLDER'], app.config['RUN_FOLDER']):
+            orphans += remove_paths(stale_entries(folder, now - ttl_seconds, keep))
+    
+    # Chunked uploads nobody has added to for a while
+    abandoned = []
+    if app.config['UPLOAD_SESSION_HOURS'] > 0:
+        abandoned = stale_entries(app.config['CHUNK_FOLDER'], now - app.config['UPLOAD_SESSION_HOURS'] * 3600, set())
+        upload_sessions.forget([os.path.basename(path) for path in abandoned])
+        remove_paths(abandoned)
+    if expired or orphans:
+        print(f"Retention: removed {len(expired)} expired analyses and {orphans} orphaned files")
+    return {'archived': len(records), 'expired': len(expired), 'orphans_removed': orphans,
+            'upload_sessions_removed': len(abandoned)}
+
 if __name__ == '__main__':
     print("Starting Location Analyzer Web Application")
     print(f"   Analyzer available: {ANALYZER_AVAILABLE}")
@@ -0,0 +1,319 @@
+# batch_analyze.py - Headless batch analysis of many location history exports
+"""
+Command-line entry point for analyzing many Google location history exports
+in one go, e.g. from a nightly job:
+
+    python batch_analyze.py exports/ --start 2024-01-01 --end 2024-12-31 --output-dir outputs/nightly
+    python batch_analyze.py a.json b.json --workers 8 --requests-per-second 5 --stats-file stats.json
+
+Inputs are files or directories (searched for --pattern, by default every
+plain or compressed export input_sources.py reads, with --recursive into
+subdirectories). Files are analyzed by the modern engine on a pool of
+--workers threads. Each thread runs its own event loop, so one file's
+parsing overlaps other files' geocoding. All analyses share:
+
+    - one geocode cache: a cell looked up for one export is a cache hit for
+      every later export, and config/geo_cache.json is saved as it grows
+    - one RequestBudget (request_budget.py): --max-concurrent-requests and
+      --requests-per-second apply to the whole batch, not to each file
+
+Each file's reports go to <output-dir>/<file name>/, the same files a single
+analysis writes. The batch writes:
+
+    batch_summary.csv   - one row per input: status, distance, jumps, cities, points, cache use, time
+    batch_stats.json    - totals, per-file results and the shared budget's counters
+
+The stats (without the per-file rows) are also printed to stdout as one JSON
+line at the end; progress and the analyzers' logs go to stderr. The exit
+status is 0 when every file was analyzed, 1 when any failed, and 130 when
+interrupted. Files not finished by then are reported as cancelled.
+
+API keys come from --geoapify-key (--google-key, --onwater-key), the
+LOCATION_ANALYZER_GEOAPIFY_KEY (..._GOOGLE_KEY, ..._ONWATER_KEY) environment
+variables, or the keys saved by the web app or GUI in config/.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from location_analyzer import AnalysisConfig, AnalysisCancelled, LocationAnalyzer
+from request_budget import RequestBudget
+from input_sources import SUPPORTED_SUFFIXES, input_suffix
+
+SAVED_CONFIG_FILES = ["config/web_config.json", "config/gui_config.json"]
+SUMMARY_COLUMNS = ["file", "status", "output_dir", "total_distance_miles", "total_jumps", "cities_visited",
+                   "points_parsed", "points_significant", "geocode_cache_hits", "geocode_cache_misses",
+                   "api_requests", "seconds", "error"]
+
+
+def saved_key(name: str) -> str:
+    """API key from the environment, else from the web app's or GUI's saved settings"""
+    value = os.environ.get(f"LOCATION_ANALYZER_{name.upper()}", "")
+    if value:
+        return value
+    for path in SAVED_CONFIG_FILES:
+        try:
+            with open(path, "r") as f:
+                value = json.load(f).get(name, "")
+        except Exception:
+            continue
+        if value:
+            return value
+    return ""
+
+
+def collect_inputs(paths: List[str], patterns: List[str], recursive: bool) -> List[str]:
+    """Input files from files and directories, in order and without duplicates"""
+    files, seen = [], set()
+    for path in paths:
+        if os.path.isdir(path):
+            found = set()
+            for pattern in patterns:
+                search = os.path.join(path, "**", pattern) if recursive else os.path.join(path, pattern)
+                found.update(glob.glob(search, recursive=recursive))
+            found = sorted(found)
+        elif os.path.isfile(path):
+            found = [path]
+        else:
+            raise FileNotFoundError(f"No such file or directory: {path}")
+        for file_path in found:
+            absolute = os.path.abspath(file_path)
+            if os.path.isfile(absolute) and absolute not in seen:
+                seen.add(absolute)
+                files.append(absolute)
+    return files
+
+
+def output_names(files: List[str]) -> Dict[str, str]:
+    """Distinct, file-system safe output directory names, from the file names"""
+    names, used = {}, set()
+    for file_path in files:
+        base = os.path.basename(file_path)
+        suffix = input_suffix(base)
+        base = base[:-len(suffix)] if suffix else os.path.splitext(base)[0]
+        stem = re.sub(r"[^A-Za-z0-9._-]+", "_", base).strip("_") or "export"
+        name, n = stem, 2
+        while name in used:
+            name, n = f"{stem}-{n}", n + 1
+        used.add(name)
+        names[file_path] = name
+    return names
+
+
+class BatchRunner:
+    """Runs the analyses of one batch on a thread pool with a shared cache and request budget"""
+
+    def __init__(self, config: AnalysisConfig, budget: RequestBudget, workers: int, quiet: bool = False):
+        self.config = config
+        self.budget = budget
+        self.workers = workers
+        self.quiet = quiet
+        self.cancelled = threading.Event()
+        self._log_lock = threading.Lock()
+        # Loaded once; every analyzer of the batch reads and extends this dict
+        self.geocode_cache = LocationAnalyzer(config).geocode_cache
+
+    def log(self, message: str):
+        with self._log_lock:
+            print(message, file=sys.stderr, flush=True)
+
+    def analyze(self, file_path: str, output_dir: str, start_date, end_date) -> dict:
+        """Analyze one file (in a pool thread); returns its summary row"""
+        name = os.path.basename(file_path)
+        row = {"file": file_path, "output_dir": output_dir, "status": "cancelled", "error": ""}
+        if self.cancelled.is_set():
+            return row
+
+        analyzer = LocationAnalyzer(self.config, cancel_check=self.cancelled.is_set,
+                                    geocode_cache=self.geocode_cache, request_budget=self.budget)
+        if self.quiet:
+            analyzer._log = lambda message: None
+        else:
+            analyzer._log = lambda message: self.log(f"[{name}] {message}")
+
+        started = time.perf_counter()
+        try:
+            result = asyncio.run(analyzer.analyze_location_history(file_path, start_date, end_date, output_dir))
+        except AnalysisCancelled:
+            row["seconds"] = round(time.perf_counter() - started, 3)
+            return row
+        except Exception as e:
+            row.update(status="failed", error=str(e), seconds=round(time.perf_counter() - started, 3))
+            self.log(f"❌ {name}: {e}")
+            return row
+
+        metrics = result.get("metrics", {})
+        stages = metrics.get("stages", {})
+        # A pipeline run has one "pipeline" stage from parsed points (in) to significant ones (out)
+        pipeline = stages.get("pipeline", {})
+        parse = stages.get("parse") or {"points_out": pipeline.get("points_in")}
+        significant = stages.get("filter") or pipeline
+        row.update(
+            status="ok",
+            total_distance_miles=round(result.get("total_distance", 0.0), 2),
+            total_jumps=result.get("total_jumps", 0),
+            cities_visited=result.get("cities_visited", 0),
+            points_parsed=parse.get("points_out"),
+            points_significant=significant.get("points_out"),
+            geocode_cache_hits=metrics.get("cache", {}).get("geocode_hits", 0),
+            geocode_cache_misses=metrics.get("cache", {}).get("geocode_misses", 0),
+            api_requests=sum(api.get("requests", 0) for api in metrics.get("api", {}).values()),
+            seconds=round(time.perf_counter() - started, 3),
+        )
+        self.log(f"✅ {name}: {row['total_distance_miles']:.2f} miles, {row['total_jumps']} jumps in {row['seconds']:.1f}s")
+        return row
+
+    def run(self, files: List[str], output_root: str, start_date, end_date) -> List[dict]:
+        """Analyze every file; rows come back in input order"""
+        names = output_names(files)
+        rows: Dict[str, dict] = {}
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch")
+        futures = {
+            executor.submit(self.analyze, file_path, os.path.join(output_root, names[file_path]), start_date, end_date): file_path
+            for file_path in files
+        }
+        try:
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                rows[futures[future]] = future.result()
+                self.log(f"📦 {done}/{len(files)} files done")
+        except KeyboardInterrupt:
+            self.log("⚠️ Interrupted; cancelling the remaining analyses...")
+            self.cancelled.set()
+            for future, file_path in futures.items():
+                rows[file_path] = future.result()
+        finally:
+            executor.shutdown(wait=True)
+        return [rows[file_path] for file_path in files]
+
+
+def write_summary(rows: List[dict], path: str):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+
+
+def batch_stats(rows: List[dict], budget: RequestBudget, cache_before: int, cache_after: int,
+                started_at: datetime, wall_s: float, args) -> dict:
+    ok = [row for row in rows if row["status"] == "ok"]
+
+    def total(column):
+        return sum(row.get(column) or 0 for row in ok)
+
+    return {
+        "started": started_at.isoformat(timespec="seconds"),
+        "wall_s": round(wall_s, 3),
+        "start_date": args.start,
+        "end_date": args.end,
+        "workers": args.workers,
+        "files": {
+            "total": len(rows),
+            "ok": len(ok),
+            "failed": sum(row["status"] == "failed" for row in rows),
+            "cancelled": sum(row["status"] == "cancelled" for row in rows),
+        },
+        "totals": {
+            "distance_miles": round(total("total_distance_miles"), 2),
+            "jumps": total("total_jumps"),
+            "points_parsed": total("points_parsed"),
+            "points_significant": total("points_significant"),
+            "geocode_cache_hits": total("geocode_cache_hits"),
+            "geocode_cache_misses": total("geocode_cache_misses"),
+            "api_requests": total("api_requests"),
+        },
+        "geocode_cache": {"entries_before": cache_before, "entries_after": cache_after},
+        "request_budget": budget.stats(),
+        "runs": rows,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze many location history exports with a shared geocode cache")
+    parser.add_argument("inputs", nargs="+", help="export files or directories containing them")
+    parser.add_argument("--start", required=True, help="first day to analyze (YYYY-MM-DD)")
+    parser.add_argument("--end", required=True, help="last day to analyze (YYYY-MM-DD)")
+    parser.add_argument("--output-dir", default="outputs/batch", help="per-file reports go to <output-dir>/<file name>/")
+    parser.add_argument("--pattern", action="append",
+                        help="file pattern searched for in input directories, repeatable "
+                             "(default: " + " ".join(f"*{suffix}" for suffix in SUPPORTED_SUFFIXES) + ")")
+    parser.add_argument("--recursive", action="store_true", help="search input directories recursively")
+    parser.add_argument("--workers", type=int, default=4, help="files analyzed at the same time")
+    parser.add_argument("--max-concurrent-requests", type=int, default=20, help="API requests in flight, whole batch")
+    parser.add_argument("--requests-per-second", type=float, default=5.0,
+                        help="API request starts per second, whole batch (0 = no limit)")
+    parser.add_argument("--geoapify-key", default=None)
+    parser.add_argument("--google-key", default=None)
+    parser.add_argument("--onwater-key", default=None)
+    parser.add_argument("--no-transport-modes", action="store_true", help="skip city_jumps_with_mode.csv")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="geocode each file while it is still being parsed (same results)")
+    parser.add_argument("--stats-file", help="where to write the stats JSON (default <output-dir>/batch_stats.json)")
+    parser.add_argument("--quiet", action="store_true", help="only log per-file results")
+    args = parser.parse_args(argv)
+
+    for value in (args.start, args.end):
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            parser.error(f"invalid date {value!r}, expected YYYY-MM-DD")
+    try:
+        patterns = args.pattern or [f"*{suffix}" for suffix in SUPPORTED_SUFFIXES]
+        files = collect_inputs(args.inputs, patterns, args.recursive)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    if not files:
+        parser.error("no input files found")
+    geoapify_key = args.geoapify_key if args.geoapify_key is not None else saved_key("geoapify_key")
+    if not geoapify_key.strip():
+        parser.error("a Geoapify API key is required (--geoapify-key or LOCATION_ANALYZER_GEOAPIFY_KEY)")
+
+    config = AnalysisConfig(
+        geoapify_key=geoapify_key,
+        google_key=args.google_key if args.google_key is not None else saved_key("google_key"),
+        onwater_key=args.onwater_key if args.onwater_key is not None else saved_key("onwater_key"),
+        api_delay=0,  # pacing comes from the shared request budget
+        max_concurrent_requests=args.max_concurrent_requests,
+        infer_transport_modes=not args.no_transport_modes,
+        pipeline_mode=args.pipeline,
+    )
+    budget = RequestBudget(args.max_concurrent_requests, args.requests_per_second)
+    output_root = os.path.abspath(args.output_dir)
+    os.makedirs(output_root, exist_ok=True)
+
+    runner = BatchRunner(config, budget, max(1, args.workers), args.quiet)
+    cache_before = len(runner.geocode_cache)
+    runner.log(f"🚀 Analyzing {len(files)} files with {runner.workers} workers "
+               f"({len(runner.geocode_cache)} cached locations)")
+    started_at = datetime.now()
+    started = time.perf_counter()
+    rows = runner.run(files, output_root, args.start, args.end)
+    wall_s = time.perf_counter() - started
+
+    stats = batch_stats(rows, budget, cache_before, len(runner.geocode_cache), started_at, wall_s, args)
+    write_summary(rows, os.path.join(output_root, "batch_summary.csv"))
+    stats_file = os.path.abspath(args.stats_file) if args.stats_file else os.path.join(output_root, "batch_stats.json")
+    with open(stats_file, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    runner.log(f"📊 {stats['files']['ok']}/{len(files)} files analyzed in {wall_s:.1f}s; "
+               f"summary in {os.path.join(output_root, 'batch_summary.csv')}")
+    print(json.dumps({key: value for key, value in stats.items() if key != "runs"}))
+
+    if runner.cancelled.is_set():
+        return 130
+    return 0 if stats["files"]["ok"] == len(files) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,320 @@
+# generate_takeout.py - Synthetic Google Takeout location history for benchmarks
+"""
+Writes a realistic-looking location history JSON that parse_location_data()
+and the legacy parser read like a real export, in any size from a few
+thousand to tens of millions of points.
+
+The file is a single top-level list mixing the four object shapes the
+parsers understand:
+
+    activity         - on-device export: startTime/endTime, geo: start and end (2 points)
+    placeVisit       - semantic history visit with E7 coordinates (1 point)
+    activitySegment  - semantic history segment with a waypoint path (every 10th waypoint)
+    timelinePath     - on-device export path with minute offsets (one point per entry)
+
+The simulated person lives in one city, moves between places inside it and
+now and then travels to another city by car, train, ferry or plane, so the
+significance filter, jump detection and transport-mode inference see the
+same kind of input they get from real exports. Output is fully determined by
+the seed, and objects are written one at a time so 10M-point files don't
+need 10M points in memory.
+
+Usage:
+    python benchmarks/generate_takeout.py 100k benchmarks/data/takeout_100k.json
+    python benchmarks/generate_takeout.py 10M big.json --seed 7 --days 730
+"""
+
+import argparse
+import json
+import math
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+# name, state, country, latitude, longitude, UTC offset (hours)
+CITIES = [
+    ("Seattle", "Washington", "United States", 47.6062, -122.3321, -8),
+    ("Bainbridge Island", "Washington", "United States", 47.6262, -122.5212, -8),
+    ("Portland", "Oregon", "United States", 45.5152, -122.6784, -8),
+    ("Vancouver", "British Columbia", "Canada", 49.2827, -123.1207, -8),
+    ("Victoria", "British Columbia", "Canada", 48.4284, -123.3656, -8),
+    ("San Francisco", "California", "United States", 37.7749, -122.4194, -8),
+    ("Los Angeles", "California", "United States", 34.0522, -118.2437, -8),
+    ("Denver", "Colorado", "United States", 39.7392, -104.9903, -7),
+    ("Chicago", "Illinois", "United States", 41.8781, -87.6298, -6),
+    ("New York", "New York", "United States", 40.7128, -74.0060, -5),
+    ("Boston", "Massachusetts", "United States", 42.3601, -71.0589, -5),
+    ("London", "England", "United Kingdom", 51.5074, -0.1278, 0),
+    ("Paris", "Ile-de-France", "France", 48.8566, 2.3522, 1),
+    ("Split", "Split-Dalmatia", "Croatia", 43.5081, 16.4402, 1),
+    ("Hvar", "Split-Dalmatia", "Croatia", 43.1729, 16.4411, 1),
+    ("Kotor", "Kotor", "Montenegro", 42.4247, 18.7712, 1),
+]
+HOME_CITY = 0
+
+# City pairs connected by ferry (either direction)
+FERRY_ROUTES = {(0, 1), (0, 4), (3, 4), (13, 14)}
+
+# Shape mix by object count, roughly what a multi-year export that spans
+# both the semantic and the on-device formats looks like
+SHAPE_WEIGHTS = [("activity", 0.35), ("placeVisit", 0.25), ("activitySegment", 0.15), ("timelinePath", 0.25)]
+
+LOCAL_MODES = ["walking", "in passenger vehicle", "in passenger vehicle", "in bus", "cycling", "in subway"]
+SEGMENT_TYPES = ["WALKING", "IN_PASSENGER_VEHICLE", "IN_BUS", "CYCLING", "IN_SUBWAY"]
+
+PLACE_SPREAD = 0.08    # degrees around the city centre where places are picked
+PLACE_JITTER = 0.0008  # GPS noise around the current place
+PLACES_PER_CITY = 40
+
+
+def parse_size(text: str) -> int:
+    """'10k', '2.5M' or '10000' -> number of points"""
+    text = text.strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    number = text[:-1] if scale != 1 else text
+    return int(float(number) * scale)
+
+
+def format_size(points: int) -> str:
+    if points >= 1_000_000 and points % 1_000_000 == 0:
+        return f"{points // 1_000_000}M"
+    if points >= 1_000 and points % 1_000 == 0:
+        return f"{points // 1_000}k"
+    return str(points)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def nearest_city(lat: float, lon: float, max_km: float = 60.0) -> Optional[tuple]:
+    """City table entry closest to a point, if any is within max_km"""
+    best, best_km = None, max_km
+    for city in CITIES:
+        km = haversine_km(lat, lon, city[3], city[4])
+        if km < best_km:
+            best, best_km = city, km
+    return best
+
+
+class TimelineSimulator:
+    """Deterministic random walk through CITIES that emits Takeout objects"""
+
+    def __init__(self, target_points: int, seed: int, start: date, days: int):
+        self.rng = random.Random(seed)
+        self.target_points = target_points
+        self.points = 0
+        self.now = datetime(start.year, start.month, start.day, 8, tzinfo=timezone.utc)
+        self.end = self.now + timedelta(days=days)
+        self.city = HOME_CITY
+        self.stay_until = self.now + timedelta(days=self.rng.uniform(10, 60))
+        self.places = {}
+        self.place = self._pick_place()
+        self.shapes = {name: 0 for name, _ in SHAPE_WEIGHTS}
+
+    # --- time and space -------------------------------------------------
+
+    def _advance(self, points: int) -> datetime:
+        """Spread the remaining time evenly over the remaining points (with jitter)"""
+        remaining = max(self.target_points - self.points, 1)
+        seconds = (self.end - self.now).total_seconds() / remaining * points
+        self.now += timedelta(seconds=max(1.0, seconds * self.rng.uniform(0.5, 1.5)))
+        return self.now
+
+    def _pick_place(self):
+        places = self.places.setdefault(self.city, [])
+        if len(places) < PLACES_PER_CITY and (not places or self.rng.random() < 0.3):
+            _, _, _, lat, lon, _ = CITIES[self.city]
+            places.append((lat + self.rng.uniform(-PLACE_SPREAD, PLACE_SPREAD),
+                           lon + self.rng.uniform(-PLACE_SPREAD, PLACE_SPREAD)))
+        return self.rng.choice(places)
+
+    def _near_place(self):
+        lat, lon = self.place
+        return (lat + self.rng.uniform(-PLACE_JITTER, PLACE_JITTER),
+                lon + self.rng.uniform(-PLACE_JITTER, PLACE_JITTER))
+
+    def _local_time(self, moment: datetime) -> str:
+        offset = timezone(timedelta(hours=CITIES[self.city][5]))
+        return moment.astimezone(offset).isoformat(timespec="milliseconds")
+
+    @staticmethod
+    def _utc_time(moment: datetime) -> str:
+        return moment.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    @staticmethod
+    def _geo(lat: float, lon: float) -> str:
+        return f"geo:{lat:.6f},{lon:.6f}"
+
+    # --- objects ----------------------------------------------------------
+
+    def _trip(self) -> dict:
+        """Activity taking the person to another city"""
+        origin = self.city
+        if self.city != HOME_CITY and self.rng.random() < 0.6:
+            destination = HOME_CITY
+        else:
+            destination = self.rng.choice([i for i in range(len(CITIES)) if i != origin])
+        o_lat, o_lon = CITIES[origin][3], CITIES[origin][4]
+        d_lat, d_lon = CITIES[destination][3], CITIES[destination][4]
+        km = haversine_km(o_lat, o_lon, d_lat, d_lon)
+        if (origin, destination) in FERRY_ROUTES or (destination, origin) in FERRY_ROUTES:
+            mode = "in ferry"
+        elif km < 350:
+            mode = self.rng.choice(["in passenger vehicle", "in train"])
+        else:
+            mode = "flying"
+
+        start_str = self._local_time(self._advance(1))
+        hours = km / {"flying": 700.0, "in ferry": 25.0}.get(mode, 90.0) + 0.5
+        self.now += timedelta(hours=hours)
+        self.city = destination
+        self.stay_until = self.now + timedelta(days=self.rng.uniform(2, 20) if destination != HOME_CITY
+                                               else self.rng.uniform(10, 60))
+        self.place = self._pick_place()
+        self.points += 2
+        self.shapes["activity"] += 1
+        return {
+            "startTime": start_str,
+            "endTime": self._local_time(self.now),
+            "activity": {
+                "start": self._geo(o_lat, o_lon),
+                "end": self._geo(*self._near_place()),
+                "distanceMeters": f"{km * 1000:.0f}",
+                "topCandidate": {"type": mode, "probability": "0.91"},
+            },
+        }
+
+    def _activity(self) -> dict:
+        start_lat, start_lon = self._near_place()
+        start = self._advance(1)
+        self.place = self._pick_place() if self.rng.random() < 0.5 else self.place
+        end_lat, end_lon = self._near_place()
+        end = self._advance(1)
+        self.points += 2
+        return {
+            "startTime": self._local_time(start),
+            "endTime": self._local_time(end),
+            "activity": {
+                "start": self._geo(start_lat, start_lon),
+                "end": self._geo(end_lat, end_lon),
+                "topCandidate": {"type": self.rng.choice(LOCAL_MODES), "probability": "0.74"},
+            },
+        }
+
+    def _place_visit(self) -> dict:
+        if self.rng.random() < 0.4:
+            self.place = self._pick_place()
+        lat, lon = self._near_place()
+        start = self._advance(1)
+        self.points += 1
+        return {
+            "placeVisit": {
+                "location": {"latitudeE7": round(lat * 1e7), "longitudeE7": round(lon * 1e7),
+                             "placeId": f"synthetic-{self.city}-{self.places[self.city].index(self.place)}"},
+                "duration": {"startTimestamp": self._utc_time(start),
+                             "endTimestamp": self._utc_time(start + timedelta(minutes=self.rng.randint(10, 240)))},
+            }
+        }
+
+    def _activity_segment(self) -> dict:
+        origin = self.place
+        self.place = self._pick_place()
+        waypoint_count = self.rng.randint(10, 60)
+        sampled = len(range(0, waypoint_count, 10))
+        start = self._advance(sampled)
+        waypoints = []
+        for i in range(waypoint_count):
+            f = i / (waypoint_count - 1)
+            lat = origin[0] + (self.place[0] - origin[0]) * f + self.rng.uniform(-PLACE_JITTER, PLACE_JITTER)
+            lon = origin[1] + (self.place[1] - origin[1]) * f + self.rng.uniform(-PLACE_JITTER, PLACE_JITTER)
+            waypoints.append({"latE7": round(lat * 1e7), "lngE7": round(lon * 1e7)})
+        self.points += sampled
+        return {
+            "activitySegment": {
+                "startLocation": {"latitudeE7": waypoints[0]["latE7"], "longitudeE7": waypoints[0]["lngE7"]},
+                "endLocation": {"latitudeE7": waypoints[-1]["latE7"], "longitudeE7": waypoints[-1]["lngE7"]},
+                "duration": {"startTimestamp": self._utc_time(start),
+                             "endTimestamp": self._utc_time(start + timedelta(minutes=self.rng.randint(5, 90)))},
+                "activityType": self.rng.choice(SEGMENT_TYPES),
+                "waypointPath": {"waypoints": waypoints},
+            }
+        }
+
+    def _timeline_path(self) -> dict:
+        count = self.rng.randint(2, 12)
+        start = self._advance(count)
+        path = []
+        offset = 0
+        for _ in range(count):
+            if self.rng.random() < 0.2:
+                self.place = self._pick_place()
+            lat, lon = self._near_place()
+            path.append({"point": self._geo(lat, lon), "durationMinutesOffsetFromStartTime": str(offset)})
+            offset += self.rng.randint(2, 30)
+        self.now = max(self.now, start + timedelta(minutes=offset))
+        self.points += count
+        return {
+            "startTime": self._local_time(start),
+            "endTime": self._local_time(start + timedelta(minutes=offset)),
+            "timelinePath": path,
+        }
+
+    def objects(self):
+        builders = {"activity": self._activity, "placeVisit": self._place_visit,
+                    "activitySegment": self._activity_segment, "timelinePath": self._timeline_path}
+        names = [name for name, _ in SHAPE_WEIGHTS]
+        weights = [weight for _, weight in SHAPE_WEIGHTS]
+        while self.points < self.target_points:
+            if self.now >= self.stay_until and self.target_points - self.points > 2:
+                yield self._trip()
+                continue
+            name = self.rng.choices(names, weights)[0]
+            self.shapes[name] += 1
+            yield builders[name]()
+
+
+def generate(path: str, points: int, seed: int = 1, start: date = date(2020, 1, 1), days: int = 365) -> dict:
+    """
+    Write a synthetic export with about `points` parsed points to path.
+    Returns a description (sizes, date range, object counts) of what was written.
+    """
+    simulator = TimelineSimulator(points, seed, start, days)
+    objects = 0
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        f.write("[\n")
+        for obj in simulator.objects():
+            if objects:
+                f.write(",\n")
+            f.write(json.dumps(obj, separators=(",", ":")))
+            objects += 1
+        f.write("\n]\n")
+    return {
+        "path": path,
+        "points": simulator.points,
+        "objects": objects,
+        "shapes": simulator.shapes,
+        "seed": seed,
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=days)).isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic Google Takeout location history")
+    parser.add_argument("size", help="number of points, e.g. 10k, 1M, 250000")
+    parser.add_argument("output", help="JSON file to write")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2020, 1, 1), help="first day (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=365, help="days covered by the export")
+    args = parser.parse_args()
+
+    info = generate(args.output, parse_size(args.size), args.seed, args.start, args.days)
+    print(f"✅ Wrote {info['points']:,} points in {info['objects']:,} objects to {args.output}")
+    print(f"   {info['start_date']} to {info['end_date']}, shapes: {info['shapes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# load_test_geocoder.py - Throughput and tail latency of the geocoding layer
+"""
+Drives the modern engine's geocode_points() and the legacy reverse_geocode()
+against mock_geocoder.py and reports throughput and latency percentiles, so
+max_concurrent_requests and api_delay can be tuned without real API quota.
+
+By default a mock server is started in-process with the given latency and
+failure settings; --url targets one that is already running instead. Each
+configuration geocodes the same set of distinct coordinates with empty
+caches. Modern-engine latencies come from run_metrics (per request);
+legacy latencies are per reverse_geocode() call, including its api_delay
+sleep. Status counts come from the server.
+
+Usage:
+    python benchmarks/load_test_geocoder.py --points 2000 --concurrency 5,20,50 --latency lognormal:40,0.6
+    python benchmarks/load_test_geocoder.py --rate-429 0.05 --api-delay 0,0.1 --legacy-points 300
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from generate_takeout import CITIES  # noqa: E402
+from mock_geocoder import ENV_VARIABLES, MockGeocoder, MockGeocoderServer  # noqa: E402
+
+
+def sample_coordinates(count: int, seed: int):
+    """Distinct 5-decimal coordinates: mostly around the table cities, some anywhere"""
+    rng = random.Random(seed)
+    coordinates = set()
+    while len(coordinates) < count:
+        if rng.random() < 0.8:
+            city = rng.choice(CITIES)
+            lat, lon = city[3] + rng.uniform(-0.2, 0.2), city[4] + rng.uniform(-0.2, 0.2)
+        else:
+            lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 180)
+        coordinates.add((round(lat, 5), round(lon, 5)))
+    return sorted(coordinates)
+
+
+def server_counts(url: str) -> dict:
+    with urllib.request.urlopen(f"{url}/__stats") as response:
+        return json.load(response)
+
+
+def status_delta(before: dict, after: dict, endpoint: str) -> dict:
+    statuses = after.get(endpoint, {})
+    return {status: count - before.get(endpoint, {}).get(status, 0) for status, count in statuses.items()
+            if count - before.get(endpoint, {}).get(status, 0)}
+
+
+def latency_summary(latencies_s) -> dict:
+    latencies_ms = np.asarray(latencies_s, dtype=np.float64) * 1000
+    if not latencies_ms.size:
+        return {}
+    p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+    return {"p50_ms": round(float(p50), 2), "p90_ms": round(float(p90), 2),
+            "p99_ms": round(float(p99), 2), "max_ms": round(float(latencies_ms.max()), 2)}
+
+
+def run_modern(url: str, coordinates, concurrency: int, api_delay: float) -> dict:
+    from location_analyzer import AnalysisConfig, LocationAnalyzer, LocationPoint
+    from run_metrics import RunMetrics
+
+    shutil.rmtree("config", ignore_errors=True)
+    moment = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    points = [LocationPoint(moment, lat, lon) for lat, lon in coordinates]
+    analyzer = LocationAnalyzer(AnalysisConfig(geoapify_key="load-test", api_delay=api_delay,
+                                               max_concurrent_requests=concurrency, cache_save_interval=0))
+    before = server_counts(url)
+    metrics = RunMetrics().activate()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            asyncio.run(analyzer.geocode_points(points))
+            elapsed = time.perf_counter() - started
+    finally:
+        metrics.deactivate()
+    return {
+        "engine": "modern",
+        "concurrency": concurrency,
+        "api_delay": api_delay,
+        "requests": len(metrics.latencies["geoapify_reverse"]),
+        "seconds": round(elapsed, 3),
+        "statuses": status_delta(before, server_counts(url), "geoapify_reverse"),
+        **latency_summary(metrics.latencies["geoapify_reverse"]),
+    }
+
+
+def run_legacy(url: str, coordinates, api_delay: float, google_fallback: bool) -> dict:
+    import geo_utils
+
+    geo_utils.geo_cache.clear()
+    before = server_counts(url)
+    latencies = []
+    started = time.perf_counter()
+    for lat, lon in coordinates:
+        call_started = time.perf_counter()
+        geo_utils.reverse_geocode(lat, lon, "load-test", "load-test" if google_fallback else "", api_delay, save=False)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    after = server_counts(url)
+    statuses = status_delta(before, after, "geoapify_reverse")
+    if google_fallback:
+        statuses.update({f"google {status}": count for status, count in status_delta(before, after, "google_reverse").items()})
+    return {
+        "engine": "legacy",
+        "concurrency": 1,
+        "api_delay": api_delay,
+        "requests": len(coordinates),
+        "seconds": round(elapsed, 3),
+        "statuses": statuses,
+        **latency_summary(latencies),
+    }
+
+
+def print_row(row: dict):
+    throughput = row["requests"] / row["seconds"] if row["seconds"] else 0.0
+    statuses = ", ".join(f"{status}: {count}" for status, count in sorted(row["statuses"].items()))
+    print(f"  {row['engine']:<7} {row['concurrency']:>5} {row['api_delay']:>6.2f} {row['requests']:>7} "
+          f"{throughput:>9.1f} {row.get('p50_ms', 0):>9.1f} {row.get('p90_ms', 0):>9.1f} "
+          f"{row.get('p99_ms', 0):>9.1f} {row.get('max_ms', 0):>9.1f}   {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the geocoding layer against the mock geocoder")
+    parser.add_argument("--url", help="running mock_geocoder.py to use instead of an in-process one")
+    parser.add_argument("--points", type=int, default=2000, help="distinct coordinates per modern-engine run")
+    parser.add_argument("--legacy-points", type=int, default=200, help="coordinates per legacy run (0 = skip)")
+    parser.add_argument("--concurrency", default="5,20,50", help="max_concurrent_requests values to try")
+    parser.add_argument("--api-delay", default="0", help="api_delay values to try (seconds)")
+    parser.add_argument("--google-fallback", action="store_true", help="give the legacy path a Google key too")
+    parser.add_argument("--latency", default="lognormal:40,0.6", help="mock latency spec (see mock_geocoder.py)")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    server = None
+    url = args.url
+    if url is None:
+        mock = MockGeocoder(args.latency, args.rate_429, args.error_rate, args.malformed_rate, seed=args.seed)
+        server = MockGeocoderServer(mock).start()
+        url = server.url
+    url = url.rstrip("/")
+    for variable in ENV_VARIABLES:
+        os.environ[variable] = url
+
+    # The engines keep their caches under ./config: use a scratch directory
+    work_dir = tempfile.mkdtemp(prefix="location-analyzer-loadtest-")
+    os.chdir(work_dir)
+
+    coordinates = sample_coordinates(max(args.points, args.legacy_points), args.seed)
+    concurrencies = [int(value) for value in args.concurrency.split(",")]
+    delays = [float(value) for value in args.api_delay.split(",")]
+
+    print(f"🌍 Geocoder load test against {url} ({args.points} modern, {args.legacy_points} legacy lookups)")
+    print(f"  {'engine':<7} {'conc':>5} {'delay':>6} {'reqs':>7} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9}   statuses")
+    rows = []
+    try:
+        for api_delay in delays:
+            for concurrency in concurrencies:
+                rows.append(run_modern(url, coordinates[:args.points], concurrency, api_delay))
+                print_row(rows[-1])
+            if args.legacy_points:
+                rows.append(run_legacy(url, coordinates[:args.legacy_points], api_delay, args.google_fallback))
+                print_row(rows[-1])
+    finally:
+        os.chdir(BENCH_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+        if server is not None:
+            server.stop()
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "settings": vars(args), "runs": rows}, f, indent=2)
+        print(f"💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
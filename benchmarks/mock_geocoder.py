@@ -0,0 +1,273 @@
+# mock_geocoder.py - Local stand-in for the geocoding and water-check APIs
+"""
+An aiohttp server that answers like the external APIs the engines call, for
+load-testing the geocoding layer without spending real quota:
+
+    GET  /v1/geocode/reverse          Geoapify reverse (format=json -> results, else GeoJSON features)
+    POST /v1/batch/geocode/reverse    Geoapify batch job ([lon, lat] or {"lat", "lon"} items) -> 202 + job id
+    GET  /v1/batch/geocode/reverse    ?id=... -> 202 while pending, then the results list
+    GET  /maps/api/geocode/json       Google reverse geocode (latlng=lat,lon)
+    GET  /                            OnWater/isitwater (latitude, longitude) -> {"water": bool}
+    GET  /__stats                     request counts per endpoint and status ("malformed" for broken bodies)
+
+Responses depend only on the coordinates: points near a city of
+generate_takeout.CITIES resolve to it, anywhere else gets a synthetic place
+named after its 0.1° grid cell, and about a third of those cells are open
+water. Latency, 429 rate limiting, 5xx errors and malformed bodies are
+injected per request as configured. Point the engines at the server with the
+variables from api_endpoints.py:
+
+    python benchmarks/mock_geocoder.py --port 8765 --latency lognormal:40,0.6 --rate-429 0.02
+    export LOCATION_ANALYZER_GEOAPIFY_URL=http://127.0.0.1:8765
+    export LOCATION_ANALYZER_GOOGLE_URL=http://127.0.0.1:8765
+    export LOCATION_ANALYZER_ONWATER_URL=http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+from aiohttp import web
+
+from generate_takeout import nearest_city
+
+ENV_VARIABLES = ["LOCATION_ANALYZER_GEOAPIFY_URL", "LOCATION_ANALYZER_GOOGLE_URL", "LOCATION_ANALYZER_ONWATER_URL"]
+WATER_SHARE = 0.33  # share of synthetic grid cells that are open water
+
+
+class LatencyModel:
+    """
+    Per-request delay from a spec string (milliseconds):
+    fixed:20, uniform:10,80, lognormal:<median>,<sigma>, exponential:<mean>
+    """
+
+    def __init__(self, spec: str = "fixed:0", rng: Optional[random.Random] = None):
+        self.spec = spec
+        self.rng = rng or random.Random()
+        kind, _, values = spec.partition(":")
+        self.kind = kind
+        self.values = [float(v) for v in values.split(",") if v]
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2, "exponential": 1}
+        if kind not in expected or len(self.values) != expected[kind]:
+            raise ValueError(f"Bad latency spec {spec!r}; use fixed:MS, uniform:LO,HI, lognormal:MEDIAN,SIGMA or exponential:MEAN")
+
+    def sample(self) -> float:
+        """Delay in seconds"""
+        if self.kind == "fixed":
+            ms = self.values[0]
+        elif self.kind == "uniform":
+            ms = self.rng.uniform(*self.values)
+        elif self.kind == "lognormal":
+            median, sigma = self.values
+            ms = median * self.rng.lognormvariate(0.0, sigma)
+        else:
+            ms = self.rng.expovariate(1.0 / self.values[0]) if self.values[0] > 0 else 0.0
+        return max(ms, 0.0) / 1000
+
+
+def describe(lat: float, lon: float) -> Optional[dict]:
+    """Deterministic place for a coordinate; None over open water"""
+    city = nearest_city(lat, lon)
+    if city is not None:
+        return {"city": city[0], "state": city[1], "country": city[2], "category": "populated_place"}
+    cell = f"{round(lat, 1):.1f},{round(lon, 1):.1f}"
+    digest = int(hashlib.md5(cell.encode("ascii")).hexdigest()[:8], 16)
+    if digest % 100 < WATER_SHARE * 100:
+        return None
+    return {"city": f"Cell {cell}", "state": f"Region {round(lat):d},{round(lon):d}",
+            "country": f"Country {digest % 50}", "category": "populated_place"}
+
+
+def geoapify_result(lat: float, lon: float) -> Optional[dict]:
+    place = describe(lat, lon)
+    if place is None:
+        return None
+    return {"lat": lat, "lon": lon, "city": place["city"], "state": place["state"], "country": place["country"],
+            "name": place["city"], "category": place["category"],
+            "formatted": f"{place['city']}, {place['state']}, {place['country']}"}
+
+
+class MockGeocoder:
+    """Request handlers plus the failure injection and statistics they share"""
+
+    def __init__(self, latency: str = "fixed:0", rate_429: float = 0.0, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, batch_delay: float = 1.0, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.rate_429 = rate_429
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.batch_delay = batch_delay  # seconds before a batch job's results are ready
+        self.batch_jobs = {}
+        self.counts = defaultdict(lambda: defaultdict(int))
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/geocode/reverse", self.geoapify_reverse)
+        app.router.add_post("/v1/batch/geocode/reverse", self.geoapify_batch_submit)
+        app.router.add_get("/v1/batch/geocode/reverse", self.geoapify_batch_fetch)
+        app.router.add_get("/maps/api/geocode/json", self.google_reverse)
+        app.router.add_get("/", self.onwater)
+        app.router.add_get("/__stats", self.stats)
+        return app
+
+    async def _respond(self, endpoint: str, build) -> web.Response:
+        """Sleep the sampled latency, then answer with an injected failure or build()"""
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self.rng.random()
+        if roll < self.rate_429:
+            response = web.json_response({"error": "Too Many Requests"}, status=429, headers={"Retry-After": "1"})
+        elif roll < self.rate_429 + self.error_rate:
+            response = web.json_response({"error": "Internal Server Error"}, status=500)
+        elif roll < self.rate_429 + self.error_rate + self.malformed_rate:
+            response = web.Response(text='{"results": [', content_type="application/json")
+            self.counts[endpoint]["malformed"] += 1
+            return response
+        else:
+            try:
+                body, status = build()
+            except (KeyError, ValueError) as e:
+                body, status = {"error": f"Bad request: {e}"}, 400
+            response = web.json_response(body, status=status)
+        self.counts[endpoint][response.status] += 1
+        return response
+
+    async def geoapify_reverse(self, request: web.Request) -> web.Response:
+        def build():
+            lat, lon = float(request.query["lat"]), float(request.query["lon"])
+            result = geoapify_result(lat, lon)
+            if request.query.get("format") == "json":
+                return {"results": [result] if result else []}, 200
+            return {"type": "FeatureCollection",
+                    "features": [{"type": "Feature", "properties": result}] if result else []}, 200
+        return await self._respond("geoapify_reverse", build)
+
+    async def geoapify_batch_submit(self, request: web.Request) -> web.Response:
+        items = await request.json()
+
+        def build():
+            coordinates = []
+            for item in items:
+                if isinstance(item, dict):
+                    coordinates.append((float(item["lat"]), float(item["lon"])))
+                else:
+                    coordinates.append((float(item[1]), float(item[0])))
+            job_id = uuid.uuid4().hex
+            ready_at = asyncio.get_running_loop().time() + self.batch_delay
+            self.batch_jobs[job_id] = (ready_at, coordinates)
+            url = f"{request.url.with_query(None)}?id={job_id}"
+            return {"id": job_id, "status": "pending", "url": url}, 202
+        return await self._respond("geoapify_batch", build)
+
+    async def geoapify_batch_fetch(self, request: web.Request) -> web.Response:
+        def build():
+            ready_at, coordinates = self.batch_jobs[request.query["id"]]
+            if asyncio.get_running_loop().time() < ready_at:
+                return {"id": request.query["id"], "status": "pending"}, 202
+            return [geoapify_result(lat, lon) or {"lat": lat, "lon": lon} for lat, lon in coordinates], 200
+        return await self._respond("geoapify_batch", build)
+
+    async def google_reverse(self, request: web.Request) -> web.Response:
+        def build():
+            lat, lon = (float(v) for v in request.query["latlng"].split(","))
+            place = describe(lat, lon)
+            if place is None:
+                return {"status": "ZERO_RESULTS", "results": []}, 200
+            components = [
+                {"long_name": place["city"], "types": ["locality", "political"]},
+                {"long_name": place["state"], "types": ["administrative_area_level_1", "political"]},
+                {"long_name": place["country"], "types": ["country", "political"]},
+            ]
+            return {"status": "OK", "results": [{
+                "address_components": components, "types": ["street_address"],
+                "formatted_address": f"{place['city']}, {place['state']}, {place['country']}",
+            }]}, 200
+        return await self._respond("google_reverse", build)
+
+    async def onwater(self, request: web.Request) -> web.Response:
+        def build():
+            lat, lon = float(request.query["latitude"]), float(request.query["longitude"])
+            return {"lat": lat, "lon": lon, "water": describe(lat, lon) is None}, 200
+        return await self._respond("onwater", build)
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.snapshot())
+
+    def snapshot(self) -> dict:
+        return {endpoint: {str(status): count for status, count in statuses.items()}
+                for endpoint, statuses in self.counts.items()}
+
+
+class MockGeocoderServer:
+    """MockGeocoder running on its own event loop thread, for use from scripts"""
+
+    def __init__(self, mock: MockGeocoder, host: str = "127.0.0.1", port: int = 0):
+        self.mock = mock
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._thread = None
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "MockGeocoderServer":
+        import threading
+
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._runner = web.AppRunner(self.mock.application(), access_log=None)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, self.host, self.port)
+            self._loop.run_until_complete(site.start())
+            self.port = site._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self._runner.cleanup())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="mock-geocoder", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Geoapify, Google and OnWater APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:MS, uniform:LO,HI, lognormal:MEDIAN,SIGMA, exponential:MEAN")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests answered 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="share of requests with a truncated JSON body")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="seconds until a batch job completes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    mock = MockGeocoder(args.latency, args.rate_429, args.error_rate, args.malformed_rate, args.batch_delay, args.seed)
+    print(f"🌍 Mock geocoder on http://{args.host}:{args.port} (latency {args.latency}, "
+          f"429 {args.rate_429:.0%}, errors {args.error_rate:.0%}, malformed {args.malformed_rate:.0%})")
+    for variable in ENV_VARIABLES:
+        print(f"   export {variable}=http://{args.host}:{args.port}")
+    web.run_app(mock.application(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# run_benchmarks.py - Repeatable performance benchmarks for both analysis engines
+"""
+Times the modern engine stage by stage and both engines end to end on
+synthetic exports from generate_takeout.py, and saves the numbers so later
+runs can be compared against them.
+
+    parse          - LocationAnalyzer.parse_location_data
+    filter         - filter_significant_points on the parsed points
+    geocode        - geocode_points on the filtered points, cold cache
+    jumps          - calculate_jumps
+    time_reports   - generate_time_reports
+    export         - _export_results (CSV files and summary)
+    modern_e2e     - analyze_location_history, staged
+    pipeline_e2e   - analyze_location_history with pipeline_mode
+    legacy_e2e     - legacy_analyzer.process_location_file (up to --legacy-max points)
+
+Geocoding goes through offline_geocoder.py, every benchmark runs with empty
+caches in a scratch working directory, and inputs are generated once per
+size and seed into benchmarks/data/. Each benchmark runs --repeat times;
+results (all run times plus min and median) are written to
+benchmarks/results/ together with the commit and machine they came from.
+
+Usage:
+    python benchmarks/run_benchmarks.py --sizes 10k,100k --repeat 3
+    python benchmarks/run_benchmarks.py --sizes 1M --only parse,filter --compare benchmarks/results/<earlier>.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+
+from generate_takeout import format_size, generate, parse_size  # noqa: E402
+
+BENCHMARKS = ["parse", "filter", "geocode", "jumps", "time_reports", "export",
+              "modern_e2e", "pipeline_e2e", "legacy_e2e"]
+
+
+def dataset_path(data_dir: str, points: int, seed: int, days: int) -> str:
+    return os.path.join(data_dir, f"takeout_{format_size(points)}_s{seed}_d{days}.json")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def reset_caches():
+    """Empty geocode caches, jump index and aggregate stores between runs"""
+    import geo_utils
+    import jump_index
+
+    shutil.rmtree("config", ignore_errors=True)
+    os.makedirs("config", exist_ok=True)
+    geo_utils.geo_cache.clear()
+    jump_index._shared_index = None
+
+
+def time_runs(fn, repeat: int, points: int, setup=None) -> dict:
+    """Run fn() repeat times with its output silenced; returns timings and the last return value"""
+    runs = []
+    value = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            value = fn()
+            runs.append(time.perf_counter() - started)
+    median = statistics.median(runs)
+    return {
+        "runs_s": [round(run, 4) for run in runs],
+        "min_s": round(min(runs), 4),
+        "median_s": round(median, 4),
+        "points_per_s": round(points / median) if median else None,
+        "_value": value,
+    }
+
+
+def run_size(path: str, points: int, start: date, end: date, selected, repeat: int, legacy_max: int) -> dict:
+    from location_analyzer import AnalysisConfig
+    from offline_geocoder import OfflineLocationAnalyzer, install_legacy
+
+    def analyzer(**overrides):
+        return OfflineLocationAnalyzer(AnalysisConfig(geoapify_key="offline", api_delay=0, **overrides))
+
+    results = {}
+
+    def bench(name, fn, setup=reset_caches, needed=False):
+        # Stages later benchmarks depend on run once even when not selected
+        if name not in selected and not needed:
+            return None
+        timing = time_runs(fn, repeat if name in selected else 1, points, setup)
+        value = timing.pop("_value")
+        if name in selected:
+            results[name] = timing
+            print(f"  {name:<14} median {timing['median_s']:>9.3f}s   min {timing['min_s']:>9.3f}s   "
+                  f"{timing['points_per_s'] or 0:>12,} points/s")
+        return value
+
+    staged = {"filter", "geocode", "jumps", "time_reports", "export"}
+    needs = {
+        "parsed": bool(selected & staged),
+        "filtered": bool(selected & (staged - {"filter"})),
+        "geocoded": bool(selected & {"jumps", "time_reports", "export"}),
+    }
+
+    stage_analyzer = analyzer()
+    parsed = bench("parse", lambda: stage_analyzer.parse_location_data(path, start, end), needed=needs["parsed"])
+    filtered = bench("filter", lambda: stage_analyzer.filter_significant_points(parsed), needed=needs["filtered"])
+
+    def geocode():
+        return asyncio.run(analyzer().geocode_points(filtered))
+    geocoded = bench("geocode", geocode, needed=needs["geocoded"])
+
+    jumps = bench("jumps", lambda: stage_analyzer.calculate_jumps(filtered, geocoded),
+                  needed="export" in selected)
+    times = bench("time_reports", lambda: stage_analyzer.generate_time_reports(filtered, geocoded),
+                  needed="export" in selected)
+
+    export_dir = os.path.abspath("export")
+    bench("export", lambda: stage_analyzer._export_results(jumps, times[0], times[1], export_dir))
+
+    def end_to_end(**overrides):
+        output_dir = os.path.abspath("e2e")
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return asyncio.run(analyzer(**overrides).analyze_location_history(path, start, end, output_dir))
+
+    result = bench("modern_e2e", end_to_end)
+    if result is not None:
+        # Per-stage breakdown of the last run, from run_metrics
+        results["modern_e2e"]["stages_s"] = {name: stage["wall_s"] for name, stage in result["metrics"]["stages"].items()}
+    bench("pipeline_e2e", lambda: end_to_end(pipeline_mode=True))
+
+    if "legacy_e2e" in selected:
+        if points > legacy_max:
+            print(f"  legacy_e2e     skipped ({format_size(points)} points > --legacy-max {format_size(legacy_max)})")
+        else:
+            import legacy_analyzer
+            install_legacy()
+
+            def legacy():
+                output_dir = os.path.abspath("legacy")
+                shutil.rmtree(output_dir, ignore_errors=True)
+                os.makedirs(output_dir)
+                return legacy_analyzer.process_location_file(path, start, end, output_dir, "by_city", "offline", "", "",
+                                                             0, 1, lambda message: None, lambda: False)
+            bench("legacy_e2e", legacy)
+    return results
+
+
+def compare(previous_path: str, current: dict, threshold: float) -> int:
+    """Print median changes against an earlier results file; returns the number of regressions"""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\n📊 Compared with {os.path.basename(previous_path)} ({previous.get('commit') or 'unknown commit'})")
+    regressions = 0
+    for size, benchmarks in current["results"].items():
+        for name, timing in benchmarks.items():
+            before = previous.get("results", {}).get(size, {}).get(name)
+            if not before:
+                continue
+            change = (timing["median_s"] - before["median_s"]) / before["median_s"] * 100 if before["median_s"] else 0.0
+            flag = ""
+            if change > threshold:
+                flag = "  ⚠️ slower"
+                regressions += 1
+            elif change < -threshold:
+                flag = "  ✅ faster"
+            print(f"  {size:>6} {name:<14} {before['median_s']:>9.3f}s -> {timing['median_s']:>9.3f}s  {change:+7.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the location analyzer engines on synthetic exports")
+    parser.add_argument("--sizes", default="10k,100k", help="comma-separated point counts (10k ... 10M)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per benchmark")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="comma-separated benchmarks to run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--days", type=int, default=365, help="days covered by the generated exports")
+    parser.add_argument("--legacy-max", default="200k", help="largest size the legacy engine is run on")
+    parser.add_argument("--data-dir", default=os.path.join(BENCH_DIR, "data"))
+    parser.add_argument("--results-dir", default=os.path.join(BENCH_DIR, "results"))
+    parser.add_argument("--compare", help="earlier results file to compare medians against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on regressions")
+    args = parser.parse_args()
+
+    selected = {name.strip() for name in args.only.split(",") if name.strip()}
+    unknown = selected - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    sizes = [parse_size(size) for size in args.sizes.split(",")]
+    data_dir = os.path.abspath(args.data_dir)
+    results_dir = os.path.abspath(args.results_dir)
+    compare_path = os.path.abspath(args.compare) if args.compare else None
+    start = date(2020, 1, 1)
+    end = start + timedelta(days=args.days)
+
+    os.makedirs(data_dir, exist_ok=True)
+    datasets = {}
+    for points in sizes:
+        path = dataset_path(data_dir, points, args.seed, args.days)
+        if not os.path.exists(path):
+            print(f"🧪 Generating {format_size(points)}-point export...")
+            generate(path + ".tmp", points, args.seed, start, args.days)
+            os.replace(path + ".tmp", path)
+        datasets[points] = path
+
+    # Engine modules write caches relative to the working directory: keep them in a scratch dir
+    work_dir = tempfile.mkdtemp(prefix="location-analyzer-bench-")
+    os.chdir(work_dir)
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "days": args.days,
+        "repeat": args.repeat,
+        "results": {},
+    }
+    try:
+        for points in sizes:
+            print(f"\n⏱️ {format_size(points)} points ({os.path.basename(datasets[points])})")
+            report["results"][format_size(points)] = run_size(datasets[points], points, start, end, selected,
+                                                              args.repeat, parse_size(args.legacy_max))
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    os.makedirs(results_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    results_path = os.path.join(results_dir, f"bench-{stamp}{'-' + report['commit'] if report['commit'] else ''}.json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results saved to {results_path}")
+
+    if compare_path:
+        regressions = compare(compare_path, report, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+# chunked_uploads.py - Resumable uploads sent as numbered chunks
+"""
+Large exports are uploaded in chunks instead of one multipart request:
+
+    init      -> upload id, chunk size and chunk count for a file of known size
+    chunk i   -> the raw bytes of chunk i (any order, re-sending is harmless)
+    status    -> chunks received so far, so a client can resume after a disconnect
+    finalize  -> the assembled file, stored content-addressed like save_upload()
+
+Each session lives in <folder>/<upload_id>/. A chunk is written to its own
+file first. Chunks that continue the assembled prefix are then appended to
+data.part and fed to a running SHA-256, so finalizing needs no further pass
+over the data. The manifest records how many chunks data.part holds. After
+a restart a session carries on from there, rehashing data.part once.
+
+Request bodies are read in small blocks and never held in memory whole.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+MANIFEST_FILE = "upload.json"
+DATA_FILE = "data.part"
+READ_SIZE = 1024 * 1024  # bytes copied at a time
+
+_UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """A chunked upload request that can't be honoured (bad chunk, incomplete file, too large)"""
+
+
+class UnknownUpload(UploadError):
+    """No session with this upload id (never started, finalized or expired)"""
+
+
+class _Session:
+    def __init__(self, directory: str, manifest: dict):
+        self.directory = directory
+        self.manifest = manifest
+        self.lock = threading.Lock()
+        self.hasher = None  # SHA-256 of data.part, rebuilt lazily after a restart
+
+    @property
+    def assembled(self) -> int:
+        return self.manifest["assembled"]
+
+    def chunk_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"chunk_{index:06d}")
+
+    def data_path(self) -> str:
+        return os.path.join(self.directory, DATA_FILE)
+
+    def chunk_length(self, index: int) -> int:
+        size, chunk_size = self.manifest["size"], self.manifest["chunk_size"]
+        return min(chunk_size, size - index * chunk_size)
+
+    def write_manifest(self):
+        tmp_path = os.path.join(self.directory, MANIFEST_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_path, os.path.join(self.directory, MANIFEST_FILE))
+
+
+class ChunkedUploadStore:
+    """Chunked upload sessions under one folder; safe to use from concurrent request threads"""
+
+    def __init__(self, folder: str, chunk_size: int = 8 * 1024 * 1024, max_size: int = 10 * 1024 ** 3):
+        self.folder = folder
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _Session] = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def init(self, filename: str, size: int) -> dict:
+        """Start a session for a file of size bytes"""
+        if size <= 0:
+            raise UploadError("The file is empty")
+        if size > self.max_size:
+            raise UploadError(f"The file is larger than the {self.max_size / 1024 ** 3:.1f} GB upload limit")
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.folder, upload_id)
+        os.makedirs(directory)
+        session = _Session(directory, {
+            "filename": filename,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "chunks": -(-size // self.chunk_size),
+            "assembled": 0,
+            "created": time.time()
+        })
+        session.hasher = hashlib.sha256()
+        session.write_manifest()
+        with self._lock:
+            self._sessions[upload_id] = session
+        return self._status(upload_id, session)
+
+    def _session(self, upload_id: str) -> _Session:
+        if not _UPLOAD_ID.match(upload_id):
+            raise UnknownUpload("Unknown upload")
+        with self._lock:
+            session = self._sessions.get(upload_id)
+            if session is not None:
+                return session
+            directory = os.path.join(self.folder, upload_id)
+            try:
+                with open(os.path.join(directory, MANIFEST_FILE), "r", encoding="utf-8") as f:
+                    session = _Session(directory, json.load(f))
+            except (OSError, ValueError):
+                raise UnknownUpload("Unknown upload") from None
+            self._sessions[upload_id] = session
+            return session
+
+    def put_chunk(self, upload_id: str, index: int, stream: BinaryIO) -> dict:
+        """Store chunk index from stream; returns the session status"""
+        session = self._session(upload_id)
+        if not 0 <= index < session.manifest["chunks"]:
+            raise UploadError(f"Chunk {index} is out of range")
+        expected = session.chunk_length(index)
+        tmp_path = session.chunk_path(index) + f".{uuid.uuid4().hex}.tmp"
+        received = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                while True:
+                    block = stream.read(min(READ_SIZE, expected + 1 - received))
+                    if not block:
+                        break
+                    received += len(block)
+                    if received > expected:
+                        break
+                    f.write(block)
+            if received != expected:
+                raise UploadError(f"Chunk {index} has {received} bytes, expected {expected}")
+            with session.lock:
+                if index >= session.assembled:
+                    os.replace(tmp_path, session.chunk_path(index))
+                    try:
+                        self._assemble(session)
+                    except Exception:
+                        session.hasher = None  # data.part is trimmed and rehashed on the next chunk
+                        raise
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self._status(upload_id, session)
+
+    def _assemble(self, session: _Session):
+        """Append chunks that continue data.part, hashing them (called with session.lock held)"""
+        if session.hasher is None:
+            self._rehash(session)
+        assembled = session.assembled
+        if not os.path.exists(session.chunk_path(assembled)):
+            return
+        with open(session.data_path(), "ab") as data:
+            while os.path.exists(session.chunk_path(assembled)):
+                with open(session.chunk_path(assembled), "rb") as chunk:
+                    while True:
+                        block = chunk.read(READ_SIZE)
+                        if not block:
+                            break
+                        session.hasher.update(block)
+                        data.write(block)
+                assembled += 1
+            data.flush()
+            os.fsync(data.fileno())
+        session.manifest["assembled"] = assembled
+        session.write_manifest()
+        for index in range(session.assembled - 1, -1, -1):
+            if not os.path.exists(session.chunk_path(index)):
+                break
+            os.remove(session.chunk_path(index))
+
+    def _rehash(self, session: _Session):
+        """Rebuild the running hash from data.part, dropping bytes the manifest doesn't cover"""
+        length = sum(session.chunk_length(index) for index in range(session.assembled))
+        session.hasher = hashlib.sha256()
+        if not os.path.exists(session.data_path()):
+            open(session.data_path(), "wb").close()
+        with open(session.data_path(), "r+b") as data:
+            data.truncate(length)
+            while True:
+                block = data.read(READ_SIZE)
+                if not block:
+                    break
+                session.hasher.update(block)
+
+    def _status(self, upload_id: str, session: _Session) -> dict:
+        manifest = session.manifest
+        pending = [index for index in range(manifest["assembled"], manifest["chunks"])
+                   if os.path.exists(session.chunk_path(index))]
+        return {
+            "upload_id": upload_id,
+            "filename": manifest["filename"],
+            "size": manifest["size"],
+            "chunk_size": manifest["chunk_size"],
+            "chunks": manifest["chunks"],
+            "received": list(range(manifest["assembled"])) + pending,
+            "complete": manifest["assembled"] == manifest["chunks"]
+        }
+
+    def status(self, upload_id: str) -> dict:
+        session = self._session(upload_id)
+        with session.lock:
+            return self._status(upload_id, session)
+
+    def finalize(self, upload_id: str, dest_folder: str, suffix: str) -> Tuple[str, str, bool]:
+        """
+        Move the assembled file to dest_folder/<sha256><suffix> and end the
+        session. Returns (digest, path, existed) like save_upload().
+        """
+        session = self._session(upload_id)
+        with session.lock:
+            if session.assembled != session.manifest["chunks"]:
+                missing = session.manifest["chunks"] - session.assembled
+                raise UploadError(f"The upload is incomplete: {missing} chunks missing")
+            if session.hasher is None:
+                self._rehash(session)
+            content_hash = session.hasher.hexdigest()
+            os.makedirs(dest_folder, exist_ok=True)
+            path = os.path.join(dest_folder, f"{content_hash}{suffix}")
+            # An already stored copy is left untouched (see upload_store.py); the session's data goes with it
+            existed = os.path.exists(path)
+            if not existed:
+                os.replace(session.data_path(), path)
+            self._discard(upload_id, session)
+        return content_hash, path, existed
+
+    def _discard(self, upload_id: str, session: _Session):
+        for name in os.listdir(session.directory):
+            os.remove(os.path.join(session.directory, name))
+        os.rmdir(session.directory)
+        with self._lock:
+            self._sessions.pop(upload_id, None)
+
+    def forget(self, upload_ids: List[str]):
+        """Drop cached state of sessions whose folders were removed (e.g. by the retention sweep)"""
+        with self._lock:
+            for upload_id in upload_ids:
+                self._sessions.pop(upload_id, None)
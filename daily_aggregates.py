@@ -0,0 +1,144 @@
+# daily_aggregates.py - Persisted per-day analysis results for incremental re-runs
+"""
+Per-day aggregates saved by the modern engine so a later run over an extended
+date range only has to parse and geocode the days it hasn't seen yet.
+
+One store is kept per dataset (by default the absolute path of the location
+history file) in config/aggregates/. Each store holds:
+
+    days            - {"YYYY-MM-DD": {"city": {...}, "state": {...},
+                       "jumps": [...], "mode_jumps": [...], "distance": miles}}
+    sealed_through  - last day whose aggregates are final
+    carry           - analysis state at the end of the sealed day (last point
+                      kept by the significance filter, last geocoded point,
+                      transport-mode pairing state) so the next run can
+                      continue exactly where this one stopped
+
+Boundary day: the last day of an export is usually incomplete, so a run only
+seals days strictly before the last day it saw data for (and before its end
+date). Dwell time is credited to the day an interval starts, but an interval
+is only stored once its end is sealed too. City jumps are stored under the
+day they arrive, transport-mode jumps under the day they depart (their CSV
+date).
+
+Invalidation: the store records a fingerprint of every setting that changes
+the per-day numbers (filter thresholds, cache precision, mode inference and
+the aggregate format version). A store with a different fingerprint or start
+date is ignored and replaced by the next full run. Edits to days that were
+already sealed are not detected; delete the store (or change the dataset id)
+after re-exporting history that rewrites old days.
+"""
+
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+AGGREGATE_VERSION = 1
+DEFAULT_STORE_DIR = "config/aggregates"
+
+
+def settings_fingerprint(config) -> str:
+    """Hash of the AnalysisConfig fields that affect per-day aggregates"""
+    settings = {
+        "version": AGGREGATE_VERSION,
+        "min_distance_filter": config.min_distance_filter,
+        "min_time_filter": config.min_time_filter,
+        "cache_precision": config.cache_precision,
+        "infer_transport_modes": config.infer_transport_modes,
+    }
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def empty_day() -> dict:
+    return {"city": {}, "state": {}, "jumps": [], "mode_jumps": [], "distance": 0.0}
+
+
+def add_times(totals: Dict[str, float], times: Dict[str, float]):
+    for label, days in times.items():
+        totals[label] = totals.get(label, 0.0) + days
+
+
+class DailyAggregateStore:
+    """Sealed per-day aggregates plus the carry-over state for one dataset"""
+
+    def __init__(self, dataset_id: str, fingerprint: str, start_date: date,
+                 directory: str = DEFAULT_STORE_DIR):
+        self.dataset_id = dataset_id
+        self.fingerprint = fingerprint
+        self.start_date = start_date
+        self.sealed_through: Optional[date] = None
+        self.days: Dict[str, dict] = {}
+        self.carry: dict = {}
+        self.path = store_path(dataset_id, directory)
+
+    @classmethod
+    def load(cls, dataset_id: str, directory: str = DEFAULT_STORE_DIR) -> Optional["DailyAggregateStore"]:
+        path = store_path(dataset_id, directory)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            store = cls(data["dataset_id"], data["fingerprint"], date.fromisoformat(data["start_date"]), directory)
+            store.sealed_through = date.fromisoformat(data["sealed_through"])
+            store.days = data.get("days", {})
+            store.carry = data.get("carry", {})
+            return store
+        except Exception as e:
+            print(f"⚠️ Ignoring aggregate store {path}: {e}")
+            return None
+
+    def save(self):
+        if self.sealed_through is None:
+            return
+        data = {
+            "dataset_id": self.dataset_id,
+            "fingerprint": self.fingerprint,
+            "start_date": self.start_date.isoformat(),
+            "sealed_through": self.sealed_through.isoformat(),
+            "days": self.days,
+            "carry": self.carry,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"⚠️ Failed to save aggregate store {self.path}: {e}")
+
+    def reuse_reason(self, fingerprint: str, start_date: date, end_date: date) -> Optional[str]:
+        """None when this store can seed a run over start_date..end_date, else why not"""
+        if self.fingerprint != fingerprint:
+            return "analysis settings changed"
+        if self.start_date != start_date:
+            return f"stored aggregates start on {self.start_date}"
+        if self.sealed_through is None or end_date <= self.sealed_through:
+            return f"stored aggregates already run through {self.sealed_through}"
+        return None
+
+    @property
+    def resume_date(self) -> date:
+        """First day the next run still has to parse"""
+        return self.sealed_through + timedelta(days=1)
+
+    def day(self, day: date) -> dict:
+        return self.days.setdefault(day.isoformat(), empty_day())
+
+    def merge_day(self, day: date, city: Dict[str, float] = None, state: Dict[str, float] = None,
+                  jumps=(), mode_jumps=()):
+        record = self.day(day)
+        add_times(record["city"], city or {})
+        add_times(record["state"], state or {})
+        for jump in jumps:
+            record["jumps"].append(jump)
+            record["distance"] += jump[2]
+        record["mode_jumps"].extend(mode_jumps)
+
+
+def store_path(dataset_id: str, directory: str = DEFAULT_STORE_DIR) -> str:
+    name = hashlib.sha1(dataset_id.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, f"{name}.json")
@@ -3,6 +3,9 @@ import json
 import time
 import requests
 import math
+from concurrent.futures import ThreadPoolExecutor
+from water_mask import get_water_mask, WATER, LAND
+from api_endpoints import geoapify_url, google_url, onwater_url
 
 # Ensure config directory exists
 os.makedirs('config', exist_ok=True)
@@ -20,12 +23,12 @@ if os.path.exists(cache_file):
 def save_geo_cache():
     try:
         with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(geo_cache, f)
+            json.dump(dict(geo_cache), f)
         print(f"Saved {len(geo_cache)} cache entries to {cache_file}")
     except Exception as e:
         print(f"⚠️ Failed to save config/geo_cache.json: {e}")
 
-def reverse_geocode(lat, lon, geoapify_key, google_key, delay=0.5, log_func=None):
+def reverse_geocode(lat, lon, geoapify_key, google_key, delay=0.5, log_func=None, save=True):
     key = f"{round(lat, 5)},{round(lon, 5)}"
     key_fallback = f"{round(lat, 4)},{round(lon, 4)}"  # Fallback for old cache
     if key in geo_cache:
@@ -42,7 +45,7 @@ def reverse_geocode(lat, lon, geoapify_key, google_key, delay=0.5, log_func=None
 
     result = {}
     if geoapify_key:
-        url = f"https://api.geoapify.com/v1/geocode/reverse?lat={lat}&lon={lon}&apiKey={geoapify_key}"
+        url = geoapify_url(f"/v1/geocode/reverse?lat={lat}&lon={lon}&apiKey={geoapify_key}")
         try:
             response = requests.get(url)
             response.raise_for_status()
@@ -66,7 +69,7 @@ def reverse_geocode(lat, lon, geoapify_key, google_key, delay=0.5, log_func=None
                 log_func(f"Geoapify error for ({lat:.5f}, {lon:.5f}): {e}")
 
     if not result and google_key:
-        url = f"https://maps.googleapis.com/maps/api/geocode/json?latlng={lat},{lon}&key={google_key}"
+        url = google_url(f"/maps/api/geocode/json?latlng={lat},{lon}&key={google_key}")
         try:
             response = requests.get(url)
             response.raise_for_status()
@@ -100,16 +103,18 @@ def reverse_geocode(lat, lon, geoapify_key, google_key, delay=0.5, log_func=None
                 log_func(f"Google Maps error for ({lat:.5f}, {lon:.5f}): {e}")
 
     geo_cache[key] = result
-    save_geo_cache()
+    if save:
+        save_geo_cache()
 
     if delay:
         time.sleep(delay)
 
     return result
 
-def is_over_water(lat, lon, onwater_key, delay=0.5, log_func=None, geoapify_key="", google_key=""):
+def is_over_water(lat, lon, onwater_key, delay=0.5, log_func=None, geoapify_key="", google_key="", save=True):
     """
-    Checks if a point is over water using OnWater API with retry logic.
+    Checks if a point is over water using the offline water mask when one is
+    installed, then the OnWater API with retry logic for ambiguous cells.
     Falls back to Geoapify/Google if OnWater fails.
     Returns True if over water, False if land, None on error.
     """
@@ -124,16 +129,26 @@ def is_over_water(lat, lon, onwater_key, delay=0.5, log_func=None, geoapify_key=
             log_func(f"🌊 HIT (fallback): ({lat:.5f}, {lon:.5f}) => {'Water' if geo_cache[key_fallback] else 'Land'}")
         return geo_cache[key_fallback]
 
+    # Offline mask first; only coastline cells it can't decide go to the network
+    mask = get_water_mask()
+    if mask is not None:
+        verdict = mask.is_water(lat, lon)
+        if verdict is not None:
+            if log_func:
+                log_func(f"🌊 MASK: ({lat:.5f}, {lon:.5f}) => {'Water' if verdict else 'Land'}")
+            return verdict
+
     if not onwater_key:
         if log_func:
             log_func("⚠️ OnWater API key missing; falling back to Geoapify/Google.")
-        result = reverse_geocode(lat, lon, geoapify_key, google_key, delay, log_func)
+        result = reverse_geocode(lat, lon, geoapify_key, google_key, delay, log_func, save=save)
         is_water = result.get("is_water", False)
         geo_cache[key] = is_water
-        save_geo_cache()
+        if save:
+            save_geo_cache()
         return is_water
 
-    url = f"https://isitwater-com.p.rapidapi.com/?latitude={lat}&longitude={lon}"
+    url = onwater_url(f"/?latitude={lat}&longitude={lon}")
     headers = {
         "x-rapidapi-key": onwater_key,
         "x-rapidapi-host": "isitwater-com.p.rapidapi.com"
@@ -146,7 +161,8 @@ def is_over_water(lat, lon, onwater_key, delay=0.5, log_func=None, geoapify_key=
             data = response.json()
             is_water = data.get("water", False)
             geo_cache[key] = is_water
-            save_geo_cache()
+            if save:
+                save_geo_cache()
             if log_func:
                 log_func(f"🌊 Water check for ({lat:.5f}, {lon:.5f}): {'Water' if is_water else 'Land'}")
             if delay:
@@ -172,12 +188,65 @@ def is_over_water(lat, lon, onwater_key, delay=0.5, log_func=None, geoapify_key=
 
     if log_func:
         log_func(f"⚠️ OnWater failed for ({lat:.5f}, {lon:.5f}); falling back to Geoapify/Google")
-    result = reverse_geocode(lat, lon, geoapify_key, google_key, delay, log_func)
+    result = reverse_geocode(lat, lon, geoapify_key, google_key, delay, log_func, save=save)
     is_water = result.get("is_water", False)
     geo_cache[key] = is_water
-    save_geo_cache()
+    if save:
+        save_geo_cache()
     return is_water
 
+def check_water_batch(points, onwater_key, delay=0.5, log_func=None, geoapify_key="", google_key="", max_workers=4):
+    """
+    Resolves many water checks in one go.
+    Points are deduplicated by their 5-decimal cache cell, answered from the
+    cache, then the offline water mask (one vectorized lookup), and only the
+    remaining cells are probed concurrently. The cache is saved once at the end.
+    Returns {(round(lat, 5), round(lon, 5)): True/False/None}.
+    """
+    cells = {}
+    for lat, lon in points:
+        cells.setdefault((round(lat, 5), round(lon, 5)), (lat, lon))
+
+    results = {}
+    undecided = []
+    for cell, (lat, lon) in cells.items():
+        key = f"water:{cell[0]},{cell[1]}"
+        key_fallback = f"water:{round(lat, 4)},{round(lon, 4)}"
+        if key in geo_cache:
+            results[cell] = geo_cache[key]
+        elif key_fallback in geo_cache:
+            results[cell] = geo_cache[key_fallback]
+        else:
+            undecided.append(cell)
+
+    mask = get_water_mask()
+    if mask is not None and undecided:
+        verdicts = mask.classify([cells[c][0] for c in undecided], [cells[c][1] for c in undecided])
+        still_undecided = []
+        for cell, verdict in zip(undecided, verdicts):
+            if verdict == WATER:
+                results[cell] = True
+            elif verdict == LAND:
+                results[cell] = False
+            else:
+                still_undecided.append(cell)
+        undecided = still_undecided
+
+    if log_func:
+        log_func(f"🌊 Water batch: {len(points)} points, {len(cells)} cells, {len(cells) - len(undecided)} resolved locally, {len(undecided)} to probe")
+
+    if undecided:
+        def probe(cell):
+            lat, lon = cells[cell]
+            return cell, is_over_water(lat, lon, onwater_key, delay, log_func, geoapify_key, google_key, save=False)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for cell, verdict in executor.map(probe, undecided):
+                results[cell] = verdict
+        save_geo_cache()
+
+    return results
+
 def haversine_distance(lat1, lon1, lat2, lon2):
     R = 3958.8  # miles
     phi1 = math.radians(lat1)
@@ -6,6 +6,7 @@ import threading
 from datetime import datetime, date
 import json
 from analyzer_bridge import process_location_file
+from input_sources import load_location_json
 import pandas as pd
 
 # Ensure config directory exists and set config file path
@@ -93,7 +94,8 @@ class LocationAnalyzerApp:
         self.log(msg)
 
     def browse_file(self):
-        path = filedialog.askopenfilename(filetypes=[("JSON files", "*.json")])
+        path = filedialog.askopenfilename(filetypes=[("Location history", "*.json *.json.gz *.gz *.zip *.zst"),
+                                                     ("All files", "*.*")])
         if path:
             self.file_path.set(path)
             self.current_file_path = path
@@ -124,8 +126,7 @@ class LocationAnalyzerApp:
 
     def _display_file_date_range(self, file_path):
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = load_location_json(file_path)
             dates = []
             timeline_objects = data.get("timelineObjects", data) if isinstance(data, dict) else data
             for obj in timeline_objects:
@@ -254,7 +255,10 @@ class LocationAnalyzerApp:
     def _run_analysis_thread(self, *args):
         try:
             process_location_file(*args)
-            self.root.after(0, self.log, "✅ Analysis complete. All CSV files generated successfully.")
+            if self.cancel_requested.is_set():
+                self.root.after(0, self.log, "❌ Analysis canceled; geocoding done so far was kept in the cache.")
+            else:
+                self.root.after(0, self.log, "✅ Analysis complete. All CSV files generated successfully.")
         except Exception as e:
             self.root.after(0, self.log, f"❌ Analysis failed: {e}")
         finally:
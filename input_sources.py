@@ -0,0 +1,228 @@
+# input_sources.py - Open location history exports, compressed or not
+"""
+Takeout exports compress 10-20x, so the analyzers and the web app accept
+them compressed as well as plain JSON:
+
+    .json       plain JSON
+    .json.gz    gzip
+    .zip        a Takeout archive, or any zip with the history JSON inside
+    .zst        Zstandard (needs the optional `zstandard` package)
+
+open_location_file() recognizes the format by its first bytes, not its
+name, so a file stored under another name (e.g. a content hash) opens
+the same way. It returns a text stream that decompresses as it is read.
+The uncompressed JSON never touches the disk.
+
+A zip archive must hold the history in one JSON member. The member is
+chosen by name when it is a known export file (location-history.json,
+Timeline.json, Records.json), and otherwise as the largest JSON member.
+
+iter_timeline_objects() parses the timeline list one object at a time as
+the file is read, for callers that want to start work before the whole
+document is parsed and without holding it in memory.
+"""
+
+import gzip
+import io
+import json
+import os
+import re
+import zipfile
+from typing import IO, Iterator, Optional
+
+ZSTD_AVAILABLE = False
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    pass
+
+# Accepted file name endings, for upload forms and directory scans
+SUPPORTED_SUFFIXES = (".json", ".json.gz", ".gz", ".zip", ".json.zst", ".zst")
+
+# Export files a zip archive is searched for, best first
+KNOWN_MEMBER_NAMES = ("location-history.json", "timeline.json", "records.json")
+
+READ_CHARS = 64 * 1024  # characters read at a time by iter_timeline_objects
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZIP_MAGIC = b"PK\x03\x04"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def input_suffix(filename: str) -> Optional[str]:
+    """The supported ending of filename (longest match, lower case), or None"""
+    name = filename.lower()
+    for suffix in sorted(SUPPORTED_SUFFIXES, key=len, reverse=True):
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def detect_format(path: str) -> str:
+    """'gzip', 'zip', 'zstd' or 'json', from the file's first bytes"""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    if head.startswith(_GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(_ZIP_MAGIC):
+        return "zip"
+    if head.startswith(_ZSTD_MAGIC):
+        return "zstd"
+    return "json"
+
+
+def _zip_member(archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+    members = [info for info in archive.infolist()
+               if not info.is_dir() and info.filename.lower().endswith(".json")
+               and not os.path.basename(info.filename).startswith(".")]
+    if not members:
+        raise ValueError("The zip archive contains no JSON file")
+    for known in KNOWN_MEMBER_NAMES:
+        for info in members:
+            if os.path.basename(info.filename).lower() == known:
+                return info
+    return max(members, key=lambda info: info.file_size)
+
+
+def open_location_file(path: str) -> IO[str]:
+    """Text stream of the JSON in path, decompressing on the fly; close it (or use `with`) when done"""
+    file_format = detect_format(path)
+    if file_format == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if file_format == "zip":
+        archive = zipfile.ZipFile(path)
+        try:
+            member = archive.open(_zip_member(archive))
+        except Exception:
+            archive.close()
+            raise
+        # The member stream keeps its own handle on the file; closing the archive object is safe
+        archive.close()
+        return io.TextIOWrapper(member, encoding="utf-8")
+    if file_format == "zstd":
+        if not ZSTD_AVAILABLE:
+            raise ImportError("Reading .zst files needs the zstandard package: pip install zstandard")
+        raw = open(path, "rb")
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        except Exception:
+            raw.close()
+            raise
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def load_location_json(path: str):
+    """Parsed JSON of a (possibly compressed) location history file"""
+    with open_location_file(path) as f:
+        return json.load(f)
+
+
+class _JsonStream:
+    """Reads JSON values one after another from a text stream, keeping only the unread rest in memory"""
+
+    def __init__(self, stream: IO[str]):
+        self.stream = stream
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        """Append more of the stream (at least as much as is buffered, so retries stay linear)"""
+        pending = len(self.buffer) - self.pos
+        chunk = self.stream.read(max(READ_CHARS, pending))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it ('' at the end)"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Malformed location history: expected {char!r}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete value"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A value ending with the buffer may continue in the stream (e.g. a number)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def array_items(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            char = self.peek()
+            self.pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError("Malformed location history: expected ',' or ']'")
+
+
+def iter_timeline_objects(path: str) -> Iterator:
+    """
+    Items of the history's timeline list in file order, decoded one at a time
+    while the file is read: the top-level list, or the "timelineObjects" list
+    of a top-level object. Yields what iterating
+    data.get("timelineObjects", data) over load_location_json(path) would.
+    """
+    with open_location_file(path) as f:
+        reader = _JsonStream(f)
+        if reader.peek() != "{":
+            if reader.peek() == "[":
+                yield from reader.array_items()
+            else:
+                yield from reader.value()
+            return
+
+        # An object: stream its timelineObjects member, skip the others
+        keys = []
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.value()
+            reader.expect(":")
+            if key == "timelineObjects":
+                if reader.peek() == "[":
+                    yield from reader.array_items()
+                else:
+                    yield from reader.value()
+                keys = None
+            else:
+                reader.value()
+                if keys is not None:
+                    keys.append(key)
+            if reader.peek() != ",":
+                break
+            reader.expect(",")
+        reader.expect("}")
+        if keys is not None:
+            # No timeline list: iterating the object yields its keys
+            yield from keys
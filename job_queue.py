@@ -0,0 +1,178 @@
+# job_queue.py - Bounded, per-user fair job queue for the web app's analyses
+"""
+JobScheduler runs submitted jobs on a fixed number of worker threads, and
+holds the rest in a bounded queue instead of starting a thread per upload.
+
+Fairness: when a worker frees up, the next job comes from the user with the
+fewest jobs currently running. Ties go to the user who was served least
+recently. Each user's own jobs run in the order they were submitted. One
+user's large uploads therefore occupy at most their share of the workers,
+and other users' jobs are never stuck behind the whole backlog. Optional
+per-user caps keep one user from filling the queue itself.
+
+Queue positions follow the same policy. stats() reports queue depth,
+running jobs and recent wait times for the /queue endpoint.
+"""
+
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+WAIT_HISTORY = 200  # started jobs kept for the wait-time statistics
+
+
+class QueueFull(Exception):
+    """Raised by submit() when the queue (or the user's share of it) has no room"""
+
+
+@dataclass
+class Job:
+    job_id: str
+    user: str
+    fn: Callable
+    args: Tuple
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+
+
+class JobScheduler:
+    """Fixed pool of worker threads fed from a bounded, per-user fair queue"""
+
+    def __init__(self, workers: int = 2, max_queued: int = 20, max_queued_per_user: Optional[int] = None):
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self._condition = threading.Condition()
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._running: Dict[str, Job] = {}
+        self._last_served: Dict[str, int] = {}
+        self._served = 0
+        self._waits: Deque[float] = deque(maxlen=WAIT_HISTORY)
+        self._completed = 0
+        self._threads: List[threading.Thread] = []
+
+    # Queue state is only touched with self._condition held
+
+    def _queued_count(self) -> int:
+        return sum(len(jobs) for jobs in self._queues.values())
+
+    def _running_by_user(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self._running.values():
+            counts[job.user] = counts.get(job.user, 0) + 1
+        return counts
+
+    def _dispatch_order(self) -> List[Job]:
+        """Queued jobs in the order workers will take them, if nothing else arrives"""
+        running = self._running_by_user()
+        last_served = dict(self._last_served)
+        queues = {user: list(jobs) for user, jobs in self._queues.items() if jobs}
+        order, served = [], self._served
+        while queues:
+            user = min(queues, key=lambda u: (running.get(u, 0), last_served.get(u, -1), queues[u][0].submitted_at))
+            order.append(queues[user].pop(0))
+            if not queues[user]:
+                del queues[user]
+            running[user] = running.get(user, 0) + 1
+            served += 1
+            last_served[user] = served
+        return order
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"analysis-worker-{len(self._threads) + 1}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queued_count():
+                    self._condition.wait()
+                job = self._dispatch_order()[0]
+                queue = self._queues[job.user]
+                queue.popleft()
+                if not queue:
+                    del self._queues[job.user]
+                self._served += 1
+                self._last_served[job.user] = self._served
+                job.started_at = time.time()
+                self._waits.append(job.started_at - job.submitted_at)
+                self._running[job.job_id] = job
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                print(f"⚠️ Job {job.job_id} failed: {e}")
+            finally:
+                with self._condition:
+                    self._running.pop(job.job_id, None)
+                    self._completed += 1
+
+    def has_room(self, user: str) -> bool:
+        """Whether submit() would accept a job from user right now"""
+        with self._condition:
+            return self._has_room(user)
+
+    def _has_room(self, user: str) -> bool:
+        if self._queued_count() >= self.max_queued:
+            return False
+        if self.max_queued_per_user is not None and len(self._queues.get(user, ())) >= self.max_queued_per_user:
+            return False
+        return True
+
+    def submit(self, job_id: str, user: str, fn: Callable, *args) -> int:
+        """Queue fn(*args) for user; returns the job's queue position (1 = next). Raises QueueFull."""
+        with self._condition:
+            if not self._has_room(user):
+                raise QueueFull("The analysis queue is full, please try again later")
+            self._queues.setdefault(user, deque()).append(Job(job_id, user, fn, args))
+            self._start_workers()
+            self._condition.notify()
+            return self._position(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a job that hasn't started yet; False when it is running or unknown"""
+        with self._condition:
+            for user, jobs in self._queues.items():
+                for job in jobs:
+                    if job.job_id == job_id:
+                        jobs.remove(job)
+                        if not jobs:
+                            del self._queues[user]
+                        return True
+            return False
+
+    def _position(self, job_id: str) -> Optional[int]:
+        for position, job in enumerate(self._dispatch_order(), 1):
+            if job.job_id == job_id:
+                return position
+        return None
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place of a queued job in the dispatch order; None once it started"""
+        with self._condition:
+            return self._position(job_id)
+
+    def stats(self) -> dict:
+        with self._condition:
+            now = time.time()
+            waits = sorted(self._waits)
+            oldest = min((job.submitted_at for jobs in self._queues.values() for job in jobs), default=None)
+            return {
+                "workers": self.workers,
+                "running": len(self._running),
+                "queued": self._queued_count(),
+                "max_queued": self.max_queued,
+                "max_queued_per_user": self.max_queued_per_user,
+                "users_waiting": len(self._queues),
+                "completed": self._completed,
+                "oldest_wait_s": round(now - oldest, 1) if oldest is not None else None,
+                "wait_s": {
+                    "samples": len(waits),
+                    "avg": round(sum(waits) / len(waits), 2) if waits else None,
+                    "p90": round(waits[int(0.9 * (len(waits) - 1))], 2) if waits else None,
+                    "max": round(waits[-1], 2) if waits else None,
+                },
+            }
@@ -0,0 +1,142 @@
+# jump_index.py - Persistent, direction-insensitive water classification of jump segments
+"""
+Shared jump index used by both analysis engines.
+
+Each entry records whether the segment between two points crosses water.
+Endpoints are quantized to integer grid cells and the pair is stored in a
+canonical order, so A->B and B->A share one entry and repeat trips (the same
+ferry twice a day, a daily commute) are only ever probed once.
+
+Cells use the precision of the geocode cache keys (5 decimals, about 1 m),
+rounded like the "jump:lat,lon:lat,lon" keys the engines kept in
+config/geo_cache.json before, so distinct nearby endpoints keep their own
+verdicts. Those older entries are folded in the first time either engine
+loads its cache. The old lookup fell back to 4-decimal keys; entries that
+served as such keys are kept in a fallback map consulted the same way.
+
+The index lives next to the geocode cache in config/jump_index.json.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+DEFAULT_INDEX_FILE = "config/jump_index.json"
+DEFAULT_CELL_PRECISION = 5  # decimal places, as in the geocode cache keys
+FALLBACK_PRECISION = 4  # precision old "jump:" keys were looked up at when the exact key was missing
+
+Cell = Tuple[int, int]
+
+
+def quantize_cell(lat: float, lon: float, precision: int = DEFAULT_CELL_PRECISION) -> Cell:
+    """Integer grid cell for a coordinate, rounded like round(lat, precision) in the old cache keys"""
+    scale = 10 ** precision
+    return int(round(round(lat, precision) * scale)), int(round(round(lon, precision) * scale))
+
+
+def _pair_key(a: Cell, b: Cell) -> str:
+    if b < a:
+        a, b = b, a
+    return f"{a[0]},{a[1]}|{b[0]},{b[1]}"
+
+
+class JumpIndex:
+    """Water/land verdicts keyed by an unordered pair of quantized cells"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_FILE, precision: int = DEFAULT_CELL_PRECISION):
+        self.path = path
+        self.precision = precision
+        self.entries: Dict[str, bool] = {}
+        self.fallback: Dict[str, bool] = {}  # migrated entries by FALLBACK_PRECISION cells, read-only
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def key(self, lat1: float, lon1: float, lat2: float, lon2: float) -> str:
+        """Canonical key for the segment, identical in both directions"""
+        return _pair_key(quantize_cell(lat1, lon1, self.precision), quantize_cell(lat2, lon2, self.precision))
+
+    def _fallback_key(self, lat1: float, lon1: float, lat2: float, lon2: float) -> str:
+        return _pair_key(quantize_cell(lat1, lon1, FALLBACK_PRECISION), quantize_cell(lat2, lon2, FALLBACK_PRECISION))
+
+    def get(self, lat1: float, lon1: float, lat2: float, lon2: float) -> Optional[bool]:
+        """Verdict for the segment, falling back to a migrated 4-decimal entry like the old cache lookup"""
+        verdict = self.entries.get(self.key(lat1, lon1, lat2, lon2))
+        if verdict is None and self.fallback:
+            verdict = self.fallback.get(self._fallback_key(lat1, lon1, lat2, lon2))
+        return verdict
+
+    def set(self, lat1: float, lon1: float, lat2: float, lon2: float, is_water: bool):
+        with self._lock:
+            self.entries[self.key(lat1, lon1, lat2, lon2)] = bool(is_water)
+            self._dirty = True
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("precision") == self.precision:
+                self.entries = {k: bool(v) for k, v in data.get("entries", {}).items()}
+                self.fallback = {k: bool(v) for k, v in data.get("fallback", {}).items()}
+            else:
+                print(f"⚠️ Ignoring {self.path}: built at precision {data.get('precision')}, expected {self.precision}")
+        except Exception as e:
+            print(f"⚠️ Failed to load {self.path}: {e}")
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            entries = dict(self.entries)
+            fallback = dict(self.fallback)
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"precision": self.precision, "entries": entries, "fallback": fallback}, f)
+        except Exception as e:
+            print(f"⚠️ Failed to save {self.path}: {e}")
+
+    def migrate_legacy_entries(self, cache: dict) -> int:
+        """Fold old directional "jump:lat,lon:lat,lon" cache entries into the index"""
+        migrated = 0
+        for key, value in cache.items():
+            if not key.startswith("jump:") or not isinstance(value, bool):
+                continue
+            try:
+                start, end = key[len("jump:"):].split(":")
+                parts = start.split(",") + end.split(",")
+                lat1, lon1, lat2, lon2 = (float(v) for v in parts)
+            except ValueError:
+                continue
+            index_key = self.key(lat1, lon1, lat2, lon2)
+            if index_key not in self.entries:
+                self.entries[index_key] = value
+                self._dirty = True
+                migrated += 1
+            # Keys written at 4 decimals or fewer also answered the old 4-decimal fallback lookups
+            if all(part == str(round(float(part), FALLBACK_PRECISION)) for part in parts):
+                fallback_key = self._fallback_key(lat1, lon1, lat2, lon2)
+                if fallback_key not in self.fallback:
+                    self.fallback[fallback_key] = value
+                    self._dirty = True
+        return migrated
+
+
+_shared_index = None
+_shared_index_lock = threading.Lock()
+
+
+def get_jump_index() -> JumpIndex:
+    """Process-wide index instance shared by the legacy and modern engines"""
+    global _shared_index
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = JumpIndex()
+        return _shared_index
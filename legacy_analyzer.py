@@ -3,9 +3,12 @@ import json
 import time
 import csv
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from csv_exporter import export_monthly_csv
-from geo_utils import reverse_geocode, haversine_distance, is_over_water, geo_cache, save_geo_cache
+from geo_utils import reverse_geocode, haversine_distance, check_water_batch, geo_cache, save_geo_cache
+from jump_index import get_jump_index
+from transport_modes import MODE_MAP, COASTAL_COUNTRIES, RELIABLE_MODES, jump_place_label, place_country, water_sample_points
+from input_sources import load_location_json
 import pandas as pd
 import math
 
@@ -18,8 +21,7 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
                          log_func, cancel_check, include_distance=True):
     log_func(f"📂 Loading: {file_path}")
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = load_location_json(file_path)
     except Exception as e:
         log_func(f"❌ Error loading file: {e}")
         return None
@@ -124,6 +126,11 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
     combined = sorted(zip(coords, activity_blocks), key=lambda x: x[0][0])
     coords, activity_blocks = zip(*combined) if combined else ([], [])
     log_func("🔦 Reverse geocoding locations...")
+    resolved = resolve_locations(coords, geoapify_key, google_key, delay, log_func, cancel_check)
+    if resolved is None:
+        return None
+    records, location_ids = resolved
+    log_func(f"📍 Resolved {len(coords)} points to {len(records)} distinct locations")
 
     city_time = defaultdict(list)  # Store time intervals per place
     total_distance = 0.0
@@ -133,23 +140,14 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
     last_dt = None
 
     for i, (dt, lat, lon) in enumerate(coords):
-        if cancel_check():
-            log_func("❌ Canceled during geocoding.")
-            return None
-        if i % 10 == 0 and cancel_check():
-            log_func("❌ Canceled during geocoding.")
-            return None
-
-        key = (round(lat, 5), round(lon, 5))
-        loc = reverse_geocode(lat, lon, geoapify_key, google_key, delay, log_func)
-
-        if not loc:
+        loc = records[location_ids[i]]
+        if not loc.found:
             continue
 
         date = dt.date()
-        city = loc.get("city", "Unknown")
-        state = loc.get("state", "")
-        country = loc.get("country", "")
+        city = loc.city
+        state = loc.state
+        country = loc.country
 
         if group_by == "by_city":
             place = city or "Unknown"
@@ -183,7 +181,7 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
         log_func(f"❌ Error exporting monthly CSV: {e}")
 
     try:
-        mode_counts = generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=activity_blocks, cancel_check=cancel_check, onwater_key=onwater_key, delay=delay, geoapify_key=geoapify_key, google_key=google_key)
+        mode_counts = generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=activity_blocks, cancel_check=cancel_check, onwater_key=onwater_key, delay=delay, geoapify_key=geoapify_key, google_key=google_key, resolved=resolved)
     except Exception as e:
         log_func(f"❌ Error generating city jump CSV: {e}")
         mode_counts = None
@@ -194,7 +192,36 @@ def process_location_file(file_path, start_date, end_date, output_dir, group_by,
         log_func(f"⚠️ Note: Cached results in {cache_file} may affect water detection. Consider resetting if modes are incorrect.")
     return mode_counts
 
-def generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=None, cancel_check=None, onwater_key="", delay=0.5, geoapify_key="", google_key=""):
+class LocationRecord(namedtuple("LocationRecord", "city state country place found")):
+    """Compact reverse-geocode result; found is False when the lookup returned nothing"""
+
+    @classmethod
+    def from_geocode(cls, loc):
+        return cls(loc.get("city", "Unknown"), loc.get("state", ""), loc.get("country", ""),
+                   loc.get("place", ""), bool(loc))
+
+def resolve_locations(coords, geoapify_key, google_key, delay, log_func, cancel_check=None):
+    """
+    Reverse geocode every coordinate exactly once.
+    Returns (records, location_ids): a table of distinct LocationRecords and,
+    per coordinate, its index into that table. Returns None when canceled.
+    """
+    records = []
+    record_ids = {}
+    location_ids = []
+    for dt, lat, lon in coords:
+        if cancel_check and cancel_check():
+            log_func("❌ Canceled during geocoding.")
+            return None
+        record = LocationRecord.from_geocode(reverse_geocode(lat, lon, geoapify_key, google_key, delay, log_func))
+        record_id = record_ids.get(record)
+        if record_id is None:
+            record_id = record_ids[record] = len(records)
+            records.append(record)
+        location_ids.append(record_id)
+    return records, location_ids
+
+def generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=None, cancel_check=None, onwater_key="", delay=0.5, geoapify_key="", google_key="", water_workers=4, resolved=None):
     log_func(f"🧪 generate_city_jump_csv received {len(coords)} entries")
 
     jump_file = os.path.join(output_dir, "city_jumps_with_mode.csv")
@@ -203,30 +230,29 @@ def generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=No
         log_func("📂 Skipping city jump output (not in by_city mode)")
         return None
 
-    mode_map = {
-        "in train": "Train",
-        "in passenger vehicle": "Car",
-        "walking": "Walking",
-        "in ferry": "Ferry",
-        "slow_mobility": "Walking",
-        "fast_mobility": "Car",
-        "medium_mobility": "Car",
-        "flying": "Flight",
-        "sailing": "Ferry",
-        "skiing": "Unknown",
-        "unknown": "Unknown",
-        "in subway": "Train",
-        "in tram": "Train",
-        "stationary": "Walking"
-    }
-
-    coastal_countries = ["Croatia", "Montenegro"]
     rate_limit_hit = False
     cache_hits = 0
     cache_misses = 0
     unique_jumps = set()
 
-    rows = []
+    # Water verdicts per segment, shared with the modern engine and direction-insensitive
+    jump_index = get_jump_index()
+    if jump_index.migrate_legacy_entries(geo_cache):
+        jump_index.save()
+
+    # Pass 1: walk the track, collect every jump and apply the rules that don't
+    # need a water probe. Jumps that do are queued with their sample points.
+    if resolved is None:
+        resolved = resolve_locations(coords, geoapify_key, google_key, 0, None, cancel_check)
+        if resolved is None:
+            log_func("❌ Canceled during city jump generation.")
+            return None
+    records, location_ids = resolved
+
+    jumps = []
+    probe_points = []
+    water_verdicts = {}
+    queued_water_keys = set()
     prev_city = None
     prev_dt = None
     prev_coords = None
@@ -235,15 +261,12 @@ def generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=No
         if cancel_check and cancel_check():
             log_func("❌ Canceled during city jump generation.")
             return None
-        loc = reverse_geocode(lat, lon, geoapify_key, google_key, 0, log_func=None)
-        city = loc.get("city", "Unknown")
-        state = loc.get("state", "")
-        country = loc.get("country", "")
-        place_name = loc.get("place", "")
-        if country != "United States" and country:
-            place = f"{city}, {country}" if city != "Unknown" else country
-        else:
-            place = f"{city}, {state}, USA"
+        loc = records[location_ids[i]]
+        city = loc.city
+        state = loc.state
+        country = loc.country
+        place_name = loc.place
+        place = jump_place_label(city, state, country)
 
         if prev_city and place != prev_city:
             jump_key = f"{prev_city}:{place}"
@@ -262,83 +285,121 @@ def generate_city_jump_csv(coords, output_dir, group_by, log_func, activities=No
                         raw_mode = act.get("topCandidate", {}).get("type", "Unknown").lower()
                     elif "mode" in act:
                         raw_mode = act.get("mode", "Unknown").lower()
-            mode = mode_map.get(raw_mode, "Unknown")
+            mode = MODE_MAP.get(raw_mode, "Unknown")
             log_func(f"Raw mode for jump {i} ({prev_city} to {place}): {raw_mode}, mapped to {mode}")
 
+            jump = {
+                "index": i, "prev_dt": prev_dt, "from": prev_city, "to": place,
+                "country": country, "place_name": place_name, "prev_coords": prev_coords,
+                "coords": (lat, lon), "distance": distance, "duration_hrs": duration_hrs,
+                "speed_mph": speed_mph, "mode": mode, "water_points": None, "water_key": None
+            }
+
             # Use Google's mode if reliable
-            if mode in ["Flight", "Train", "Ferry", "Walking"]:
+            if mode in RELIABLE_MODES:
                 log_func(f"Using Google mode: {mode}")
             else:
                 # Fallback for in passenger vehicle and unknown
-                prev_country = prev_city.split(", ")[-1] if ", " in prev_city else prev_city
+                prev_country = place_country(prev_city)
                 is_international = country != prev_country and country != "Unknown" and prev_country != "Unknown"
                 if (raw_mode in ["in passenger vehicle", "unknown"]) and is_international and (distance > 20 or duration_hrs < 1.5):
-                    mode = "Flight"
+                    mode = jump["mode"] = "Flight"
                     log_func(f"Overriding mode to {mode} due to international jump")
-                elif raw_mode in ["unknown", "walking"] and country in coastal_countries and distance < 2:
-                    mode = "Boat"
+                elif raw_mode in ["unknown", "walking"] and country in COASTAL_COUNTRIES and distance < 2:
+                    mode = jump["mode"] = "Boat"
                     log_func(f"Overriding mode to {mode} due to coastal country short jump")
                 elif 0.5 < distance < 100:
-                    jump_cache_key = f"jump:{round(prev_coords[0], 5)},{round(prev_coords[1], 5)}:{round(lat, 5)},{round(lon, 5)}"
-                    jump_cache_key_fallback = f"jump:{round(prev_coords[0], 4)},{round(prev_coords[1], 4)}:{round(lat, 4)},{round(lon, 4)}"
-                    if jump_cache_key in geo_cache:
-                        is_water = geo_cache[jump_cache_key]
-                        log_func(f"🌊 Jump cache HIT for {prev_city} to {place}: {'Water' if is_water else 'Land'}")
+                    water_key = jump_index.key(prev_coords[0], prev_coords[1], lat, lon)
+                    jump["water_key"] = water_key
+                    cached_water = jump_index.get(prev_coords[0], prev_coords[1], lat, lon)
+                    if cached_water is not None:
+                        water_verdicts[water_key] = cached_water
+                        log_func(f"🌊 Jump cache HIT for {prev_city} to {place}: {'Water' if cached_water else 'Land'}")
                         cache_hits += 1
-                    elif jump_cache_key_fallback in geo_cache:
-                        is_water = geo_cache[jump_cache_key_fallback]
-                        log_func(f"🌊 Jump cache HIT (fallback): {prev_city} to {place}: {'Water' if is_water else 'Land'}")
+                    elif water_key in queued_water_keys:
+                        # Same segment (either direction) already queued earlier in this run
+                        log_func(f"🌊 Jump cache HIT (queued): {prev_city} to {place}")
                         cache_hits += 1
                     else:
-                        points = [
-                            (prev_coords[0], prev_coords[1]),
-                            ((prev_coords[0] + lat) / 2, (prev_coords[1] + lon) / 2),
-                            (lat, lon)
-                        ] if distance < 10 else [(prev_coords[0], prev_coords[1]), (lat, lon)]
-                        water_checks = [is_over_water(p[0], p[1], onwater_key, delay, log_func, geoapify_key, google_key) for p in points]
-                        water_count = sum(1 for w in water_checks if w is True)
-                        is_water = water_count > 0 or "waters" in place_name.lower() or "sea" in place_name.lower()
-                        if any(w is None for w in water_checks):
-                            rate_limit_hit = True
-                        log_func(f"Water checks for {prev_city} to {place} (dist={distance:.2f} mi, time={duration_hrs:.2f} hrs, speed={speed_mph:.2f} mph, points={points}, place={place_name}): {water_checks}")
-                        if is_water or (country in coastal_countries and distance < 2):
-                            mode = "Ferry" if distance > 2 else "Boat"
-                            log_func(f"Overriding mode to {mode} due to water detection")
-                        elif country in coastal_countries and distance > 2 and "inland" not in place_name.lower():
-                            mode = "Ferry"
-                            log_func(f"Overriding mode to {mode} due to coastal country context")
-                        elif distance > 2:
-                            mode = "Car"
-                            log_func(f"Overriding mode to {mode} due to distance")
-                        else:
-                            mode = "Walking"
-                        geo_cache[jump_cache_key] = is_water
-                        save_geo_cache()
-                        cache_misses += 1
-
-            # Time-based validation
-            if mode in ["Ferry", "Car", "Train"] and duration_hrs < 0.5 and distance > 10:
-                mode = "Flight"
-                log_func(f"Overriding mode to {mode} due to short duration ({duration_hrs:.2f} hrs) for distance {distance:.2f} mi")
-
-            # Restrict Walking
-            if mode == "Walking" and (distance > 2 or duration_hrs > 0.5):
-                mode = "Car"
-                log_func(f"Overriding mode to {mode} due to excessive distance ({distance:.2f} mi) or duration ({duration_hrs:.2f} hrs)")
+                        points = water_sample_points(prev_coords[0], prev_coords[1], lat, lon, distance)
+                        jump["water_points"] = points
+                        queued_water_keys.add(water_key)
+                        probe_points.extend(points)
 
-            rows.append([
-                prev_dt.strftime("%Y-%m-%d %H:%M"),
-                prev_city,
-                place,
-                mode,
-                round(distance, 2)
-            ])
-            log_func(f"Jump {i}: {prev_city} to {place}, mode={mode}, distance={distance:.2f} mi, duration={duration_hrs:.2f} hrs, speed={speed_mph:.2f} mph")
+            jumps.append(jump)
 
         prev_city = place
         prev_coords = (lat, lon)
         prev_dt = dt
 
+    # Resolve every queued sample point at once: deduplicated, mask first, then concurrent probes
+    water_results = {}
+    if probe_points:
+        if cancel_check and cancel_check():
+            log_func("❌ Canceled during city jump generation.")
+            return None
+        water_results = check_water_batch(probe_points, onwater_key, delay, log_func, geoapify_key, google_key, max_workers=water_workers)
+
+    # Pass 2: assign final modes in track order
+    rows = []
+    for jump in jumps:
+        i = jump["index"]
+        prev_city = jump["from"]
+        place = jump["to"]
+        country = jump["country"]
+        place_name = jump["place_name"]
+        distance = jump["distance"]
+        duration_hrs = jump["duration_hrs"]
+        speed_mph = jump["speed_mph"]
+        mode = jump["mode"]
+
+        if jump["water_key"] is not None:
+            if jump["water_points"] is not None:
+                points = jump["water_points"]
+                water_checks = [water_results.get((round(p[0], 5), round(p[1], 5))) for p in points]
+                water_count = sum(1 for w in water_checks if w is True)
+                is_water = water_count > 0 or "waters" in place_name.lower() or "sea" in place_name.lower()
+                if any(w is None for w in water_checks):
+                    rate_limit_hit = True
+                else:
+                    jump_index.set(*jump["prev_coords"], *jump["coords"], is_water)
+                log_func(f"Water checks for {prev_city} to {place} (dist={distance:.2f} mi, time={duration_hrs:.2f} hrs, speed={speed_mph:.2f} mph, points={points}, place={place_name}): {water_checks}")
+                water_verdicts[jump["water_key"]] = is_water
+                cache_misses += 1
+            is_water = water_verdicts[jump["water_key"]]
+            if is_water or (country in COASTAL_COUNTRIES and distance < 2):
+                mode = "Ferry" if distance > 2 else "Boat"
+                log_func(f"Overriding mode to {mode} due to water detection")
+            elif country in COASTAL_COUNTRIES and distance > 2 and "inland" not in place_name.lower():
+                mode = "Ferry"
+                log_func(f"Overriding mode to {mode} due to coastal country context")
+            elif distance > 2:
+                mode = "Car"
+                log_func(f"Overriding mode to {mode} due to distance")
+            else:
+                mode = "Walking"
+
+        # Time-based validation
+        if mode in ["Ferry", "Car", "Train"] and duration_hrs < 0.5 and distance > 10:
+            mode = "Flight"
+            log_func(f"Overriding mode to {mode} due to short duration ({duration_hrs:.2f} hrs) for distance {distance:.2f} mi")
+
+        # Restrict Walking
+        if mode == "Walking" and (distance > 2 or duration_hrs > 0.5):
+            mode = "Car"
+            log_func(f"Overriding mode to {mode} due to excessive distance ({distance:.2f} mi) or duration ({duration_hrs:.2f} hrs)")
+
+        rows.append([
+            jump["prev_dt"].strftime("%Y-%m-%d %H:%M"),
+            prev_city,
+            place,
+            mode,
+            round(distance, 2)
+        ])
+        log_func(f"Jump {i}: {prev_city} to {place}, mode={mode}, distance={distance:.2f} mi, duration={duration_hrs:.2f} hrs, speed={speed_mph:.2f} mph")
+
+    jump_index.save()
+
     if rows:
         modes = [row[3] for row in rows]
         mode_counts = {mode: modes.count(mode) for mode in sorted(set(modes))}
@@ -6,14 +6,38 @@ Processes Google Location History data and generates travel analysis reports.
 
 import asyncio
 import aiohttp
-from dataclasses import dataclass
-from typing import List, Optional, Dict, Tuple
-from datetime import datetime, date
+import concurrent.futures
+import cProfile
+import heapq
+from dataclasses import dataclass, asdict
+from typing import List, Optional, Dict, Tuple, Iterator, Callable
+from datetime import datetime, date, timedelta
 import json
 import pandas as pd
 from collections import defaultdict
 import math
 import os
+import threading
+import numpy as np
+from jump_index import get_jump_index
+from water_mask import get_water_mask, WATER, LAND
+from transport_modes import (activity_code, jump_place_label, place_country, water_sample_points,
+                             place_suggests_water, initial_modes, finalize_modes)
+from daily_aggregates import DailyAggregateStore, settings_fingerprint, add_times
+from run_checkpoint import RunCheckpoint
+from analysis_windows import AnalysisWindow, normalize_windows
+from api_endpoints import geoapify_url, onwater_url
+from run_metrics import RunMetrics, current_metrics, timed_request
+from request_budget import RequestBudget
+from input_sources import iter_timeline_objects, load_location_json
+
+NS_PER_DAY = 24 * 3600 * 10**9
+EPOCH_DATE = date(1970, 1, 1)
+CANCEL_POLL_INTERVAL = 0.2  # seconds between cancel_check() polls while waiting on async work
+_cache_file_lock = threading.Lock()  # analyzers sharing a geocode cache save it from several threads
+
+class AnalysisCancelled(Exception):
+    """Raised when the analyzer's cancel_check reports that the caller gave up on the run"""
 
 @dataclass(frozen=True)
 class LocationPoint:
@@ -21,6 +45,7 @@ class LocationPoint:
     timestamp: datetime
     latitude: float
     longitude: float
+    mode_code: int = 0  # activity type, see transport_modes.ACTIVITY_MODES
 
 @dataclass(frozen=True)
 class GeocodeResult:
@@ -40,27 +65,257 @@ class LocationJump:
     duration_hours: float
     timestamp: datetime
 
+@dataclass(frozen=True)
+class ModeJump:
+    """A change of place labelled with its inferred transport mode"""
+    from_location: str
+    to_location: str
+    mode: str
+    distance_miles: float
+    timestamp: datetime  # departure time
+
+@dataclass
+class ModeJumpState:
+    """Pairing state carried through classify_jump_modes, so classification can resume mid-history"""
+    seen_pairs: set
+    last_label: Optional[str] = None
+    last_point: Optional[LocationPoint] = None
+    
+    def to_json(self) -> dict:
+        return {
+            'seen_pairs': sorted(list(pair) for pair in self.seen_pairs),
+            'last_label': self.last_label,
+            'last_point': point_to_json(self.last_point)
+        }
+    
+    @classmethod
+    def from_json(cls, data: Optional[dict]) -> "ModeJumpState":
+        data = data or {}
+        return cls(seen_pairs={tuple(pair) for pair in data.get('seen_pairs', [])},
+                   last_label=data.get('last_label'),
+                   last_point=point_from_json(data.get('last_point')))
+
+@dataclass
+class GeocodedPoints:
+    """
+    Geocoding outcome for a list of points, stored column-wise.
+    location_ids[i] is the int32 index of point i's result in `locations`
+    (a table of distinct results), or -1 when the point could not be resolved.
+    """
+    location_ids: np.ndarray
+    locations: List[GeocodeResult]
+    
+    @classmethod
+    def from_cell_outcomes(cls, cell_index: np.ndarray, outcomes: List[Optional[GeocodeResult]]) -> "GeocodedPoints":
+        """Intern per-cell outcomes into a table of distinct results"""
+        locations: List[GeocodeResult] = []
+        location_index: Dict[GeocodeResult, int] = {}
+        cell_location = np.full(len(outcomes) + 1, -1, dtype=np.int32)
+        for cell, result in enumerate(outcomes):
+            if result is not None:
+                if result not in location_index:
+                    location_index[result] = len(locations)
+                    locations.append(result)
+                cell_location[cell] = location_index[result]
+        return cls(cell_location[np.asarray(cell_index, dtype=np.int64)], locations)
+    
+    @property
+    def resolved_count(self) -> int:
+        return int(np.count_nonzero(self.location_ids >= 0))
+    
+    def label_codes(self, label_func) -> Tuple[np.ndarray, List[str]]:
+        """
+        Per-point int32 codes into a table of labels, calling label_func once per
+        distinct location instead of once per point. Unresolved points get -1.
+        """
+        labels: List[str] = []
+        label_index: Dict[str, int] = {}
+        # Trailing -1 entry so unresolved points (location id -1) map to code -1
+        location_code = np.full(len(self.locations) + 1, -1, dtype=np.int32)
+        for location_id, result in enumerate(self.locations):
+            label = label_func(result)
+            if label not in label_index:
+                label_index[label] = len(labels)
+                labels.append(label)
+            location_code[location_id] = label_index[label]
+        return location_code[self.location_ids], labels
+    
+    def slice(self, start: int, stop: Optional[int] = None) -> "GeocodedPoints":
+        """Outcomes for points[start:stop], sharing the location table"""
+        return GeocodedPoints(self.location_ids[start:stop], self.locations)
+    
+    def take(self, indices: np.ndarray) -> "GeocodedPoints":
+        """Outcomes for the points at `indices`, sharing the location table"""
+        return GeocodedPoints(self.location_ids[indices], self.locations)
+    
+    @classmethod
+    def concat(cls, parts: List["GeocodedPoints"]) -> "GeocodedPoints":
+        """Outcomes of consecutive point lists joined, over one table of distinct results"""
+        locations: List[GeocodeResult] = []
+        location_index: Dict[GeocodeResult, int] = {}
+        location_ids = []
+        for part in parts:
+            remap = np.full(len(part.locations) + 1, -1, dtype=np.int32)
+            for location_id, result in enumerate(part.locations):
+                if result not in location_index:
+                    location_index[result] = len(locations)
+                    locations.append(result)
+                remap[location_id] = location_index[result]
+            location_ids.append(remap[part.location_ids])
+        if not location_ids:
+            return cls(np.zeros(0, dtype=np.int32), locations)
+        return cls(np.concatenate(location_ids), locations)
+    
+    def with_leading(self, result: GeocodeResult) -> "GeocodedPoints":
+        """Outcomes with one extra point, resolved to `result`, in front"""
+        location_ids = np.where(self.location_ids >= 0, self.location_ids + 1, -1).astype(np.int32)
+        return GeocodedPoints(np.concatenate([np.zeros(1, dtype=np.int32), location_ids]),
+                              [result] + self.locations)
+
+def point_to_json(point: Optional[LocationPoint]) -> Optional[list]:
+    if point is None:
+        return None
+    return [int(point.timestamp.value), point.latitude, point.longitude, point.mode_code]
+
+def point_from_json(data: Optional[list]) -> Optional[LocationPoint]:
+    if not data:
+        return None
+    return LocationPoint(pd.Timestamp(data[0], tz="UTC"), data[1], data[2], data[3])
+
+def point_columns(points: List[LocationPoint]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Timestamps (int64 ns since the epoch), latitudes and longitudes as numpy columns"""
+    count = len(points)
+    timestamps = np.fromiter((p.timestamp.value for p in points), dtype=np.int64, count=count)
+    lats = np.fromiter((p.latitude for p in points), dtype=np.float64, count=count)
+    lons = np.fromiter((p.longitude for p in points), dtype=np.float64, count=count)
+    return timestamps, lats, lons
+
+def elapsed_seconds(ns_deltas) -> np.ndarray:
+    """Nanosecond differences as seconds, at the microsecond resolution of Timedelta.total_seconds()"""
+    return (np.asarray(ns_deltas, dtype=np.int64) // 1000) / 1e6
+
+def _dated_before(time_str: Optional[str], day_iso: str) -> bool:
+    """True when an ISO timestamp string's own calendar date is before day_iso"""
+    if not time_str or len(time_str) < 10 or time_str[4] != "-" or time_str[7] != "-":
+        return False
+    return time_str[:10] < day_iso
+
+def day_of(timestamp_ns) -> date:
+    """UTC calendar date of an int64 ns timestamp"""
+    return EPOCH_DATE + timedelta(days=int(timestamp_ns // NS_PER_DAY))
+
+def day_end_ns(day: date) -> int:
+    """Timestamp (int64 ns) of the first instant after a UTC day"""
+    return ((day - EPOCH_DATE).days + 1) * NS_PER_DAY
+
+def _decimal_cell(value: float, precision: int) -> int:
+    """value rounded to precision decimals as an integer cell, as formatting it with .{precision}f rounds"""
+    return int(f"{value:.{precision}f}".replace(".", ""))
+
+def _decimal_cells(values, precision: int) -> np.ndarray:
+    """
+    Integer cells of many values, agreeing with _decimal_cell (and round(value, precision)).
+    np.rint(value * 10**precision) rounds the already rounded product, which can go the
+    other way when the scaled value is close to a half; those few values are redone exactly.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = values * 10 ** precision
+    cells = np.rint(scaled)
+    near_half = np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    if near_half.size:
+        cells[near_half] = [_decimal_cell(value, precision) for value in values[near_half].tolist()]
+    return cells.astype(np.int64)
+
+def city_label(result: GeocodeResult) -> str:
+    return f"{result.city}, {result.country}"
+
+def state_label(result: GeocodeResult) -> str:
+    """US results are reported by state, everything else by country"""
+    if result.country == "United States":
+        return result.state or "Unknown US State"
+    return result.country or "Unknown"
+
+def sum_by_code(codes, values, labels: List[str]) -> Dict[str, float]:
+    """
+    Grouped sum of values by integer code, returned as {label: total} ordered by
+    each label's first appearance in codes (matches accumulating into a dict).
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    if codes.size == 0:
+        return {}
+    totals = np.bincount(codes, weights=np.asarray(values, dtype=np.float64), minlength=len(labels))
+    present, first_seen = np.unique(codes, return_index=True)
+    return {labels[code]: float(totals[code]) for code in present[np.argsort(first_seen)]}
+
 @dataclass
 class AnalysisConfig:
     """Configuration for the location analyzer"""
     geoapify_key: str
     google_key: str = ""
+    onwater_key: str = ""  # RapidAPI isitwater key; Geoapify is used for water checks without it
     api_delay: float = 0.1
     min_distance_filter: float = 0.5  # miles
     min_time_filter: float = 0.5  # hours
     max_concurrent_requests: int = 20
     cache_precision: int = 5
+    pipeline_mode: bool = False  # stream parse -> filter -> geocode instead of running stages back to back
+    pipeline_queue_size: int = 64  # max parsed batches buffered ahead of the geocoder
+    pipeline_batch_size: int = 500  # points handed from the parser thread per batch
+    pipeline_reorder_hours: float = 24.0  # points held back so the stream filters them in time order
+    infer_transport_modes: bool = True  # write city_jumps_with_mode.csv
+    incremental_aggregates: bool = False  # reuse per-day aggregates from earlier runs, see daily_aggregates.py
+    cache_save_interval: int = 250  # save the geocode cache every N new lookups (0 = only when geocoding ends)
+    profile_run: bool = False  # write a cProfile dump (profile.prof) next to the CSVs
+    shard_workers: int = 0  # >1: run month shards across this many processes, see sharded_analysis.py
+
+class SignificantPointFilter:
+    """
+    Incremental form of LocationAnalyzer.filter_significant_points.
+    Feed points in time order; accept() reports whether each one is kept.
+    """
+    
+    def __init__(self, min_distance: float, min_time: float):
+        self.min_distance = min_distance
+        self.min_time = min_time
+        self.last_point: Optional[LocationPoint] = None
+    
+    def accept(self, point: LocationPoint) -> bool:
+        if self.last_point is None:
+            self.last_point = point
+            return True
+        
+        distance = LocationAnalyzer.haversine_distance(
+            self.last_point.latitude, self.last_point.longitude,
+            point.latitude, point.longitude
+        )
+        time_diff = (point.timestamp - self.last_point.timestamp).total_seconds() / 3600
+        
+        if distance > self.min_distance or time_diff > self.min_time:
+            self.last_point = point
+            return True
+        return False
 
 class LocationAnalyzer:
     """
     Modern async location analyzer for Google Location History data.
     """
     
-    def __init__(self, config: AnalysisConfig):
+    def __init__(self, config: AnalysisConfig, cancel_check: Optional[Callable[[], bool]] = None,
+                 geocode_cache: Optional[Dict[str, GeocodeResult]] = None,
+                 request_budget: Optional[RequestBudget] = None):
+        """
+        geocode_cache shares an already loaded cache with other analyzers
+        instead of loading config/geo_cache.json; request_budget shares their
+        API limits (see request_budget.py).
+        """
         self.config = config
-        self.geocode_cache: Dict[str, GeocodeResult] = {}
+        self.cancel_check = cancel_check  # polled during parsing, geocoding and water probes
+        self.geocode_cache: Dict[str, GeocodeResult] = geocode_cache if geocode_cache is not None else {}
+        self.request_budget = request_budget or RequestBudget()
         self.log_file = None  # Don't create log file by default
-        self.load_cache()
+        self.jump_index = get_jump_index()
+        if geocode_cache is None:
+            self.load_cache()
     
     def _log(self, message: str):
         """Log with reduced console output"""
@@ -110,6 +365,9 @@ class LocationAnalyzer:
                                 place_name=data.get('place_name', data.get('place', '')),
                                 is_water=data.get('is_water', False)
                             )
+                # Directional jump entries now live in the shared jump index
+                if self.jump_index.migrate_legacy_entries(cache_data):
+                    self.jump_index.save()
         except FileNotFoundError:
             pass
         except Exception as e:
@@ -118,7 +376,8 @@ class LocationAnalyzer:
     def save_cache(self):
         """Save geocoding cache to file"""
         cache_data = {}
-        for key, result in self.geocode_cache.items():
+        # Snapshot first: a shared cache can grow in another thread meanwhile
+        for key, result in list(self.geocode_cache.items()):
             cache_data[key] = {
                 'city': result.city,
                 'state': result.state, 
@@ -130,34 +389,105 @@ class LocationAnalyzer:
         # Ensure config directory exists
         os.makedirs('config', exist_ok=True)
         
-        with open("config/geo_cache.json", "w") as f:
-            json.dump(cache_data, f, indent=2)
+        with _cache_file_lock:
+            with open("config/geo_cache.json", "w") as f:
+                json.dump(cache_data, f, indent=2)
+    
+    def _check_cancelled(self):
+        if self.cancel_check is not None and self.cancel_check():
+            raise AnalysisCancelled("Analysis cancelled")
+    
+    async def _gather_cancellable(self, *aws, return_exceptions: bool = False):
+        """
+        asyncio.gather() that keeps polling cancel_check while it waits. On
+        cancellation every outstanding task is cancelled and awaited, then
+        AnalysisCancelled is raised.
+        """
+        futures = [asyncio.ensure_future(aw) for aw in aws]
+        gathered = asyncio.gather(*futures, return_exceptions=return_exceptions)
+        if self.cancel_check is None:
+            return await gathered
+        while True:
+            done, _ = await asyncio.wait({gathered}, timeout=CANCEL_POLL_INTERVAL)
+            if done:
+                return gathered.result()
+            if self.cancel_check():
+                for future in futures:
+                    future.cancel()
+                await asyncio.gather(*futures, return_exceptions=True)
+                try:
+                    await gathered
+                except (asyncio.CancelledError, Exception):
+                    pass
+                raise AnalysisCancelled("Analysis cancelled")
     
-    def parse_location_data(self, file_path: str, start_date, end_date) -> List[LocationPoint]:
+    def _maybe_save_cache(self, geocoded_count: int):
+        """Periodic cache save, so an interrupted run keeps the lookups it already paid for"""
+        interval = self.config.cache_save_interval
+        if interval and geocoded_count % interval == 0:
+            self.save_cache()
+    
+    def parse_location_data(self, file_path: str, start_date, end_date, emit_from: Optional[date] = None) -> List[LocationPoint]:
         """Parse Google location history JSON file into LocationPoint objects"""
+        points = list(self.iter_location_points(file_path, start_date, end_date, emit_from))
+        self._log(f"Found {len(points)} location points")
+        return sorted(points, key=lambda p: p.timestamp)
+    
+    def iter_location_points(self, file_path: str, start_date, end_date,
+                             emit_from: Optional[date] = None, stream: bool = False) -> Iterator[LocationPoint]:
+        """
+        Yield LocationPoint objects in file order (unsorted) as they are parsed.
+        With emit_from, only points dated emit_from or later are yielded; they are
+        exactly the points a run from start_date would produce for those days.
+        With stream, timeline objects are decoded one at a time as the file is read
+        (see input_sources.iter_timeline_objects), so the first points come out
+        before the file is fully parsed and the document is never held in memory.
+        """
+        for point, _ in self._iter_location_records(file_path, start_date, end_date, emit_from, stream):
+            yield point
+    
+    def _iter_location_records(self, file_path: str, start_date, end_date,
+                               emit_from: Optional[date] = None,
+                               stream: bool = False) -> Iterator[Tuple[LocationPoint, Optional[date]]]:
+        """
+        iter_location_points() plus, per point, the start date of its timelinePath
+        object (None for other shapes): a run only keeps timelinePath points whose
+        object also starts inside its date range.
+        """
         
         # Ensure dates are date objects
         start_date = self._ensure_date_object(start_date)
         end_date = self._ensure_date_object(end_date)
+        first_day = max(start_date, emit_from) if emit_from else start_date
+        # Local timestamps are at most a day ahead of or behind UTC, so anything dated
+        # before this cutoff in its own time zone is certainly before first_day
+        skip_before = (first_day - timedelta(days=1)).isoformat() if emit_from else None
         
-        with open(file_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        
-        timeline_objects = data.get("timelineObjects", data) if isinstance(data, dict) else data
-        points = []
-        
-        self._log(f"Parsing {len(timeline_objects)} timeline objects...")
+        if stream:
+            timeline_objects = iter_timeline_objects(file_path)
+            total = "?"
+            self._log("Parsing timeline objects as they are read...")
+        else:
+            data = load_location_json(file_path)
+            timeline_objects = data.get("timelineObjects", data) if isinstance(data, dict) else data
+            total = len(timeline_objects)
+            self._log(f"Parsing {total} timeline objects...")
         
         for i, obj in enumerate(timeline_objects):
+            if i % 100 == 0:
+                self._check_cancelled()
             # Reduce progress output frequency
             if i % 1000 == 0:
-                self._log(f"Progress: {i}/{len(timeline_objects)}")
+                self._log(f"Progress: {i}/{total}")
             
             # Parse activity objects
             if "activity" in obj:
                 activity = obj["activity"]
                 start_str = obj.get("startTime")
                 end_str = obj.get("endTime")
+                if skip_before and _dated_before(end_str or start_str, skip_before):
+                    continue
+                mode_code = activity_code(activity.get("topCandidate", {}).get("type"))
                 
                 # Parse start coordinate
                 if start_str and activity.get("start", "").startswith("geo:"):
@@ -167,8 +497,8 @@ class LocationAnalyzer:
                             lat = float(latlon[0])
                             lon = float(latlon[1])
                             dt = pd.to_datetime(start_str, utc=True)
-                            if start_date <= dt.date() <= end_date:
-                                points.append(LocationPoint(dt, lat, lon))
+                            if first_day <= dt.date() <= end_date:
+                                yield LocationPoint(dt, lat, lon, mode_code), None
                     except Exception:
                         continue
                 
@@ -180,8 +510,8 @@ class LocationAnalyzer:
                             lat = float(latlon[0])
                             lon = float(latlon[1])
                             dt = pd.to_datetime(end_str, utc=True)
-                            if start_date <= dt.date() <= end_date:
-                                points.append(LocationPoint(dt, lat, lon))
+                            if first_day <= dt.date() <= end_date:
+                                yield LocationPoint(dt, lat, lon, mode_code), None
                     except Exception:
                         continue
             
@@ -192,25 +522,28 @@ class LocationAnalyzer:
                     lat = location["latitudeE7"] / 1e7
                     lon = location["longitudeE7"] / 1e7
                     start_time = obj["placeVisit"].get("duration", {}).get("startTimestamp")
-                    if start_time:
+                    if start_time and not (skip_before and _dated_before(start_time, skip_before)):
                         dt = pd.to_datetime(start_time, utc=True)
-                        if start_date <= dt.date() <= end_date:
-                            points.append(LocationPoint(dt, lat, lon))
+                        if first_day <= dt.date() <= end_date:
+                            yield LocationPoint(dt, lat, lon), None
             
             # Parse activitySegment paths
             elif "activitySegment" in obj:
                 start_time = obj["activitySegment"].get("duration", {}).get("startTimestamp")
                 if start_time:
+                    if skip_before and _dated_before(start_time, skip_before):
+                        continue
                     dt = pd.to_datetime(start_time, utc=True)
-                    if not (start_date <= dt.date() <= end_date):
+                    if not (first_day <= dt.date() <= end_date):
                         continue
                     
+                    mode_code = activity_code(obj["activitySegment"].get("activityType"))
                     waypoints = obj["activitySegment"].get("waypointPath", {}).get("waypoints", [])
                     for waypoint in waypoints[::10]:  # Sample every 10th point
                         if "latE7" in waypoint and "lngE7" in waypoint:
                             lat = waypoint["latE7"] / 1e7  
                             lon = waypoint["lngE7"] / 1e7
-                            points.append(LocationPoint(dt, lat, lon))
+                            yield LocationPoint(dt, lat, lon, mode_code), None
             
             # Parse timelinePath objects
             elif "timelinePath" in obj:
@@ -229,178 +562,569 @@ class LocationAnalyzer:
                                     lon = float(latlon[1])
                                     offset = float(point.get("durationMinutesOffsetFromStartTime", 0))
                                     point_dt = start_dt + pd.Timedelta(minutes=offset)
-                                    if start_date <= point_dt.date() <= end_date:
-                                        points.append(LocationPoint(point_dt, lat, lon))
+                                    if first_day <= point_dt.date() <= end_date:
+                                        mode_code = activity_code(point.get("mode", point.get("type")))
+                                        yield LocationPoint(point_dt, lat, lon, mode_code), start_dt.date()
                             except Exception:
                                 continue
-        
-        self._log(f"Found {len(points)} location points")
-        return sorted(points, key=lambda p: p.timestamp)
     
-    def filter_significant_points(self, points: List[LocationPoint]) -> List[LocationPoint]:
-        """Filter points to only keep significant location changes"""
-        if not points:
-            return []
+    def filter_significant_points(self, points: List[LocationPoint],
+                                  last_point: Optional[LocationPoint] = None) -> List[LocationPoint]:
+        """
+        Filter points to only keep significant location changes.
+        last_point continues from the last point kept by an earlier run.
+        """
+        point_filter = SignificantPointFilter(self.config.min_distance_filter, self.config.min_time_filter)
+        point_filter.last_point = last_point
+        return [point for point in points if point_filter.accept(point)]
+    
+    def _coord_key(self, point: LocationPoint) -> str:
+        """Rounded coordinate key shared by the geocode cache and request grouping"""
+        precision = self.config.cache_precision
+        return self._cell_key(_decimal_cell(point.latitude, precision), _decimal_cell(point.longitude, precision))
+    
+    def _cell_key(self, lat_cell: int, lon_cell: int) -> str:
+        """Cache key ("lat,lon" at cache_precision decimals) for an integer cell"""
+        precision = self.config.cache_precision
+        scale = 10 ** precision
+        return f"{lat_cell / scale:.{precision}f},{lon_cell / scale:.{precision}f}"
+    
+    def _quantize_cells(self, points: List[LocationPoint]) -> Tuple[np.ndarray, np.ndarray]:
+        """Integer (lat, lon) cells at cache_precision for every point, without string formatting"""
+        return self._quantize_columns(np.fromiter((p.latitude for p in points), dtype=np.float64, count=len(points)),
+                                      np.fromiter((p.longitude for p in points), dtype=np.float64, count=len(points)))
+    
+    def _quantize_columns(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        precision = self.config.cache_precision
+        return _decimal_cells(lats, precision), _decimal_cells(lons, precision)
+    
+    def _cell_keys(self, lat_cells: np.ndarray, lon_cells: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """Distinct cache keys of the given cells and, per cell, its index into them"""
+        # Fold both cell coordinates into one int64 so grouping is a single np.unique
+        half_turn = 180 * 10 ** self.config.cache_precision
+        span = 2 * half_turn + 1
+        unique_cells, inverse = np.unique(lat_cells * span + (lon_cells + half_turn), return_inverse=True)
+        coord_keys = []
+        for cell in unique_cells.tolist():
+            lat_cell, lon_offset = divmod(cell, span)
+            coord_keys.append(self._cell_key(lat_cell, lon_offset - half_turn))
+        return coord_keys, inverse
+    
+    async def _fetch_geocode(self, session: aiohttp.ClientSession, coord_key: str) -> Optional[GeocodeResult]:
+        """
+        Reverse geocode one rounded coordinate through Geoapify.
+        Returns None when the API answers without a usable result and a
+        fallback "Unknown" result when the request itself fails.
+        """
+        lat, lon = coord_key.split(',')
+        try:
+            url = geoapify_url("/v1/geocode/reverse")
+            params = {
+                'lat': lat,
+                'lon': lon,
+                'apiKey': self.config.geoapify_key,
+                'format': 'json'
+            }
             
-        filtered = [points[0]]
-        last_point = points[0]
-        
-        for point in points[1:]:
-            distance = self.haversine_distance(
-                last_point.latitude, last_point.longitude,
-                point.latitude, point.longitude
-            )
-            time_diff = (point.timestamp - last_point.timestamp).total_seconds() / 3600
+            await asyncio.sleep(self.config.api_delay)
             
-            if distance > self.config.min_distance_filter or time_diff > self.config.min_time_filter:
-                filtered.append(point)
-                last_point = point
-        
-        return filtered
+            async with self.request_budget:
+                with timed_request("geoapify_reverse") as outcome:
+                    async with session.get(url, params=params) as response:
+                        outcome['ok'] = response.status == 200
+                        data = await response.json() if response.status == 200 else {}
+            if data.get('results'):
+                result_data = data['results'][0]
+                
+                result = GeocodeResult(
+                    city=result_data.get('city'),
+                    state=result_data.get('state'),
+                    country=result_data.get('country'),
+                    place_name=result_data.get('formatted', ''),
+                    is_water=False
+                )
+                
+                self.geocode_cache[coord_key] = result
+                return result
+        except Exception as e:
+            # Use fallback result for failed geocoding
+            return GeocodeResult(
+                city="Unknown",
+                state="Unknown", 
+                country="Unknown",
+                place_name=f"Lat: {lat}, Lon: {lon}"
+            )
+        return None
     
-    async def geocode_points(self, points: List[LocationPoint]) -> Dict[LocationPoint, GeocodeResult]:
-        """Geocode location points using Geoapify API with async processing"""
-        results = {}
-        
-        # Group points by rounded coordinates for efficient caching
-        coord_groups = defaultdict(list)
-        for point in points:
-            coord_key = f"{point.latitude:.{self.config.cache_precision}f},{point.longitude:.{self.config.cache_precision}f}"
-            coord_groups[coord_key].append(point)
+    async def geocode_points(self, points: List[LocationPoint],
+                             known: Optional[Dict[str, Optional[GeocodeResult]]] = None) -> "GeocodedPoints":
+        """
+        Geocode location points using Geoapify API with async processing.
+        Points are grouped by integer coordinate cell, each distinct cell is
+        resolved once (cache, then API) and every point gets an index into a
+        table of distinct results. Outcomes already in `known` are reused.
+        """
+        coord_keys, inverse = self._cell_keys(*self._quantize_cells(points))
+        outcomes = await self._resolve_cells(coord_keys, known)
+        return GeocodedPoints.from_cell_outcomes(inverse, outcomes)
+    
+    async def _resolve_cells(self, coord_keys: List[str],
+                             known: Optional[Dict[str, Optional[GeocodeResult]]] = None) -> List[Optional[GeocodeResult]]:
+        """Outcome for each cache key: from `known`, the cache, or else the API"""
+        outcomes: List[Optional[GeocodeResult]] = [None] * len(coord_keys)
         
         semaphore = asyncio.Semaphore(self.config.max_concurrent_requests)
         geocoded_count = 0
+        metrics = current_metrics()
         
-        async def geocode_coordinate(coord_key: str, group_points: List[LocationPoint]):
+        async def geocode_coordinate(session: aiohttp.ClientSession, index: int, coord_key: str):
             nonlocal geocoded_count
             async with semaphore:
                 # Check cache first
                 if coord_key in self.geocode_cache:
-                    cached_result = self.geocode_cache[coord_key]
-                    for point in group_points:
-                        results[point] = cached_result
-                    return
-                
-                try:
-                    lat, lon = coord_key.split(',')
-                    async with aiohttp.ClientSession() as session:
-                        url = f"https://api.geoapify.com/v1/geocode/reverse"
-                        params = {
-                            'lat': lat,
-                            'lon': lon,
-                            'apiKey': self.config.geoapify_key,
-                            'format': 'json'
-                        }
-                        
-                        await asyncio.sleep(self.config.api_delay)
-                        
-                        async with session.get(url, params=params) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                if data.get('results'):
-                                    result_data = data['results'][0]
-                                    
-                                    result = GeocodeResult(
-                                        city=result_data.get('city'),
-                                        state=result_data.get('state'),
-                                        country=result_data.get('country'),
-                                        place_name=result_data.get('formatted', ''),
-                                        is_water=False
-                                    )
-                                    
-                                    self.geocode_cache[coord_key] = result
-                                    for point in group_points:
-                                        results[point] = result
-                                    
-                                    geocoded_count += 1
-                                    if geocoded_count % 10 == 0:
-                                        self._log(f"Geocoded {geocoded_count} locations")
-                                    
-                except Exception as e:
-                    # Use fallback result for failed geocoding
-                    fallback = GeocodeResult(
-                        city="Unknown",
-                        state="Unknown", 
-                        country="Unknown",
-                        place_name=f"Lat: {lat}, Lon: {lon}"
-                    )
-                    for point in group_points:
-                        results[point] = fallback
-        
-        # Execute all geocoding requests concurrently
-        tasks = [geocode_coordinate(coord_key, group_points) 
-                for coord_key, group_points in coord_groups.items()]
-        
-        await asyncio.gather(*tasks)
+                    outcomes[index] = self.geocode_cache[coord_key]
+                    if metrics is not None:
+                        metrics.count("geocode_cache_hits")
+                else:
+                    if metrics is not None:
+                        metrics.count("geocode_cache_misses")
+                    outcomes[index] = await self._fetch_geocode(session, coord_key)
+                    if outcomes[index] is not None and coord_key in self.geocode_cache:
+                        geocoded_count += 1
+                        if geocoded_count % 10 == 0:
+                            self._log(f"Geocoded {geocoded_count} locations")
+                        self._maybe_save_cache(geocoded_count)
+        
+        pending = []
+        for index, coord_key in enumerate(coord_keys):
+            if known is not None and coord_key in known:
+                outcomes[index] = known[coord_key]
+            else:
+                pending.append((index, coord_key))
+        
+        # Execute all geocoding requests concurrently over one shared session
+        if pending:
+            self._check_cancelled()
+            try:
+                async with aiohttp.ClientSession() as session:
+                    await self._gather_cancellable(*(geocode_coordinate(session, index, coord_key)
+                                                     for index, coord_key in pending))
+            except AnalysisCancelled:
+                self._log(f"Geocoding cancelled; keeping {geocoded_count} new lookups in the cache")
+                self.save_cache()
+                raise
         self.save_cache()
+        return outcomes
+    
+    async def _run_pipeline(self, file_path: str, start_date, end_date, emit_from: Optional[date] = None,
+                            filter_seed: Optional[LocationPoint] = None) -> Tuple[List[LocationPoint], "GeocodedPoints", int]:
+        """
+        Streaming parse -> filter -> geocode pipeline. Returns the filtered points,
+        their geocoding and how many points were parsed.
         
-        return results
+        The parser runs in a worker thread, decoding the file one timeline object
+        at a time, and hands batches of points to the event loop through a bounded
+        queue. Geocoding starts while parsing is still running and a slow geocoder
+        throttles the parser (backpressure).
+        
+        The filter sees points in time order: they are held back until the newest
+        point parsed is pipeline_reorder_hours ahead of them. Exports are written in
+        time order, so the stream filter then makes the same decisions as the sorted
+        filter of the staged run and only cells that run keeps are geocoded. Should
+        a point arrive older than one already filtered, the stream stops queueing
+        cells. Once parsing ends the sorted filter is applied and whatever the stream
+        did not resolve is geocoded, so results match the staged run.
+        """
+        loop = asyncio.get_running_loop()
+        batch_size = max(1, self.config.pipeline_batch_size)
+        point_queue: asyncio.Queue = asyncio.Queue(maxsize=self.config.pipeline_queue_size)
+        key_queue: asyncio.Queue = asyncio.Queue(maxsize=self.config.pipeline_queue_size * batch_size)
+        worker_count = max(1, self.config.max_concurrent_requests)
+        
+        all_points: List[LocationPoint] = []
+        resolved: Dict[str, Optional[GeocodeResult]] = {}
+        metrics = current_metrics()
+        geocoded_count = 0
+        
+        def hand_over(item):
+            """Queue an item from the parser thread, waiting for space but not past a cancel"""
+            future = asyncio.run_coroutine_threadsafe(point_queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=CANCEL_POLL_INTERVAL)
+                except concurrent.futures.TimeoutError:
+                    if self.cancel_check is not None and self.cancel_check():
+                        future.cancel()
+                        raise AnalysisCancelled("Analysis cancelled")
+        
+        def produce():
+            """Runs in a worker thread; blocks whenever the point queue is full"""
+            batch = []
+            try:
+                for point in self.iter_location_points(file_path, start_date, end_date, emit_from, stream=True):
+                    batch.append(point)
+                    if len(batch) >= batch_size:
+                        hand_over(batch)
+                        batch = []
+                if batch:
+                    hand_over(batch)
+            finally:
+                hand_over(None)
+        
+        async def filter_stage():
+            point_filter = SignificantPointFilter(self.config.min_distance_filter, self.config.min_time_filter)
+            point_filter.last_point = filter_seed
+            queued_keys = set()
+            held = []  # heap of (timestamp ns, arrival, point) not yet filtered
+            window_ns = int(self.config.pipeline_reorder_hours * 3600 * 10**9)
+            newest_ns = None
+            filtered_ns = None  # timestamp of the last point filtered
+            in_order = True
+            stop_workers = True
+            try:
+                while True:
+                    batch = await point_queue.get()
+                    if batch is None:
+                        break
+                    arrival = len(all_points)
+                    all_points.extend(batch)
+                    if not in_order:
+                        continue
+                    for offset, point in enumerate(batch):
+                        timestamp_ns = point.timestamp.value
+                        if filtered_ns is not None and timestamp_ns < filtered_ns:
+                            # The sorted filter may decide differently from here on
+                            in_order = False
+                            held = []
+                            self._log("⚠️ Export is out of time order; geocoding the rest after parsing")
+                            break
+                        heapq.heappush(held, (timestamp_ns, arrival + offset, point))
+                        newest_ns = timestamp_ns if newest_ns is None else max(newest_ns, timestamp_ns)
+                        while held and held[0][0] < newest_ns - window_ns:
+                            filtered_ns, _, ready = heapq.heappop(held)
+                            if not point_filter.accept(ready):
+                                continue
+                            coord_key = self._coord_key(ready)
+                            if coord_key not in queued_keys:
+                                queued_keys.add(coord_key)
+                                await key_queue.put(coord_key)
+            except asyncio.CancelledError:
+                stop_workers = False  # the geocode workers are being cancelled as well
+                raise
+            finally:
+                if stop_workers:
+                    for _ in range(worker_count):
+                        await key_queue.put(None)
+        
+        async def geocode_stage(session: aiohttp.ClientSession):
+            nonlocal geocoded_count
+            while True:
+                coord_key = await key_queue.get()
+                if coord_key is None:
+                    break
+                if coord_key in self.geocode_cache:
+                    resolved[coord_key] = self.geocode_cache[coord_key]
+                    if metrics is not None:
+                        metrics.count("geocode_cache_hits")
+                    continue
+                if metrics is not None:
+                    metrics.count("geocode_cache_misses")
+                result = await self._fetch_geocode(session, coord_key)
+                resolved[coord_key] = result
+                if result is not None and coord_key in self.geocode_cache:
+                    geocoded_count += 1
+                    if geocoded_count % 10 == 0:
+                        self._log(f"Geocoded {geocoded_count} locations")
+                    self._maybe_save_cache(geocoded_count)
+        
+        try:
+            async with aiohttp.ClientSession() as session:
+                producer = loop.run_in_executor(None, produce)
+                outcomes = await self._gather_cancellable(
+                    producer,
+                    filter_stage(),
+                    *(geocode_stage(session) for _ in range(worker_count)),
+                    return_exceptions=True
+                )
+            for outcome in outcomes:
+                if isinstance(outcome, BaseException):
+                    raise outcome
+        except AnalysisCancelled:
+            self._log(f"Geocoding cancelled; keeping {geocoded_count} new lookups in the cache")
+            self.save_cache()
+            raise
+        
+        points = sorted(all_points, key=lambda p: p.timestamp)
+        self._log(f"Found {len(points)} location points")
+        filtered_points = self.filter_significant_points(points, filter_seed)
+        
+        # Arrival order can differ from time order; anything the stream didn't resolve is geocoded now
+        geocoded = await self.geocode_points(filtered_points, known=resolved)
+        
+        return filtered_points, geocoded, len(points)
     
-    def calculate_jumps(self, points: List[LocationPoint], geocode_results: Dict[LocationPoint, GeocodeResult]) -> List[LocationJump]:
+    def calculate_jumps(self, points: List[LocationPoint], geocoded: "GeocodedPoints") -> List[LocationJump]:
         """Calculate significant location jumps between cities"""
-        jumps = []
-        last_location = None
-        last_point = None
+        city_codes, city_labels = geocoded.label_codes(city_label)
+        resolved = np.flatnonzero(city_codes >= 0)
+        if resolved.size < 2:
+            return []
+        
+        # Location changes are where consecutive resolved points differ in city code
+        codes = city_codes[resolved]
+        changes = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+        from_points = resolved[changes - 1]
+        to_points = resolved[changes]
+        
+        timestamps, lats, lons = point_columns(points)
+        # Scalar haversine, only at the boundaries, keeps distances bit-identical to earlier releases
+        distances = np.array([
+            self.haversine_distance(lats[i], lons[i], lats[j], lons[j])
+            for i, j in zip(from_points.tolist(), to_points.tolist())
+        ], dtype=np.float64)
+        durations = elapsed_seconds(timestamps[to_points] - timestamps[from_points]) / 3600
+        
+        return [
+            LocationJump(
+                from_location=city_labels[codes[change - 1]],
+                to_location=city_labels[codes[change]],
+                distance_miles=float(distances[k]),
+                duration_hours=float(durations[k]),
+                timestamp=points[to_points[k]].timestamp
+            )
+            for k, change in enumerate(changes.tolist())
+            if distances[k] > 10  # Only record jumps > 10 miles
+        ]
+    
+    def generate_time_reports(self, points: List[LocationPoint], geocoded: "GeocodedPoints") -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Generate time spent reports by city and state/country"""
+        intervals = self._dwell_intervals(points, geocoded)
+        if intervals is None:
+            return {}, {}
+        city_codes, city_labels, state_codes, state_labels, _, time_diffs = intervals
+        return (sum_by_code(city_codes, time_diffs, city_labels),
+                sum_by_code(state_codes, time_diffs, state_labels))
+    
+    def daily_time_reports(self, points: List[LocationPoint], geocoded: "GeocodedPoints",
+                           before_ns: int) -> Dict[date, Tuple[Dict[str, float], Dict[str, float]]]:
+        """
+        Time spent by city and state/country per UTC day an interval starts on,
+        counting only intervals that end before before_ns.
+        """
+        intervals = self._dwell_intervals(points, geocoded)
+        if intervals is None:
+            return {}
+        city_codes, city_labels, state_codes, state_labels, timestamps, time_diffs = intervals
+        # Timestamps are sorted, so the intervals that end in time are a prefix
+        count = int(np.searchsorted(timestamps[1:], before_ns))
+        start_days = timestamps[:count] // NS_PER_DAY
+        bounds = [0] + (np.flatnonzero(np.diff(start_days)) + 1).tolist() + [count]
+        
+        reports = {}
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            if lo < hi:
+                reports[day_of(timestamps[lo])] = (
+                    sum_by_code(city_codes[lo:hi], time_diffs[lo:hi], city_labels),
+                    sum_by_code(state_codes[lo:hi], time_diffs[lo:hi], state_labels)
+                )
+        return reports
+    
+    def _dwell_intervals(self, points: List[LocationPoint], geocoded: "GeocodedPoints"):
+        """
+        Intervals between consecutive resolved points, each credited to where it
+        started: (city codes, city labels, state codes, state labels, resolved
+        timestamps, interval lengths in days), or None with fewer than 2 resolved points.
+        """
+        city_codes, city_labels = geocoded.label_codes(city_label)
+        state_codes, state_labels = geocoded.label_codes(state_label)
+        
+        resolved = np.flatnonzero(city_codes >= 0)
+        if resolved.size < 2:
+            return None
+        timestamps = point_columns(points)[0][resolved]
+        time_diffs = elapsed_seconds(np.diff(timestamps)) / (24 * 3600)  # days
+        starts = resolved[:-1]
+        return city_codes[starts], city_labels, state_codes[starts], state_labels, timestamps, time_diffs
+    
+    async def classify_jump_modes(self, points: List[LocationPoint], geocoded: "GeocodedPoints",
+                                  state: Optional[ModeJumpState] = None) -> List[ModeJump]:
+        """
+        Label every change of place with a transport mode (city_jumps_with_mode.csv).
+        Pass a ModeJumpState to continue from, and update, an earlier call's pairing state.
+        """
+        place_codes, place_labels = geocoded.label_codes(lambda r: jump_place_label(r.city, r.state, r.country))
+        starts, ends, from_labels, to_labels, to_countries, place_names = [], [], [], [], [], []
+        if state is None:
+            state = ModeJumpState(seen_pairs=set())
+        seen_pairs = state.seen_pairs
         
-        for point in points:
-            if point not in geocode_results:
+        for point, code, location_id in zip(points, place_codes.tolist(), geocoded.location_ids.tolist()):
+            if code < 0:
                 continue
-                
-            result = geocode_results[point]
-            location = f"{result.city}, {result.country}"
+            label = place_labels[code]
+            result = geocoded.locations[location_id]
             
-            if last_location and location != last_location and last_point:
-                distance = self.haversine_distance(
-                    last_point.latitude, last_point.longitude,
-                    point.latitude, point.longitude
-                )
-                
-                duration_hours = (point.timestamp - last_point.timestamp).total_seconds() / 3600
-                
-                if distance > 10:  # Only record jumps > 10 miles
-                    jumps.append(LocationJump(
-                        from_location=last_location,
-                        to_location=location,
-                        distance_miles=distance,
-                        duration_hours=duration_hours,
-                        timestamp=point.timestamp
-                    ))
+            if state.last_label and label != state.last_label:
+                # Each from/to pair is reported once; repeats don't move the anchor
+                if (state.last_label, label) in seen_pairs:
+                    continue
+                seen_pairs.add((state.last_label, label))
+                starts.append(state.last_point)
+                ends.append(point)
+                from_labels.append(state.last_label)
+                to_labels.append(label)
+                to_countries.append(result.country)
+                place_names.append(result.place_name)
             
-            last_location = location
-            last_point = point
+            state.last_label = label
+            state.last_point = point
+        
+        if not starts:
+            return []
         
-        return jumps
+        distances = self.haversine_distance_array(
+            np.array([p.latitude for p in starts]), np.array([p.longitude for p in starts]),
+            np.array([p.latitude for p in ends]), np.array([p.longitude for p in ends])
+        )
+        durations = np.array([(end.timestamp - start.timestamp).total_seconds() / 3600 for start, end in zip(starts, ends)])
+        mode_codes = np.array([p.mode_code for p in ends], dtype=np.int8)
+        
+        modes, needs_water = initial_modes(mode_codes, distances, durations,
+                                           [place_country(label) for label in from_labels], to_countries)
+        is_water = await self._resolve_jump_water(np.flatnonzero(needs_water), starts, ends, distances, place_names)
+        modes = finalize_modes(modes, needs_water, is_water, distances, durations, to_countries, place_names)
+        
+        return [
+            ModeJump(
+                from_location=from_labels[i],
+                to_location=to_labels[i],
+                mode=str(modes[i]),
+                distance_miles=float(distances[i]),
+                timestamp=starts[i].timestamp
+            )
+            for i in range(len(starts))
+        ]
     
-    def generate_time_reports(self, points: List[LocationPoint], geocode_results: Dict[LocationPoint, GeocodeResult]) -> Tuple[Dict[str, float], Dict[str, float]]:
-        """Generate time spent reports by city and state/country"""
-        city_time = defaultdict(float)
-        state_time = defaultdict(float)
+    async def _resolve_jump_water(self, jump_indices, starts, ends, distances, place_names) -> np.ndarray:
+        """
+        Water verdict for each jump that needs one: shared jump index first, then
+        the offline water mask, then concurrent remote probes for what's left.
+        """
+        metrics = current_metrics()
+        is_water = np.zeros(len(starts), dtype=bool)
+        owners: Dict[str, List[int]] = defaultdict(list)
+        for j in jump_indices:
+            owners[self.jump_index.key(starts[j].latitude, starts[j].longitude, ends[j].latitude, ends[j].longitude)].append(j)
         
-        last_point = None
-        last_result = None
+        samples = {}
+        for key, jumps in owners.items():
+            j = jumps[0]
+            cached = self.jump_index.get(starts[j].latitude, starts[j].longitude, ends[j].latitude, ends[j].longitude)
+            if cached is not None:
+                is_water[jumps] = cached
+                if metrics is not None:
+                    metrics.count("jump_index_hits", len(jumps))
+            else:
+                samples[key] = water_sample_points(starts[j].latitude, starts[j].longitude,
+                                                   ends[j].latitude, ends[j].longitude, distances[j])
+        if not samples:
+            return is_water
         
-        for point in points:
-            if point not in geocode_results:
-                continue
-                
-            result = geocode_results[point]
+        cells = {}
+        for points in samples.values():
+            for lat, lon in points:
+                cells.setdefault((round(lat, 5), round(lon, 5)), (lat, lon))
+        verdicts: Dict[Tuple[float, float], Optional[bool]] = {}
+        undecided = list(cells)
+        
+        mask = get_water_mask()
+        if mask is not None:
+            classes = mask.classify([cells[c][0] for c in undecided], [cells[c][1] for c in undecided])
+            for cell, verdict in zip(undecided, classes):
+                if verdict == WATER:
+                    verdicts[cell] = True
+                elif verdict == LAND:
+                    verdicts[cell] = False
+            undecided = [cell for cell in undecided if cell not in verdicts]
+            if metrics is not None:
+                metrics.count("water_mask_hits", len(verdicts))
+        
+        self._log(f"Water checks: {len(samples)} segments, {len(cells)} cells, {len(undecided)} probed remotely")
+        if undecided:
+            semaphore = asyncio.Semaphore(self.config.max_concurrent_requests)
             
-            if last_point and last_result:
-                time_diff = (point.timestamp - last_point.timestamp).total_seconds() / (24 * 3600)  # days
-                
-                city_key = f"{last_result.city}, {last_result.country}"
-                city_time[city_key] += time_diff
-                
-                if last_result.country == "United States":
-                    state_key = last_result.state or "Unknown US State"
-                else:
-                    state_key = last_result.country or "Unknown"
-                state_time[state_key] += time_diff
+            async def probe(session: aiohttp.ClientSession, cell):
+                async with semaphore:
+                    verdicts[cell] = await self._probe_water(session, *cells[cell])
+            
+            async with aiohttp.ClientSession() as session:
+                await self._gather_cancellable(*(probe(session, cell) for cell in undecided))
+        
+        for key, points in samples.items():
+            checks = [verdicts.get((round(lat, 5), round(lon, 5))) for lat, lon in points]
+            owner = owners[key][0]
+            water = any(check is True for check in checks) or place_suggests_water(place_names[owner])
+            is_water[owners[key]] = water
+            if all(check is not None for check in checks):
+                self.jump_index.set(starts[owner].latitude, starts[owner].longitude,
+                                    ends[owner].latitude, ends[owner].longitude, water)
+        self.jump_index.save()
+        return is_water
+    
+    async def _probe_water(self, session: aiohttp.ClientSession, lat: float, lon: float) -> Optional[bool]:
+        """Remote water check for one point: OnWater when configured, else a Geoapify reverse lookup"""
+        try:
+            await asyncio.sleep(self.config.api_delay)
+            if self.config.onwater_key:
+                headers = {
+                    'x-rapidapi-key': self.config.onwater_key,
+                    'x-rapidapi-host': 'isitwater-com.p.rapidapi.com'
+                }
+                params = {'latitude': lat, 'longitude': lon}
+                async with self.request_budget:
+                    with timed_request("onwater") as outcome:
+                        async with session.get(onwater_url(), params=params, headers=headers) as response:
+                            outcome['ok'] = response.status == 200
+                            data = await response.json() if response.status == 200 else None
+                if data is not None:
+                    return bool(data.get('water', False))
             
-            last_point = point
-            last_result = result
+            params = {
+                'lat': lat,
+                'lon': lon,
+                'apiKey': self.config.geoapify_key,
+                'format': 'json'
+            }
+            async with self.request_budget:
+                with timed_request("geoapify_water") as outcome:
+                    async with session.get(geoapify_url("/v1/geocode/reverse"), params=params) as response:
+                        outcome['ok'] = response.status == 200
+                        data = await response.json() if response.status == 200 else None
+            if data is not None:
+                results = data.get('results') or []
+                if not results:
+                    return True  # nothing to reverse geocode: open water
+                name = (results[0].get('name') or '').lower()
+                return (str(results[0].get('category', '')).startswith('natural.water') or
+                        any(w in name for w in ["waters", "sea", "ocean", "bay", "channel"]))
+        except Exception:
+            pass
+        return None
+    
+    @staticmethod
+    def haversine_distance_array(lat1, lon1, lat2, lon2) -> np.ndarray:
+        """Vectorized haversine_distance over numpy arrays, in miles"""
+        R = 3958.8  # Earth radius in miles
+        phi1 = np.radians(lat1)
+        phi2 = np.radians(lat2)
+        delta_phi = np.radians(np.asarray(lat2) - np.asarray(lat1))
+        delta_lambda = np.radians(np.asarray(lon2) - np.asarray(lon1))
         
-        return dict(city_time), dict(state_time)
+        a = (np.sin(delta_phi / 2)**2 + 
+             np.cos(phi1) * np.cos(phi2) * np.sin(delta_lambda / 2)**2)
+        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        
+        return R * c
     
     @staticmethod
     def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -417,41 +1141,422 @@ class LocationAnalyzer:
         
         return R * c
     
-    async def analyze_location_history(self, file_path: str, start_date, end_date, output_dir: str):
-        """Main analysis function - processes location history and generates reports"""
+    async def analyze_location_history(self, file_path: str, start_date, end_date, output_dir: str,
+                                       dataset_id: Optional[str] = None, checkpoint_dir: Optional[str] = None):
+        """
+        Main analysis function - processes location history and generates reports.
+        With incremental_aggregates, dataset_id (default: the file's absolute path)
+        names the per-day aggregate store reused and extended by this run.
+        With checkpoint_dir, stage outputs are saved there and a run started
+        earlier with the same arguments continues from its last completed stage.
+        Raises AnalysisCancelled once the analyzer's cancel_check returns True.
+        
+        Per-stage timings, cache and API counters are returned under 'metrics'
+        and written to run_metrics.json (see run_metrics.py); with
+        AnalysisConfig.profile_run a cProfile dump goes to profile.prof.
+        """
+        metrics = RunMetrics().activate()
+        profiler = cProfile.Profile() if self.config.profile_run else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            result = await self._analyze(file_path, start_date, end_date, output_dir, dataset_id, checkpoint_dir, metrics)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(output_dir, exist_ok=True)
+                profiler.dump_stats(os.path.join(output_dir, "profile.prof"))
+            metrics.deactivate()
+        
+        result['metrics'] = metrics.to_dict()
+        metrics.write(output_dir, result['metrics'])
+        return result
+    
+    async def _analyze(self, file_path: str, start_date, end_date, output_dir: str, dataset_id: Optional[str],
+                       checkpoint_dir: Optional[str], metrics: RunMetrics):
+        """The analysis itself; see analyze_location_history"""
         self._log(f"Starting analysis from {start_date} to {end_date}")
+        start_date = self._ensure_date_object(start_date)
+        end_date = self._ensure_date_object(end_date)
         
-        # 1. Parse location data
-        points = self.parse_location_data(file_path, start_date, end_date)
-        self._log(f"Found {len(points)} location points")
+        if self.config.shard_workers > 1:
+            if not (self.config.incremental_aggregates or checkpoint_dir or self.config.pipeline_mode):
+                from sharded_analysis import run_sharded
+                return await run_sharded(self, file_path, start_date, end_date, output_dir, metrics)
+            self._log("⚠️ Sharded analysis can't be combined with incremental aggregates, checkpoints "
+                      "or pipeline mode; running in one process")
+        
+        store = None
+        if self.config.incremental_aggregates:
+            store = self._open_aggregates(dataset_id or os.path.abspath(file_path), start_date, end_date)
+        carry = store.carry if store is not None else {}
+        emit_from = store.resume_date if store is not None and store.sealed_through else None
+        filter_seed = point_from_json(carry.get('filter_point'))
         
-        # 2. Filter significant points
-        filtered_points = self.filter_significant_points(points)
-        self._log(f"Filtered to {len(filtered_points)} significant points")
+        checkpoint = None
+        if checkpoint_dir:
+            checkpoint = RunCheckpoint(checkpoint_dir)
+            checkpoint.begin({
+                'file_path': os.path.abspath(file_path),
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat(),
+                'output_dir': output_dir,
+                'dataset_id': dataset_id,
+                'emit_from': emit_from.isoformat() if emit_from else None,
+                'settings': settings_fingerprint(self.config)
+            }, file_path)
+            if checkpoint.stage != "started":
+                self._log(f"Resuming analysis after its '{checkpoint.stage}' stage")
+        
+        geocoded = None
+        if checkpoint is not None and checkpoint.reached("filtered"):
+            with metrics.stage("filter") as stage:
+                filtered_points = self._load_points(checkpoint, "filtered")
+                stage.update(points_out=len(filtered_points), from_checkpoint=True)
+            self._log(f"Filtered to {len(filtered_points)} significant points")
+        elif self.config.pipeline_mode:
+            # 1-3. Parse, filter and geocode as one streaming pipeline
+            with metrics.stage("pipeline") as stage:
+                filtered_points, geocoded, parsed_count = await self._run_pipeline(
+                    file_path, start_date, end_date, emit_from, filter_seed)
+                stage.update(points_in=parsed_count, points_out=len(filtered_points))
+            self._log(f"Filtered to {len(filtered_points)} significant points")
+            self._checkpoint_points(checkpoint, "filtered", filtered_points)
+        else:
+            # 1. Parse location data
+            with metrics.stage("parse") as stage:
+                if checkpoint is not None and checkpoint.reached("parsed"):
+                    points = self._load_points(checkpoint, "parsed")
+                    stage['from_checkpoint'] = True
+                else:
+                    points = self.parse_location_data(file_path, start_date, end_date, emit_from)
+                    self._checkpoint_points(checkpoint, "parsed", points)
+                stage['points_out'] = len(points)
+            self._log(f"Found {len(points)} location points")
+            
+            # 2. Filter significant points
+            with metrics.stage("filter", points_in=len(points)) as stage:
+                filtered_points = self.filter_significant_points(points, filter_seed)
+                stage['points_out'] = len(filtered_points)
+            self._log(f"Filtered to {len(filtered_points)} significant points")
+            self._checkpoint_points(checkpoint, "filtered", filtered_points)
         
         # 3. Geocode points
-        geocode_results = await self.geocode_points(filtered_points)
-        self._log(f"Geocoded {len(geocode_results)} locations")
+        with metrics.stage("geocode", points_in=len(filtered_points)) as stage:
+            if checkpoint is not None and checkpoint.reached("geocoded"):
+                geocoded = self._load_geocoded(checkpoint)
+                stage['from_checkpoint'] = True
+            else:
+                if geocoded is None:
+                    geocoded = await self.geocode_points(filtered_points)
+                self._checkpoint_geocoded(checkpoint, geocoded)
+            stage['points_out'] = geocoded.resolved_count
+        self._log(f"Geocoded {geocoded.resolved_count} locations")
+        self._check_cancelled()
         
         # 4. Calculate jumps and time reports
-        jumps = self.calculate_jumps(filtered_points, geocode_results)
-        city_time, state_time = self.generate_time_reports(filtered_points, geocode_results)
+        if store is not None:
+            with metrics.stage("aggregate_reports", points_in=len(filtered_points)) as stage:
+                jumps, city_time, state_time, mode_jumps = await self._report_with_aggregates(
+                    store, filtered_points, geocoded, end_date)
+                stage['points_out'] = len(jumps)
+        else:
+            with metrics.stage("jumps", points_in=len(filtered_points)) as stage:
+                jumps = self.calculate_jumps(filtered_points, geocoded)
+                stage['points_out'] = len(jumps)
+            with metrics.stage("time_reports", points_in=len(filtered_points)) as stage:
+                city_time, state_time = self.generate_time_reports(filtered_points, geocoded)
+                stage['points_out'] = len(city_time)
+            
+            mode_jumps = None
+            if self.config.infer_transport_modes:
+                with metrics.stage("transport_modes", points_in=len(filtered_points)) as stage:
+                    mode_jumps = await self.classify_jump_modes(filtered_points, geocoded)
+                    stage['points_out'] = len(mode_jumps)
+        if mode_jumps is not None:
+            self._log(f"Classified {len(mode_jumps)} jumps by transport mode")
+        self._check_cancelled()
         
         total_distance = sum(jump.distance_miles for jump in jumps)
         self._log(f"Total distance: {total_distance:.2f} miles")
         self._log(f"Total jumps: {len(jumps)}")
         
         # 5. Export results
-        self._export_results(jumps, city_time, state_time, output_dir)
+        with metrics.stage("export"):
+            self._export_results(jumps, city_time, state_time, output_dir, mode_jumps)
+        if checkpoint is not None:
+            checkpoint.complete_stage("complete")
+            checkpoint.clear_stage_files()
         
-        return {
+        result = {
             'total_distance': total_distance,
             'total_jumps': len(jumps),
             'cities_visited': len(city_time),
             'jumps': jumps
         }
+        if mode_jumps is not None:
+            modes = [jump.mode for jump in mode_jumps]
+            result['mode_counts'] = {mode: modes.count(mode) for mode in sorted(set(modes))}
+        return result
     
-    def _export_results(self, jumps: List[LocationJump], city_time: Dict[str, float], state_time: Dict[str, float], output_dir: str):
+    async def analyze_windows(self, file_path: str, windows, output_root: str) -> Dict:
+        """
+        Analyze several date windows (see analysis_windows.py) of one file.
+        The file is parsed once over the union of the windows, the points any
+        window keeps are geocoded together, and each window's significance
+        filter runs in one sweep over the sorted points. Every window gets the
+        reports a separate analyze_location_history() run over its dates would
+        write, in output_root/<window name>/.
+        Returns {'windows': {name: result}, 'metrics': {...}}.
+        """
+        windows = normalize_windows(windows)
+        metrics = RunMetrics().activate()
+        try:
+            results = await self._analyze_windows(file_path, windows, output_root, metrics)
+        finally:
+            metrics.deactivate()
+        summary = metrics.to_dict()
+        metrics.write(output_root, summary)
+        return {'windows': results, 'metrics': summary}
+    
+    async def _analyze_windows(self, file_path: str, windows: List[AnalysisWindow], output_root: str,
+                               metrics: RunMetrics) -> Dict[str, dict]:
+        union_start = min(window.start_date for window in windows)
+        union_end = max(window.end_date for window in windows)
+        self._log(f"Starting analysis of {len(windows)} windows from {union_start} to {union_end}")
+        
+        # 1. Parse the union of the windows once, sorted like parse_location_data
+        with metrics.stage("parse") as stage:
+            records = list(self._iter_location_records(file_path, union_start, union_end))
+            records.sort(key=lambda record: record[0].timestamp)
+            points = [point for point, _ in records]
+            point_days = point_columns(points)[0] // NS_PER_DAY
+            object_days = np.fromiter(
+                ((object_day - EPOCH_DATE).days if object_day is not None else day
+                 for (_, object_day), day in zip(records, point_days.tolist())),
+                dtype=np.int64, count=len(records))
+            del records
+            stage['points_out'] = len(points)
+        self._log(f"Found {len(points)} location points")
+        self._check_cancelled()
+        
+        # 2. Significance filter per window, all windows in one sweep
+        with metrics.stage("filter", points_in=len(points)) as stage:
+            first_day = np.minimum(point_days, object_days)
+            last_day = np.maximum(point_days, object_days)
+            kept: List[List[int]] = [[] for _ in windows]
+            # Window membership as bits of one int64 per point, in groups of 62 windows
+            for group_start in range(0, len(windows), 62):
+                group = windows[group_start:group_start + 62]
+                membership = np.zeros(len(points), dtype=np.int64)
+                for bit, window in enumerate(group):
+                    inside = ((first_day >= (window.start_date - EPOCH_DATE).days) &
+                              (last_day <= (window.end_date - EPOCH_DATE).days))
+                    membership |= inside.astype(np.int64) << bit
+                filters = [SignificantPointFilter(self.config.min_distance_filter, self.config.min_time_filter)
+                           for _ in group]
+                members_of: Dict[int, List[int]] = {}
+                for i, bits in enumerate(membership.tolist()):
+                    if not bits:
+                        continue
+                    members = members_of.get(bits)
+                    if members is None:
+                        members = members_of[bits] = [bit for bit in range(len(group)) if bits >> bit & 1]
+                    point = points[i]
+                    for bit in members:
+                        if filters[bit].accept(point):
+                            kept[group_start + bit].append(i)
+            union_indices = np.unique(np.concatenate([np.asarray(indices, dtype=np.int64) for indices in kept]))
+            stage['points_out'] = len(union_indices)
+        for window, indices in zip(windows, kept):
+            self._log(f"{window.name}: filtered to {len(indices)} significant points")
+        self._check_cancelled()
+        
+        # 3. Geocode every point some window kept, once
+        with metrics.stage("geocode", points_in=len(union_indices)) as stage:
+            geocoded_union = await self.geocode_points([points[i] for i in union_indices.tolist()])
+            stage['points_out'] = geocoded_union.resolved_count
+        self._log(f"Geocoded {geocoded_union.resolved_count} locations")
+        self._check_cancelled()
+        
+        # 4. Reports per window from its slice of the shared results
+        results = {}
+        for window, indices in zip(windows, kept):
+            window_points = [points[i] for i in indices]
+            geocoded = geocoded_union.take(np.searchsorted(union_indices, np.asarray(indices, dtype=np.int64)))
+            with metrics.stage("reports", points_in=len(window_points)) as stage:
+                jumps = self.calculate_jumps(window_points, geocoded)
+                city_time, state_time = self.generate_time_reports(window_points, geocoded)
+                mode_jumps = None
+                if self.config.infer_transport_modes:
+                    mode_jumps = await self.classify_jump_modes(window_points, geocoded)
+                stage['points_out'] = len(jumps)
+            self._check_cancelled()
+            
+            with metrics.stage("export"):
+                self._export_results(jumps, city_time, state_time, os.path.join(output_root, window.directory_name),
+                                     mode_jumps)
+            total_distance = sum(jump.distance_miles for jump in jumps)
+            self._log(f"{window.name}: {total_distance:.2f} miles, {len(jumps)} jumps")
+            result = {
+                'start_date': window.start_date.isoformat(),
+                'end_date': window.end_date.isoformat(),
+                'output_dir': os.path.join(output_root, window.directory_name),
+                'total_distance': total_distance,
+                'total_jumps': len(jumps),
+                'cities_visited': len(city_time),
+                'jumps': jumps
+            }
+            if mode_jumps is not None:
+                modes = [jump.mode for jump in mode_jumps]
+                result['mode_counts'] = {mode: modes.count(mode) for mode in sorted(set(modes))}
+            results[window.name] = result
+        self._log(f"Analysis of {len(windows)} windows complete")
+        return results
+    
+    async def resume_analysis(self, checkpoint_dir: str):
+        """Continue a checkpointed analysis from its run directory"""
+        checkpoint = RunCheckpoint(checkpoint_dir)
+        if not checkpoint.exists:
+            raise ValueError(f"No checkpointed analysis in {checkpoint_dir}")
+        params = checkpoint.params
+        return await self.analyze_location_history(params['file_path'], params['start_date'], params['end_date'],
+                                                   params['output_dir'], dataset_id=params.get('dataset_id'),
+                                                   checkpoint_dir=checkpoint_dir)
+    
+    def _checkpoint_points(self, checkpoint: Optional[RunCheckpoint], stage: str, points: List[LocationPoint]):
+        if checkpoint is None:
+            return
+        timestamps, lats, lons = point_columns(points)
+        checkpoint.save_columns(stage, timestamps=timestamps, latitudes=lats, longitudes=lons,
+                                mode_codes=np.fromiter((p.mode_code for p in points), dtype=np.int16, count=len(points)))
+        checkpoint.complete_stage(stage)
+    
+    def _load_points(self, checkpoint: RunCheckpoint, stage: str) -> List[LocationPoint]:
+        columns = checkpoint.load_columns(stage)
+        return [
+            LocationPoint(pd.Timestamp(ts, tz="UTC"), lat, lon, mode_code)
+            for ts, lat, lon, mode_code in zip(columns['timestamps'].tolist(), columns['latitudes'].tolist(),
+                                               columns['longitudes'].tolist(), columns['mode_codes'].tolist())
+        ]
+    
+    def _checkpoint_geocoded(self, checkpoint: Optional[RunCheckpoint], geocoded: "GeocodedPoints"):
+        if checkpoint is None:
+            return
+        checkpoint.save_columns("geocoded", location_ids=geocoded.location_ids)
+        checkpoint.save_json("geocoded", [asdict(location) for location in geocoded.locations])
+        checkpoint.complete_stage("geocoded")
+    
+    def _load_geocoded(self, checkpoint: RunCheckpoint) -> "GeocodedPoints":
+        location_ids = checkpoint.load_columns("geocoded")['location_ids'].astype(np.int32)
+        return GeocodedPoints(location_ids, [GeocodeResult(**location) for location in checkpoint.load_json("geocoded")])
+    
+    def _open_aggregates(self, dataset_id: str, start_date: date, end_date: date) -> Optional[DailyAggregateStore]:
+        """
+        Stored aggregates to resume from, or a fresh store to fill. None when the
+        stored aggregates already reach past end_date (run in full, keep the store).
+        """
+        fingerprint = settings_fingerprint(self.config)
+        store = DailyAggregateStore.load(dataset_id)
+        if store is not None:
+            reason = store.reuse_reason(fingerprint, start_date, end_date)
+            if reason is None:
+                self._log(f"💾 Reusing aggregates through {store.sealed_through}, analyzing from {store.resume_date}")
+                return store
+            if store.fingerprint == fingerprint and store.start_date == start_date:
+                self._log(f"💾 Not reusing aggregates: {reason}")
+                return None
+            self._log(f"💾 Rebuilding aggregates: {reason}")
+        return DailyAggregateStore(dataset_id, fingerprint, start_date)
+    
+    async def _report_with_aggregates(self, store: DailyAggregateStore, points: List[LocationPoint],
+                                      geocoded: "GeocodedPoints", end_date: date):
+        """
+        Combine the stored days with the newly analyzed points into full-range
+        reports, then seal and store every day that is now complete.
+        Returns (jumps, city_time, state_time, mode_jumps).
+        """
+        carry = store.carry
+        # The last geocoded point before the new days anchors the first jump and dwell interval
+        report_points, report_geocoded = points, geocoded
+        if carry.get('anchor'):
+            report_points = [point_from_json(carry['anchor']['point'])] + points
+            report_geocoded = geocoded.with_leading(GeocodeResult(**carry['anchor']['location']))
+        
+        # The export's last day is usually partial: seal only days before it (and before end_date)
+        sealed = store.sealed_through
+        if points:
+            last_complete = min(end_date, points[-1].timestamp.date()) - timedelta(days=1)
+            if last_complete >= store.start_date and (sealed is None or last_complete > sealed):
+                sealed = last_complete
+        before_ns = day_end_ns(sealed) if sealed is not None else None
+        timestamps = point_columns(points)[0]
+        split = int(np.searchsorted(timestamps, before_ns)) if before_ns is not None else 0
+        
+        jumps = self.calculate_jumps(report_points, report_geocoded)
+        city_time, state_time = self.generate_time_reports(report_points, report_geocoded)
+        
+        mode_jumps = None
+        sealed_mode_jumps: List[ModeJump] = []
+        mode_state = None
+        if self.config.infer_transport_modes:
+            mode_state = ModeJumpState.from_json(carry.get('mode_state'))
+            sealed_mode_jumps = await self.classify_jump_modes(points[:split], geocoded.slice(0, split), mode_state)
+            mode_carry = mode_state.to_json()
+            mode_jumps = sealed_mode_jumps + await self.classify_jump_modes(points[split:], geocoded.slice(split), mode_state)
+        
+        # Full-range results: stored days first, then everything computed in this run
+        stored_city, stored_state = {}, {}
+        stored_jumps, stored_mode_jumps = [], []
+        for day in sorted(store.days):
+            record = store.days[day]
+            add_times(stored_city, record['city'])
+            add_times(stored_state, record['state'])
+            stored_jumps.extend(LocationJump(f, t, d, h, pd.Timestamp(ts, tz="UTC")) for f, t, d, h, ts in record['jumps'])
+            stored_mode_jumps.extend(ModeJump(f, t, m, d, pd.Timestamp(ts, tz="UTC")) for f, t, m, d, ts in record['mode_jumps'])
+        add_times(stored_city, city_time)
+        add_times(stored_state, state_time)
+        full_jumps = stored_jumps + jumps
+        if mode_jumps is not None:
+            mode_jumps = stored_mode_jumps + mode_jumps
+        
+        if sealed is None:
+            return full_jumps, stored_city, stored_state, mode_jumps
+        
+        for day, (city, state) in self.daily_time_reports(report_points, report_geocoded, before_ns).items():
+            store.merge_day(day, city=city, state=state)
+        for jump in jumps:
+            if jump.timestamp.value < before_ns:
+                store.merge_day(jump.timestamp.date(), jumps=[[jump.from_location, jump.to_location, jump.distance_miles,
+                                                               jump.duration_hours, int(jump.timestamp.value)]])
+        for jump in sealed_mode_jumps:
+            store.merge_day(jump.timestamp.date(), mode_jumps=[[jump.from_location, jump.to_location, jump.mode,
+                                                                jump.distance_miles, int(jump.timestamp.value)]])
+        
+        new_carry = dict(carry)
+        if split:
+            new_carry['filter_point'] = point_to_json(points[split - 1])
+        report_ids = report_geocoded.location_ids
+        anchored = np.flatnonzero(report_ids[:split + len(report_points) - len(points)] >= 0)
+        if anchored.size:
+            last = int(anchored[-1])
+            location = report_geocoded.locations[report_ids[last]]
+            new_carry['anchor'] = {
+                'point': point_to_json(report_points[last]),
+                'location': {'city': location.city, 'state': location.state, 'country': location.country,
+                             'place_name': location.place_name, 'is_water': location.is_water}
+            }
+        if mode_state is not None:
+            new_carry['mode_state'] = mode_carry
+        store.carry = new_carry
+        store.sealed_through = sealed
+        store.save()
+        self._log(f"💾 Aggregates sealed through {sealed}")
+        
+        return full_jumps, stored_city, stored_state, mode_jumps
+    
+    def _export_results(self, jumps: List[LocationJump], city_time: Dict[str, float], state_time: Dict[str, float], output_dir: str,
+                        mode_jumps: Optional[List[ModeJump]] = None):
         """Export analysis results to CSV files and summary report"""
         import csv
         
@@ -471,6 +1576,21 @@ class LocationAnalyzer:
                     round(jump.duration_hours, 2)
                 ])
         
+        # City jumps with transport mode CSV (same layout as the legacy engine)
+        if mode_jumps is not None:
+            mode_file = os.path.join(output_dir, "city_jumps_with_mode.csv")
+            with open(mode_file, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["Date", "From", "To", "Mode", "Distance (mi)"])
+                for jump in mode_jumps:
+                    writer.writerow([
+                        jump.timestamp.strftime("%Y-%m-%d %H:%M"),
+                        jump.from_location,
+                        jump.to_location,
+                        jump.mode,
+                        round(jump.distance_miles, 2)
+                    ])
+        
         # City time CSV
         city_file = os.path.join(output_dir, "by_city_location_days.csv")
         with open(city_file, "w", newline="", encoding="utf-8") as f:
@@ -0,0 +1,158 @@
+# process_workers.py - Run analyses in recycled worker processes
+"""
+WorkerProcess runs a function such as analyzer_bridge.process_location_file
+in a child process. A CPU-heavy JSON parse then can't stall the web app's
+request handling or the progress polling of other analyses.
+
+The child calls fn(*args, log_func=..., cancel_check=..., **kwargs), with
+a log_func that streams every message back over a pipe. The parent hands
+those messages to its own log function as they arrive, so progress
+tracking in the parent works exactly as for an in-thread run. Cancelling
+sets an event the child's cancel_check reads. The function's return value
+comes back pickled. Exceptions come back as WorkerError.
+
+A worker runs one job at a time. It is replaced by a fresh process after
+max_jobs jobs, which returns memory fragmented by large parses to the OS,
+and after a crash. Each of the web app's scheduler threads owns one
+worker; thread_worker() returns it.
+
+Children are started with "spawn" so they don't inherit the threads and
+locks of the multi-threaded web server. The child's entry point is in this
+module and jobs are functions of the analyzer modules, so only the
+analyzers are imported for their sake. Spawn also re-imports the server's
+main script as __mp_main__, so app.py does nothing at import time but
+define the app; its services start with the first request.
+"""
+
+import multiprocessing
+import threading
+from typing import Callable, Optional
+
+POLL_INTERVAL = 0.2  # seconds between cancel checks while waiting for the child
+
+_context = multiprocessing.get_context("spawn")
+_local = threading.local()
+
+
+class WorkerError(Exception):
+    """A job failed in the worker process, or the process died while running it"""
+
+
+def _child_main(conn, cancel_event):
+    """Worker process: run jobs from the pipe until told to stop"""
+    send_lock = threading.Lock()
+
+    def send(kind, payload):
+        with send_lock:
+            conn.send((kind, payload))
+
+    def log_func(message):
+        send("log", str(message))
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        fn, args, kwargs = job
+        try:
+            result = fn(*args, log_func=log_func, cancel_check=cancel_event.is_set, **kwargs)
+        except Exception as e:
+            send("error", f"{type(e).__name__}: {e}")
+            continue
+        try:
+            send("result", result)
+        except Exception as e:
+            send("error", f"Could not return the result: {e}")
+
+
+class WorkerProcess:
+    """One child process that runs jobs sent to it, replaced after max_jobs jobs"""
+
+    def __init__(self, max_jobs: int = 10):
+        self.max_jobs = max_jobs
+        self.jobs_done = 0
+        self.processes_started = 0
+        self._process = None
+        self._conn = None
+        self._cancel_event = None
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    def _start(self):
+        parent_conn, child_conn = _context.Pipe()
+        self._cancel_event = _context.Event()
+        self._process = _context.Process(target=_child_main, args=(child_conn, self._cancel_event),
+                                         name="analysis-worker", daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self.jobs_done = 0
+        self.processes_started += 1
+
+    def stop(self, timeout: float = 5.0):
+        """Let the child exit after its current job (or end it after timeout)"""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._conn.close()
+        self._process = self._conn = self._cancel_event = None
+
+    def _discard(self):
+        """Forget a child that died"""
+        if self._process is not None:
+            self._process.join(1.0)
+            self._conn.close()
+        self._process = self._conn = self._cancel_event = None
+
+    def run(self, fn: Callable, args: tuple = (), kwargs: Optional[dict] = None,
+            log_func: Callable[[str], None] = print, cancel_check: Optional[Callable[[], bool]] = None):
+        """Run fn in the child and return its result, relaying log messages and cancellation"""
+        if not self.alive:
+            self._discard()
+            self._start()
+        self._cancel_event.clear()
+        self._conn.send((fn, args, kwargs or {}))
+        try:
+            while True:
+                if cancel_check is not None and cancel_check():
+                    self._cancel_event.set()
+                try:
+                    if not self._conn.poll(POLL_INTERVAL):
+                        if not self._process.is_alive():
+                            raise EOFError
+                        continue
+                    kind, payload = self._conn.recv()
+                except (EOFError, OSError):
+                    exitcode = self._process.exitcode
+                    self._discard()
+                    raise WorkerError(f"Analysis worker process exited unexpectedly (exit code {exitcode})")
+                if kind == "log":
+                    log_func(payload)
+                elif kind == "result":
+                    return payload
+                else:
+                    raise WorkerError(payload)
+        finally:
+            self.jobs_done += 1
+            if self.max_jobs and self.jobs_done >= self.max_jobs:
+                self.stop()
+
+
+def thread_worker(max_jobs: int = 10) -> WorkerProcess:
+    """The worker process owned by the calling thread, created on first use"""
+    worker = getattr(_local, "worker", None)
+    if worker is None:
+        worker = _local.worker = WorkerProcess(max_jobs)
+    return worker
@@ -0,0 +1,89 @@
+# progress_log.py - Bounded per-analysis progress log with sequence-number cursors
+"""
+ProgressLog keeps the most recent lines an analysis logged, up to a fixed
+capacity. Older lines are spilled to a log file in the analysis' output
+directory, so a chatty analysis uses the same memory as a quiet one.
+close() writes the lines still in memory as well, which leaves the
+complete log on disk once the analysis ends.
+
+Each line gets a sequence number (1, 2, ...). Readers pass the last number
+they have seen to since() and receive only the newer lines. Lines that
+were spilled before the reader got them are reported as skipped.
+"""
+
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, List, Optional
+
+SPILL_BATCH = 50  # evicted lines collected before they are written to the log file
+
+
+class ProgressLog:
+    """Ring buffer of {'seq', 'timestamp', 'message'} entries, spilling evicted ones to a file"""
+
+    def __init__(self, capacity: int = 500, spill_path: Optional[str] = None):
+        self.capacity = max(1, capacity)
+        self.spill_path = spill_path
+        self._lock = threading.Lock()
+        self._entries: Deque[dict] = deque()
+        self._spill: List[dict] = []
+        self._last_seq = 0
+        self._closed = False
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the newest line (0 before the first one)"""
+        return self._last_seq
+
+    def append(self, message: str) -> dict:
+        with self._lock:
+            self._last_seq += 1
+            entry = {
+                'seq': self._last_seq,
+                'timestamp': datetime.now().strftime('%H:%M:%S'),
+                'message': str(message)
+            }
+            self._entries.append(entry)
+            if len(self._entries) > self.capacity:
+                self._spill.append(self._entries.popleft())
+                if len(self._spill) >= SPILL_BATCH:
+                    self._write_spill()
+            return entry
+
+    def since(self, seq: int = 0) -> dict:
+        """Lines newer than seq still in memory, and how many newer ones were already spilled"""
+        with self._lock:
+            entries = [entry for entry in self._entries if entry['seq'] > seq]
+            first_kept = entries[0]['seq'] if entries else self._last_seq + 1
+            return {
+                'logs': entries,
+                'log_seq': self._last_seq,
+                'logs_skipped': max(0, first_kept - max(seq, 0) - 1)
+            }
+
+    def messages(self) -> List[str]:
+        """Messages of the lines still in memory, oldest first"""
+        with self._lock:
+            return [entry['message'] for entry in self._entries]
+
+    def close(self):
+        """Write everything not yet on disk to the log file; later calls do nothing"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._spill.extend(self._entries)
+            self._write_spill()
+
+    def _write_spill(self):
+        """Append pending evicted lines to the log file (called with the lock held)"""
+        pending, self._spill = self._spill, []
+        if not pending or not self.spill_path:
+            return
+        try:
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for entry in pending:
+                    f.write(f"{entry['timestamp']} {entry['message']}\n")
+        except OSError as e:
+            print(f"⚠️ Could not write progress log {self.spill_path}: {e}")
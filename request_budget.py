@@ -0,0 +1,82 @@
+# request_budget.py - API request limits shared by concurrent analyses
+"""
+A RequestBudget caps how many API requests are in flight at once and how
+many start per second. LocationAnalyzer takes one slot around every
+geocoding and water-check request. Each analyzer gets its own unlimited
+budget unless it is given a shared one. batch_analyze.py shares a single
+budget across all the analyses it runs at the same time. That way a batch
+stays inside one API plan's rate limit, however many files are being
+processed.
+
+The budget is safe to share between threads, each running its own event
+loop. Waiting for a slot polls with asyncio.sleep() instead of using
+loop-bound primitives.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Optional
+
+POLL_INTERVAL = 0.05  # longest sleep between checks for a free slot (seconds)
+
+
+class RequestBudget:
+    """Concurrency and start-rate limit for API requests: `async with budget:` around each request"""
+
+    def __init__(self, max_concurrent: Optional[int] = None, requests_per_second: float = 0.0):
+        self.max_concurrent = max_concurrent
+        self.min_interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._active = 0
+        self._next_start = 0.0
+        self.requests = 0
+        self.waited_s = 0.0
+
+    @property
+    def limited(self) -> bool:
+        return self.max_concurrent is not None or self.min_interval > 0
+
+    def _try_acquire(self) -> float:
+        """Take a slot and return 0, or return how long to wait before trying again"""
+        with self._lock:
+            now = time.monotonic()
+            if self.max_concurrent is not None and self._active >= self.max_concurrent:
+                return POLL_INTERVAL
+            if now < self._next_start:
+                return self._next_start - now
+            self._active += 1
+            self._next_start = max(now, self._next_start) + self.min_interval
+            self.requests += 1
+            return 0.0
+
+    async def __aenter__(self):
+        if not self.limited:
+            self.requests += 1
+            return self
+        started = time.monotonic()
+        while True:
+            wait = self._try_acquire()
+            if not wait:
+                break
+            await asyncio.sleep(min(wait, POLL_INTERVAL))
+        waited = time.monotonic() - started
+        if waited:
+            with self._lock:
+                self.waited_s += waited
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.limited:
+            with self._lock:
+                self._active -= 1
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "waited_s": round(self.waited_s, 3),
+                "max_concurrent": self.max_concurrent,
+                "requests_per_second": round(1.0 / self.min_interval, 3) if self.min_interval else None,
+            }
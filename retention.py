@@ -0,0 +1,163 @@
+# retention.py - Result archive and cleanup of finished analyses for the web app
+"""
+A finished analysis leaves an in-memory progress entry, its upload, its
+output folder and possibly a checkpoint directory behind. This module
+keeps all of that bounded:
+
+- ResultArchive stores a small JSON record of every finished analysis:
+  its status, result summary, tail of the log and the files it owns.
+  The web app serves results and progress of evicted analyses from these
+  records, without keeping them in memory.
+- evict_finished() drops the least recently used finished entries from
+  the in-memory progress dict once it holds more than a set number.
+- select_expired() picks the archived analyses to delete: those finished
+  longer ago than the TTL, and the oldest beyond the maximum count.
+  remove_paths() deletes their files. stale_entries() finds files that no
+  record or running analysis refers to, such as those left by a restart.
+- Sweeper runs a cleanup function periodically on a daemon thread.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+
+class ResultArchive:
+    """One JSON record per finished analysis: <folder>/<analysis_id>.json"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, analysis_id: str) -> str:
+        return os.path.join(self.folder, f"{analysis_id}.json")
+
+    def save(self, analysis_id: str, record: dict):
+        tmp_path = self._path(analysis_id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f, default=str)
+        os.replace(tmp_path, self._path(analysis_id))
+
+    def load(self, analysis_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(analysis_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def remove(self, analysis_id: str):
+        try:
+            os.remove(self._path(analysis_id))
+        except FileNotFoundError:
+            pass
+
+    def records(self) -> Dict[str, dict]:
+        """All readable records by analysis id"""
+        records = {}
+        for name in os.listdir(self.folder):
+            if name.endswith(".json"):
+                analysis_id = name[:-len(".json")]
+                record = self.load(analysis_id)
+                if record is not None:
+                    records[analysis_id] = record
+        return records
+
+
+def evict_finished(progress: "OrderedDict[str, dict]", max_entries: int) -> List[str]:
+    """
+    Drop the least recently used finished entries until at most max_entries
+    finished ones remain (oldest first: callers move entries to the end on
+    use). Running and queued analyses are never evicted.
+    """
+    finished = [analysis_id for analysis_id, entry in list(progress.items()) if entry.get("complete")]
+    evicted = finished[:max(0, len(finished) - max_entries)]
+    for analysis_id in evicted:
+        progress.pop(analysis_id, None)
+    return evicted
+
+
+def select_expired(records: Dict[str, dict], ttl_seconds: float, max_results: int,
+                   now: Optional[float] = None) -> List[str]:
+    """Ids of records finished more than ttl_seconds ago, plus the oldest beyond max_results (0 = no limit)"""
+    now = time.time() if now is None else now
+    by_age = sorted(records, key=lambda analysis_id: records[analysis_id].get("completed_at", 0))
+    expired = set()
+    if ttl_seconds > 0:
+        expired.update(analysis_id for analysis_id in by_age
+                       if now - records[analysis_id].get("completed_at", 0) > ttl_seconds)
+    if max_results > 0:
+        expired.update(by_age[:max(0, len(by_age) - max_results)])
+    return [analysis_id for analysis_id in by_age if analysis_id in expired]
+
+
+def stale_entries(folder: str, older_than: float, keep: Set[str]) -> List[str]:
+    """Entries of folder last modified before older_than whose absolute path isn't in keep"""
+    if not os.path.isdir(folder):
+        return []
+    stale = []
+    for name in os.listdir(folder):
+        path = os.path.abspath(os.path.join(folder, name))
+        try:
+            if path not in keep and os.path.getmtime(path) < older_than:
+                stale.append(path)
+        except OSError:
+            continue
+    return stale
+
+
+def remove_paths(paths: Iterable[Optional[str]]) -> int:
+    """Delete files and directories, skipping missing ones; returns how many were removed"""
+    removed = 0
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            removed += 1
+        except OSError as e:
+            print(f"⚠️ Could not remove {path}: {e}")
+    return removed
+
+
+class Sweeper:
+    """Calls sweep() every interval seconds on a daemon thread"""
+
+    def __init__(self, sweep: Callable[[], dict], interval: float):
+        self.sweep = sweep
+        self.interval = interval
+        self.last_run: Optional[float] = None
+        self.last_stats: dict = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._loop, name="retention-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> dict:
+        try:
+            self.last_stats = self.sweep()
+        except Exception as e:
+            print(f"⚠️ Retention sweep failed: {e}")
+            self.last_stats = {"error": str(e)}
+        self.last_run = time.time()
+        return self.last_stats
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval)
+
+    def stats(self) -> dict:
+        return {"interval_s": self.interval, "last_run": self.last_run, **self.last_stats}
@@ -0,0 +1,116 @@
+# run_checkpoint.py - On-disk stage checkpoints for resumable analyses
+"""
+Run directory used by LocationAnalyzer to checkpoint a long analysis so a
+crashed or recycled run can be picked up where it stopped.
+
+    manifest.json   - run parameters, input file identity and the last completed stage
+    parsed.npz      - parsed points (timestamps in ns, latitudes, longitudes, mode codes)
+    filtered.npz    - points kept by the significance filter
+    geocoded.npz    - per-filtered-point location ids into geocoded.json
+
+Geocoding progress inside a stage is kept by saving the shared geocode cache
+every AnalysisConfig.cache_save_interval lookups, so a resumed geocode stage
+only requests the cells that never made it into the cache.
+
+API keys are never written to the run directory; callers supply them again
+when resuming.
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+STAGES = ["started", "parsed", "filtered", "geocoded", "complete"]
+
+
+def file_identity(path: str) -> dict:
+    """Size and modification time, enough to notice a replaced input file"""
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+
+class RunCheckpoint:
+    """Stage outputs and progress of one analysis run"""
+
+    def __init__(self, run_dir: str):
+        self.run_dir = run_dir
+        self.manifest: Dict = {}
+        path = os.path.join(run_dir, MANIFEST_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.manifest = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Ignoring unreadable checkpoint manifest {path}: {e}")
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.manifest)
+
+    @property
+    def stage(self) -> str:
+        return self.manifest.get("stage", "started")
+
+    def reached(self, stage: str) -> bool:
+        return self.exists and STAGES.index(self.stage) >= STAGES.index(stage)
+
+    @property
+    def params(self) -> dict:
+        return self.manifest.get("params", {})
+
+    def begin(self, params: dict, input_file: str):
+        """
+        Start a run, or keep the stored progress when it was made for the same
+        parameters and an unchanged input file.
+        """
+        identity = file_identity(input_file)
+        if self.exists and self.manifest.get("params") == params and self.manifest.get("input") == identity:
+            return
+        if self.exists:
+            print(f"⚠️ Restarting checkpointed run in {self.run_dir}: parameters or input file changed")
+        self.manifest = {"params": params, "input": identity, "stage": "started"}
+        self._write_manifest()
+
+    def complete_stage(self, stage: str, **details):
+        self.manifest["stage"] = stage
+        self.manifest.update(details)
+        self._write_manifest()
+
+    def save_columns(self, name: str, **columns):
+        os.makedirs(self.run_dir, exist_ok=True)
+        tmp_path = os.path.join(self.run_dir, f"{name}.npz.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **columns)
+        os.replace(tmp_path, os.path.join(self.run_dir, f"{name}.npz"))
+
+    def load_columns(self, name: str) -> Dict[str, np.ndarray]:
+        with np.load(os.path.join(self.run_dir, f"{name}.npz")) as data:
+            return {key: data[key] for key in data.files}
+
+    def save_json(self, name: str, value):
+        os.makedirs(self.run_dir, exist_ok=True)
+        tmp_path = os.path.join(self.run_dir, f"{name}.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp_path, os.path.join(self.run_dir, f"{name}.json"))
+
+    def load_json(self, name: str):
+        with open(os.path.join(self.run_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def clear_stage_files(self):
+        """Drop stage outputs once the run is complete; the manifest stays as a record"""
+        for name in os.listdir(self.run_dir):
+            if name.endswith(".npz") or (name.endswith(".json") and name != MANIFEST_FILE):
+                os.remove(os.path.join(self.run_dir, name))
+
+    def _write_manifest(self):
+        self.save_json(os.path.splitext(MANIFEST_FILE)[0], self.manifest)
+
+
+def load_checkpoint(run_dir: str) -> Optional[RunCheckpoint]:
+    checkpoint = RunCheckpoint(run_dir)
+    return checkpoint if checkpoint.exists else None
@@ -0,0 +1,165 @@
+# run_metrics.py - Structured per-run instrumentation for the analysis engine
+"""
+Timing and resource counters for one analyze_location_history() run.
+
+A RunMetrics instance is made current for the duration of a run through a
+context variable, so the geocoder and water probes can record requests
+without threading a metrics object through every call (and concurrent runs
+in one event loop each see their own). Collected per run:
+
+    stages     - wall and CPU seconds, RSS after the stage, points in and out
+    cache      - geocode cache hits and misses, jump index and water mask hits
+    api        - request count, errors and latency percentiles per API
+    peak_rss   - highest RSS sampled (stage boundaries and every 100 requests)
+
+to_dict() is returned in the result dict and written to run_metrics.json.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RSS_SAMPLE_EVERY = 100  # API requests between memory samples
+
+_current: contextvars.ContextVar = contextvars.ContextVar("run_metrics", default=None)
+
+
+def _memory_usage_mb() -> float:
+    # Imported lazily: analyzer_bridge imports the analyzer, which imports this module
+    try:
+        from analyzer_bridge import get_memory_usage
+        return float(get_memory_usage())
+    except Exception:
+        return 0.0
+
+
+class RunMetrics:
+    """Counters and timings for a single analysis run"""
+
+    def __init__(self):
+        self.stages: Dict[str, dict] = {}
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.peak_rss_mb = 0.0
+        self._started_wall = time.perf_counter()
+        self._started_cpu = time.process_time()
+        self._token = None
+
+    def activate(self):
+        """Make this the current run's metrics (for code running in this context)"""
+        self._token = _current.set(self)
+        self.sample_memory()
+        return self
+
+    def deactivate(self):
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+
+    def sample_memory(self) -> float:
+        rss = _memory_usage_mb()
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        return rss
+
+    @contextmanager
+    def stage(self, name: str, points_in: Optional[int] = None):
+        """Time a stage; set record['points_out'] (and anything else) inside the block"""
+        record = {"points_in": points_in, "points_out": None}
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu, 4)
+            record["rss_mb"] = round(self.sample_memory(), 1)
+            # A stage can run twice (e.g. transport modes around an aggregate seal); sum them
+            previous = self.stages.get(name)
+            if previous:
+                for key in ("wall_s", "cpu_s"):
+                    record[key] = round(record[key] + previous[key], 4)
+                for key in ("points_in", "points_out"):
+                    if previous.get(key) is not None and record.get(key) is not None:
+                        record[key] += previous[key]
+            self.stages[name] = record
+
+    def count(self, name: str, amount: int = 1):
+        self.counters[name] += amount
+
+    def record_request(self, api: str, seconds: float, ok: bool = True):
+        self.latencies[api].append(seconds)
+        if not ok:
+            self.errors[api] += 1
+        if sum(len(v) for v in self.latencies.values()) % RSS_SAMPLE_EVERY == 0:
+            self.sample_memory()
+
+    def to_dict(self) -> dict:
+        api = {}
+        for name in sorted(self.latencies):
+            latencies_ms = np.array(self.latencies[name], dtype=np.float64) * 1000
+            summary = {
+                "requests": int(latencies_ms.size),
+                "errors": self.errors.get(name, 0),
+            }
+            if latencies_ms.size:
+                p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+                summary.update({"p50_ms": round(float(p50), 2), "p90_ms": round(float(p90), 2),
+                                "p99_ms": round(float(p99), 2), "max_ms": round(float(latencies_ms.max()), 2)})
+            api[name] = summary
+
+        hits = self.counters.get("geocode_cache_hits", 0)
+        misses = self.counters.get("geocode_cache_misses", 0)
+        return {
+            "total_wall_s": round(time.perf_counter() - self._started_wall, 4),
+            "total_cpu_s": round(time.process_time() - self._started_cpu, 4),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "stages": self.stages,
+            "cache": {
+                "geocode_hits": hits,
+                "geocode_misses": misses,
+                "geocode_hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+                "jump_index_hits": self.counters.get("jump_index_hits", 0),
+                "water_mask_hits": self.counters.get("water_mask_hits", 0),
+            },
+            "api": api,
+        }
+
+    def write(self, output_dir: str, summary: Optional[dict] = None, filename: str = "run_metrics.json") -> str:
+        """Write to_dict() (or an already taken summary) as JSON into output_dir"""
+        path = os.path.join(output_dir, filename)
+        os.makedirs(output_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(summary if summary is not None else self.to_dict(), f, indent=2)
+        return path
+
+
+def current_metrics() -> Optional[RunMetrics]:
+    """Metrics of the run executing in this context, if any"""
+    return _current.get()
+
+
+@contextmanager
+def timed_request(api: str):
+    """Record the latency of one API request against the current run, if any"""
+    metrics = _current.get()
+    started = time.perf_counter()
+    outcome = {"ok": True}
+    try:
+        yield outcome
+    except asyncio.CancelledError:
+        metrics = None  # abandoned, not a failed request
+        raise
+    except Exception:
+        outcome["ok"] = False
+        raise
+    finally:
+        if metrics is not None:
+            metrics.record_request(api, time.perf_counter() - started, outcome["ok"])
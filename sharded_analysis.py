@@ -0,0 +1,298 @@
+# sharded_analysis.py - Month-sharded analysis across a process pool
+"""
+Map-reduce form of LocationAnalyzer.analyze_location_history, used when
+AnalysisConfig.shard_workers is above 1. The parsed, time-sorted points are
+cut into UTC month shards and the CPU-bound stages run on the shards in a
+process pool:
+
+    parse      - in the parent: shards need the whole sorted stream
+    filter     - each worker runs the significance filter on its shard as if
+                 the shard started the history; the parent then re-runs each
+                 shard from the true last kept point of the shard before it
+                 until the two runs keep the same point, after which they agree
+    geocode    - workers look up their shard's cells in the geocode cache and
+                 report cells the cache doesn't have; the parent requests those
+                 from the API once and the affected shards are run again
+    aggregate  - workers find the city jumps and dwell intervals inside their
+                 shard; the parent adds the jump and interval across each
+                 boundary (the last resolved point of one shard paired with the
+                 first of the next) and totals the intervals in time order
+
+Totals are summed over all intervals in the parent rather than added up from
+per-shard totals, so every number (and every CSV) matches a serial run
+exactly. Transport-mode classification keeps its pairing state from one jump
+to the next and runs in the parent on the joined results.
+
+Incremental aggregates, checkpoints and pipeline mode keep their serial code
+paths; the analyzer falls back to one process when any of them is enabled.
+"""
+
+import asyncio
+import concurrent.futures
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from location_analyzer import (LocationAnalyzer, LocationJump, GeocodedPoints, city_label, state_label,
+                               point_columns, elapsed_seconds, sum_by_code)
+from run_metrics import RunMetrics
+
+_worker_analyzer: Optional[LocationAnalyzer] = None
+
+
+def month_shards(timestamps: np.ndarray) -> List[Tuple[int, int]]:
+    """[lo, hi) index ranges of sorted int64 ns timestamps, one per UTC calendar month"""
+    if timestamps.size == 0:
+        return []
+    months = timestamps.astype("datetime64[ns]").astype("datetime64[M]").astype(np.int64)
+    bounds = [0] + (np.flatnonzero(np.diff(months)) + 1).tolist() + [len(timestamps)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def filter_columns(timestamps: np.ndarray, lats: np.ndarray, lons: np.ndarray, min_distance: float,
+                   min_time: float, last: Optional[Tuple[int, float, float]] = None,
+                   settled: Optional[List[int]] = None) -> List[int]:
+    """
+    SignificantPointFilter over point columns; returns the kept indices.
+    `last` is the (timestamp, lat, lon) kept just before these points. Once a
+    kept index is also in `settled` (the indices an earlier run kept), the
+    rest of `settled` is returned as is: from the same kept point on, both
+    runs make the same decisions.
+    """
+    times, lat_values, lon_values = timestamps.tolist(), lats.tolist(), lons.tolist()
+    settled_at = {index: position for position, index in enumerate(settled)} if settled else {}
+    kept = []
+    for i, timestamp in enumerate(times):
+        if last is not None:
+            distance = LocationAnalyzer.haversine_distance(last[1], last[2], lat_values[i], lon_values[i])
+            time_diff = (timestamp - last[0]) // 1000 / 1e6 / 3600
+            if not (distance > min_distance or time_diff > min_time):
+                continue
+        position = settled_at.get(i)
+        if position is not None:
+            return kept + list(settled[position:])
+        kept.append(i)
+        last = (timestamp, lat_values[i], lon_values[i])
+    return kept
+
+
+def _init_worker(config):
+    global _worker_analyzer
+    _worker_analyzer = LocationAnalyzer(config)
+
+
+def filter_shard(timestamps: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                 min_distance: float, min_time: float) -> List[int]:
+    """Worker: significance filter over one shard, starting from its first point"""
+    return filter_columns(timestamps, lats, lons, min_distance, min_time)
+
+
+def aggregate_shard(timestamps: np.ndarray, lats: np.ndarray, lons: np.ndarray,
+                    resolved_cells: Dict[str, object]) -> dict:
+    """
+    Worker: geocode one shard's kept points from the cache (plus the
+    parent's `resolved_cells`) and find its jumps and dwell intervals.
+    Returns {'missing': [cache keys]} when some cell still needs the API.
+    """
+    analyzer = _worker_analyzer
+    coord_keys, inverse = analyzer._cell_keys(*analyzer._quantize_columns(lats, lons))
+    outcomes, missing = [], []
+    for coord_key in coord_keys:
+        if coord_key in resolved_cells:
+            outcomes.append(resolved_cells[coord_key])
+        elif coord_key in analyzer.geocode_cache:
+            outcomes.append(analyzer.geocode_cache[coord_key])
+        else:
+            missing.append(coord_key)
+    if missing:
+        return {'missing': missing}
+
+    geocoded = GeocodedPoints.from_cell_outcomes(inverse, outcomes)
+    city_codes, city_labels = geocoded.label_codes(city_label)
+    state_codes, state_labels = geocoded.label_codes(state_label)
+    resolved = np.flatnonzero(city_codes >= 0)
+    codes = city_codes[resolved]
+
+    # Jumps inside the shard, as in LocationAnalyzer.calculate_jumps
+    jumps = []
+    changes = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    if changes.size:
+        from_points, to_points = resolved[changes - 1], resolved[changes]
+        durations = elapsed_seconds(timestamps[to_points] - timestamps[from_points]) / 3600
+        for k, (i, j) in enumerate(zip(from_points.tolist(), to_points.tolist())):
+            distance = LocationAnalyzer.haversine_distance(lats[i], lons[i], lats[j], lons[j])
+            if distance > 10:
+                jumps.append((city_labels[city_codes[i]], city_labels[city_codes[j]],
+                              distance, float(durations[k]), j))
+
+    return {
+        'location_ids': geocoded.location_ids,
+        'locations': geocoded.locations,
+        'cache_hits': len(coord_keys) - sum(coord_key in resolved_cells for coord_key in coord_keys),
+        'resolved': resolved,
+        'city_codes': codes,
+        'state_codes': state_codes[resolved],
+        'city_labels': city_labels,
+        'state_labels': state_labels,
+        'time_diffs': elapsed_seconds(np.diff(timestamps[resolved])) / (24 * 3600),  # days
+        'jumps': jumps,
+    }
+
+
+class _LabelTable:
+    """Labels interned across shards, so the totals can be summed with one sum_by_code"""
+
+    def __init__(self):
+        self.labels: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def code(self, label: str) -> int:
+        if label not in self.index:
+            self.index[label] = len(self.labels)
+            self.labels.append(label)
+        return self.index[label]
+
+    def remap(self, labels: List[str], codes: np.ndarray) -> np.ndarray:
+        return np.array([self.code(label) for label in labels], dtype=np.int64)[codes]
+
+
+async def run_sharded(analyzer: LocationAnalyzer, file_path: str, start_date, end_date, output_dir: str,
+                      metrics: RunMetrics) -> dict:
+    """Sharded run for LocationAnalyzer._analyze; returns the same result dict"""
+    config = analyzer.config
+    loop = asyncio.get_running_loop()
+
+    # 1. Parse (serial: shards are cut from the sorted stream)
+    with metrics.stage("parse") as stage:
+        points = analyzer.parse_location_data(file_path, start_date, end_date)
+        stage['points_out'] = len(points)
+    analyzer._log(f"Found {len(points)} location points")
+    timestamps, lats, lons = point_columns(points)
+    shards = month_shards(timestamps)
+    analyzer._log(f"🗺️ Processing {len(shards)} month shards on {config.shard_workers} workers")
+    analyzer._check_cancelled()
+
+    executor = concurrent.futures.ProcessPoolExecutor(max_workers=config.shard_workers,
+                                                      initializer=_init_worker, initargs=(config,))
+
+    async def run_all(fn, calls):
+        return await analyzer._gather_cancellable(*(loop.run_in_executor(executor, fn, *args) for args in calls))
+
+    try:
+        # 2. Significance filter: speculative per shard, then chained across shards
+        with metrics.stage("filter", points_in=len(points)) as stage:
+            stage['shards'] = len(shards)
+            speculative = await run_all(filter_shard, [
+                (timestamps[lo:hi], lats[lo:hi], lons[lo:hi], config.min_distance_filter, config.min_time_filter)
+                for lo, hi in shards])
+            shard_kept = []
+            last = None
+            for (lo, hi), settled in zip(shards, speculative):
+                kept = filter_columns(timestamps[lo:hi], lats[lo:hi], lons[lo:hi], config.min_distance_filter,
+                                      config.min_time_filter, last, settled)
+                kept = np.asarray(kept, dtype=np.int64) + lo
+                if kept.size:
+                    last = (int(timestamps[kept[-1]]), float(lats[kept[-1]]), float(lons[kept[-1]]))
+                shard_kept.append(kept)
+            kept_indices = np.concatenate(shard_kept) if shard_kept else np.zeros(0, dtype=np.int64)
+            filtered_points = [points[i] for i in kept_indices.tolist()]
+            stage['points_out'] = len(filtered_points)
+        analyzer._log(f"Filtered to {len(filtered_points)} significant points")
+        del points
+        analyzer._check_cancelled()
+
+        # 3-4. Geocode from the cache and aggregate per shard; cache misses go to the API once
+        shard_kept = [kept for kept in shard_kept if kept.size]
+        calls = [(timestamps[kept], lats[kept], lons[kept], {}) for kept in shard_kept]
+        with metrics.stage("shard_reports", points_in=len(filtered_points)) as stage:
+            stage['shards'] = len(calls)
+            parts = await run_all(aggregate_shard, calls)
+            missing = sorted({coord_key for part in parts for coord_key in part.get('missing', [])})
+            stage['cache_misses'] = len(missing)
+        if missing:
+            with metrics.stage("geocode", points_in=len(missing)) as stage:
+                outcomes = await analyzer._resolve_cells(missing)
+                resolved_cells = dict(zip(missing, outcomes))
+                stage['points_out'] = sum(outcome is not None for outcome in outcomes)
+            analyzer._check_cancelled()
+            retry = [k for k, part in enumerate(parts) if 'missing' in part]
+            with metrics.stage("shard_reports") as stage:
+                stage['shards_retried'] = len(retry)
+                retried = await run_all(aggregate_shard, [
+                    calls[k][:3] + ({coord_key: resolved_cells[coord_key] for coord_key in parts[k]['missing']},)
+                    for k in retry])
+            for k, part in zip(retry, retried):
+                parts[k] = part
+        metrics.count("geocode_cache_hits", sum(part['cache_hits'] for part in parts))
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # 5. Reduce: join the shards, adding each boundary's jump and interval
+    with metrics.stage("reduce", points_in=len(filtered_points)) as stage:
+        city_table, state_table = _LabelTable(), _LabelTable()
+        jumps: List[LocationJump] = []
+        city_codes, state_codes, time_diffs = [], [], []
+        previous = None  # (global index, city code, state code) of the last resolved point so far
+        offset = 0  # position of the shard's first kept point in filtered_points
+        for kept, part in zip(shard_kept, parts):
+            resolved = part['resolved']
+            if resolved.size:
+                shard_city = city_table.remap(part['city_labels'], part['city_codes'])
+                shard_state = state_table.remap(part['state_labels'], part['state_codes'])
+                first = int(kept[resolved[0]])
+                if previous is not None:
+                    p, p_city, p_state = previous
+                    span = elapsed_seconds(np.array([timestamps[first] - timestamps[p]]))
+                    city_codes.append(np.array([p_city]))
+                    state_codes.append(np.array([p_state]))
+                    time_diffs.append(span / (24 * 3600))
+                    if p_city != shard_city[0]:
+                        distance = LocationAnalyzer.haversine_distance(lats[p], lons[p], lats[first], lons[first])
+                        if distance > 10:
+                            jumps.append(LocationJump(city_table.labels[p_city], city_table.labels[shard_city[0]],
+                                                      distance, float(span[0] / 3600),
+                                                      filtered_points[offset + int(resolved[0])].timestamp))
+                jumps.extend(LocationJump(from_label, to_label, distance, duration,
+                                          filtered_points[offset + j].timestamp)
+                             for from_label, to_label, distance, duration, j in part['jumps'])
+                city_codes.append(shard_city[:-1])
+                state_codes.append(shard_state[:-1])
+                time_diffs.append(part['time_diffs'])
+                previous = (int(kept[resolved[-1]]), int(shard_city[-1]), int(shard_state[-1]))
+            offset += kept.size
+        
+        if city_codes:
+            city_codes, state_codes, time_diffs = (np.concatenate(city_codes), np.concatenate(state_codes),
+                                                   np.concatenate(time_diffs))
+        city_time = sum_by_code(city_codes, time_diffs, city_table.labels)
+        state_time = sum_by_code(state_codes, time_diffs, state_table.labels)
+        geocoded = GeocodedPoints.concat([GeocodedPoints(part['location_ids'], part['locations']) for part in parts])
+        stage['points_out'] = len(jumps)
+    analyzer._log(f"Geocoded {geocoded.resolved_count} locations")
+    analyzer._check_cancelled()
+
+    mode_jumps = None
+    if config.infer_transport_modes:
+        with metrics.stage("transport_modes", points_in=len(filtered_points)) as stage:
+            mode_jumps = await analyzer.classify_jump_modes(filtered_points, geocoded)
+            stage['points_out'] = len(mode_jumps)
+        analyzer._log(f"Classified {len(mode_jumps)} jumps by transport mode")
+    analyzer._check_cancelled()
+
+    total_distance = sum(jump.distance_miles for jump in jumps)
+    analyzer._log(f"Total distance: {total_distance:.2f} miles")
+    analyzer._log(f"Total jumps: {len(jumps)}")
+
+    with metrics.stage("export"):
+        analyzer._export_results(jumps, city_time, state_time, output_dir, mode_jumps)
+
+    result = {
+        'total_distance': total_distance,
+        'total_jumps': len(jumps),
+        'cities_visited': len(city_time),
+        'jumps': jumps
+    }
+    if mode_jumps is not None:
+        modes = [jump.mode for jump in mode_jumps]
+        result['mode_counts'] = {mode: modes.count(mode) for mode in sorted(set(modes))}
+    return result
@@ -0,0 +1,134 @@
+# transport_modes.py - Shared transport-mode rules for city jumps
+"""
+Mode mapping and override rules used to label city jumps with a transport mode.
+
+Google activity types are carried through parsing as small integer codes into
+ACTIVITY_MODES, and the rules below are applied to whole arrays of jumps at
+once. Classification runs in two steps: initial_modes() applies everything
+that needs no water probe and reports which jumps still need one, and
+finalize_modes() applies the water verdicts plus the duration/distance
+sanity checks.
+"""
+
+import numpy as np
+
+MODE_MAP = {
+    "in train": "Train",
+    "in passenger vehicle": "Car",
+    "walking": "Walking",
+    "in ferry": "Ferry",
+    "slow_mobility": "Walking",
+    "fast_mobility": "Car",
+    "medium_mobility": "Car",
+    "flying": "Flight",
+    "sailing": "Ferry",
+    "skiing": "Unknown",
+    "unknown": "Unknown",
+    "in subway": "Train",
+    "in tram": "Train",
+    "stationary": "Walking"
+}
+
+COASTAL_COUNTRIES = ["Croatia", "Montenegro"]
+RELIABLE_MODES = ["Flight", "Train", "Ferry", "Walking"]
+
+# Code 0 is "unknown"; anything unrecognised shares the trailing "other" code,
+# which no rule tests for, so it behaves exactly like the raw string would.
+ACTIVITY_MODES = ["unknown"] + [name for name in MODE_MAP if name != "unknown"] + ["other"]
+UNKNOWN_CODE = 0
+OTHER_CODE = len(ACTIVITY_MODES) - 1
+_ACTIVITY_CODES = {name: code for code, name in enumerate(ACTIVITY_MODES)}
+_MAPPED_MODE_BY_CODE = np.array([MODE_MAP.get(name, "Unknown") for name in ACTIVITY_MODES])
+
+
+def activity_code(raw_mode) -> int:
+    """
+    Compact code for a Google activity type, matched case-insensitively
+    against MODE_MAP like the legacy engine does: "in ferry" and "FLYING"
+    are known, "IN_FERRY" is not and maps to Unknown.
+    """
+    if not raw_mode:
+        return UNKNOWN_CODE
+    return _ACTIVITY_CODES.get(str(raw_mode).lower(), OTHER_CODE)
+
+
+def jump_place_label(city, state, country) -> str:
+    """Place label used in city_jumps_with_mode.csv"""
+    if country != "United States" and country:
+        return f"{city}, {country}" if city != "Unknown" else country
+    return f"{city}, {state}, USA"
+
+
+def place_country(label: str) -> str:
+    """Country part of a jump_place_label() label"""
+    return label.split(", ")[-1] if ", " in label else label
+
+
+def water_sample_points(lat1, lon1, lat2, lon2, distance):
+    """Points probed for water along a jump: ends plus the midpoint for short hops"""
+    if distance < 10:
+        return [(lat1, lon1), ((lat1 + lat2) / 2, (lon1 + lon2) / 2), (lat2, lon2)]
+    return [(lat1, lon1), (lat2, lon2)]
+
+
+def initial_modes(mode_codes, distances, durations, from_countries, to_countries):
+    """
+    Map activity codes to modes and apply the overrides that need no water probe.
+    Returns (modes, needs_water) arrays.
+    """
+    codes = np.asarray(mode_codes, dtype=np.int64)
+    distances = np.asarray(distances, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    from_countries = np.asarray(from_countries, dtype=str)
+    to_countries = np.asarray(to_countries, dtype=str)
+
+    modes = _MAPPED_MODE_BY_CODE[codes].astype(object)
+    open_modes = ~np.isin(modes.astype(str), RELIABLE_MODES)
+
+    vehicle_or_unknown = np.isin(codes, [_ACTIVITY_CODES["in passenger vehicle"], UNKNOWN_CODE])
+    unknown_or_walking = np.isin(codes, [UNKNOWN_CODE, _ACTIVITY_CODES["walking"]])
+    is_international = (to_countries != from_countries) & (to_countries != "Unknown") & (from_countries != "Unknown")
+    coastal = np.isin(to_countries, COASTAL_COUNTRIES)
+
+    flight = open_modes & vehicle_or_unknown & is_international & ((distances > 20) | (durations < 1.5))
+    boat = open_modes & ~flight & unknown_or_walking & coastal & (distances < 2)
+    needs_water = open_modes & ~flight & ~boat & (distances > 0.5) & (distances < 100)
+
+    modes[flight] = "Flight"
+    modes[boat] = "Boat"
+    return modes, needs_water
+
+
+def finalize_modes(modes, needs_water, is_water, distances, durations, to_countries, place_names):
+    """Apply water verdicts for probed jumps, then the duration/distance sanity rules"""
+    modes = np.array(modes, dtype=object)
+    needs_water = np.asarray(needs_water, dtype=bool)
+    is_water = np.asarray(is_water, dtype=bool)
+    distances = np.asarray(distances, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    coastal = np.isin(np.asarray(to_countries, dtype=str), COASTAL_COUNTRIES)
+    inland = np.array(["inland" in str(name).lower() for name in place_names], dtype=bool)
+
+    watery = needs_water & (is_water | (coastal & (distances < 2)))
+    coastal_context = needs_water & ~watery & coastal & (distances > 2) & ~inland
+    driven = needs_water & ~watery & ~coastal_context & (distances > 2)
+    walked = needs_water & ~watery & ~coastal_context & ~driven
+
+    modes[watery] = np.where(distances[watery] > 2, "Ferry", "Boat")
+    modes[coastal_context] = "Ferry"
+    modes[driven] = "Car"
+    modes[walked] = "Walking"
+
+    # Time-based validation
+    too_fast = np.isin(modes.astype(str), ["Ferry", "Car", "Train"]) & (durations < 0.5) & (distances > 10)
+    modes[too_fast] = "Flight"
+
+    # Restrict Walking
+    too_far = (modes == "Walking") & ((distances > 2) | (durations > 0.5))
+    modes[too_far] = "Car"
+    return modes
+
+
+def place_suggests_water(place_name) -> bool:
+    name = (place_name or "").lower()
+    return "waters" in name or "sea" in name
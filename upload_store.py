@@ -0,0 +1,142 @@
+# upload_store.py - Content-addressed uploads and the web app's result cache
+"""
+save_upload() streams an uploaded file to disk in chunks while hashing it,
+and stores it under its SHA-256 digest. Re-uploads of the same export
+share one file instead of adding a copy each. RecentUploads remembers
+when each stored file was last uploaded, so the retention sweep counts a
+re-upload as fresh. The file itself is left untouched: its modification
+time is part of a run checkpoint's input identity (run_checkpoint.py),
+and changing it would make an interrupted analysis start over.
+
+result_key() combines that digest with the date range, the analysis
+settings and the engine version into the key of a finished result. The
+settings include a fingerprint of the geocoding API keys, so a corrected
+key gets a fresh run. ResultCache maps keys to the analysis that produced
+them, or that is still producing them, so an identical request can be
+sent to the existing results or attach to the analysis in flight.
+
+Only results worth showing again are cached: resolved_places() checks
+that the reports name at least one place, which a run whose geocoding
+failed throughout (bad key, API down) does not.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import BinaryIO, Dict, Optional, Set, Tuple
+
+CHUNK_SIZE = 1024 * 1024  # bytes read from the upload stream at a time
+
+# Reports listing the places of a result, and their columns holding place names
+PLACE_REPORTS = (("by_city_location_days.csv", ("Location",)), ("city_jumps_with_mode.csv", ("From", "To")))
+
+
+def save_upload(stream: BinaryIO, folder: str, suffix: str = ".json") -> Tuple[str, str, bool]:
+    """
+    Write stream to folder/<sha256><suffix>, hashing as it is written.
+    Returns (digest, path, existed); when the content was already stored
+    the new copy is dropped and existed is True.
+    """
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = os.path.join(folder, f".upload-{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        content_hash = digest.hexdigest()
+        path = os.path.join(folder, f"{content_hash}{suffix}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return content_hash, path, True
+        os.replace(tmp_path, path)
+        return content_hash, path, False
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def result_key(content_hash: str, start_date, end_date, settings: dict, engine: str) -> str:
+    """Digest identifying the result of analyzing one input with one set of parameters"""
+    key = {
+        "content": content_hash,
+        "start": str(start_date),
+        "end": str(end_date),
+        "settings": settings,
+        "engine": engine
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def key_fingerprint(api_key: str) -> str:
+    """Short digest telling API keys apart in result keys without storing them ('' when unset)"""
+    api_key = api_key.strip()
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16] if api_key else ""
+
+
+def resolved_places(output_dir: str) -> bool:
+    """Whether the reports in output_dir name a place; failed lookups are reported as "Unknown" or left out"""
+    for name, columns in PLACE_REPORTS:
+        try:
+            with open(os.path.join(output_dir, name), "r", encoding="utf-8", newline="") as f:
+                for row in csv.DictReader(f):
+                    for column in columns:
+                        place = (row.get(column) or "").strip()
+                        if place and not place.startswith("Unknown"):
+                            return True
+        except OSError:
+            continue
+    return False
+
+
+class ResultCache:
+    """Result key -> analysis id, safe to use from request and worker threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._analyses: Dict[str, str] = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._analyses.get(key)
+
+    def put(self, key: str, analysis_id: str):
+        with self._lock:
+            self._analyses[key] = analysis_id
+
+    def discard(self, key: str, analysis_id: str):
+        """Forget key, unless it has meanwhile been taken over by another analysis"""
+        with self._lock:
+            if self._analyses.get(key) == analysis_id:
+                del self._analyses[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._analyses)
+
+
+class RecentUploads:
+    """Stored upload path -> when it was last uploaded, safe to use from request and sweep threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._uploaded: Dict[str, float] = {}
+
+    def touch(self, path: str):
+        with self._lock:
+            self._uploaded[os.path.abspath(path)] = time.time()
+
+    def since(self, cutoff: float) -> Set[str]:
+        """Absolute paths uploaded after cutoff; older ones are forgotten"""
+        with self._lock:
+            self._uploaded = {path: at for path, at in self._uploaded.items() if at > cutoff}
+            return set(self._uploaded)
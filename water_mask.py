@@ -0,0 +1,124 @@
+# water_mask.py - Offline land/water classifier backed by a memory-mapped bit raster
+"""
+Local replacement for remote "is it water?" lookups.
+
+The operator supplies a global land/water raster (for example a downsampled
+coastline mask) converted with build_water_mask() into two files:
+
+    water_mask.bin   - row-major bit array, 1 = water, north-west origin
+    water_mask.json  - sidecar with the raster width and height
+
+The bit array is memory-mapped, so loading is instant and lookups are O(1).
+A cell only counts as decided when its whole 3x3 neighbourhood agrees; cells
+on a land/water boundary come back as AMBIGUOUS and callers should fall back
+to the remote API for those.
+"""
+
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+LAND = 0
+WATER = 1
+AMBIGUOUS = -1
+
+DEFAULT_MASK_FILE = "config/water_mask.bin"
+MASK_PATH_ENV = "LOCATION_ANALYZER_WATER_MASK"
+
+_NEIGHBOUR_OFFSETS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class WaterMask:
+    """Memory-mapped equirectangular land/water bit raster"""
+
+    def __init__(self, path: str):
+        with open(_sidecar_path(path), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.path = path
+        self.width = int(meta["width"])
+        self.height = int(meta["height"])
+        self.bits = np.memmap(path, dtype=np.uint8, mode="r")
+        if self.bits.size * 8 < self.width * self.height:
+            raise ValueError(f"{path} is smaller than its {self.width}x{self.height} sidecar declares")
+
+    def _cells(self, lats: np.ndarray, lons: np.ndarray):
+        rows = np.floor((90.0 - lats) / 180.0 * self.height).astype(np.int64)
+        cols = np.floor((lons + 180.0) / 360.0 * self.width).astype(np.int64)
+        return np.clip(rows, 0, self.height - 1), cols % self.width
+
+    def _bits_at(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        index = rows * self.width + cols
+        return (self.bits[index >> 3] >> (7 - (index & 7))) & 1
+
+    def classify(self, lats, lons) -> np.ndarray:
+        """Vectorized lookup returning LAND, WATER or AMBIGUOUS per point"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        rows, cols = self._cells(lats, lons)
+        centre = self._bits_at(rows, cols)
+
+        uniform = np.ones(centre.shape, dtype=bool)
+        for dr, dc in _NEIGHBOUR_OFFSETS:
+            neighbour_rows = np.clip(rows + dr, 0, self.height - 1)
+            neighbour_cols = (cols + dc) % self.width
+            uniform &= self._bits_at(neighbour_rows, neighbour_cols) == centre
+
+        return np.where(uniform, centre, AMBIGUOUS).astype(np.int8)
+
+    def is_water(self, lat: float, lon: float) -> Optional[bool]:
+        """Scalar lookup: True/False when the mask is decisive, None near coastlines"""
+        verdict = int(self.classify([lat], [lon])[0])
+        if verdict == AMBIGUOUS:
+            return None
+        return verdict == WATER
+
+
+def _sidecar_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def build_water_mask(water, path: str):
+    """
+    Write a boolean (height, width) array as a mask file plus sidecar.
+    Row 0 is the northernmost band, column 0 starts at longitude -180.
+    """
+    water = np.asarray(water, dtype=bool)
+    if water.ndim != 2:
+        raise ValueError("Water raster must be a 2-D (height, width) array")
+    height, width = water.shape
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.packbits(water.ravel()).tofile(path)
+    with open(_sidecar_path(path), "w", encoding="utf-8") as f:
+        json.dump({"width": width, "height": height}, f, indent=2)
+
+
+_loaded_mask = None
+_mask_checked = False
+
+
+def get_water_mask() -> Optional[WaterMask]:
+    """Return the operator-supplied mask, or None when none is installed"""
+    global _loaded_mask, _mask_checked
+    if not _mask_checked:
+        _mask_checked = True
+        path = os.environ.get(MASK_PATH_ENV, DEFAULT_MASK_FILE)
+        if os.path.exists(path):
+            try:
+                _loaded_mask = WaterMask(path)
+                print(f"Loaded {_loaded_mask.width}x{_loaded_mask.height} water mask from {path}")
+            except Exception as e:
+                print(f"⚠️ Failed to load water mask {path}: {e}")
+    return _loaded_mask
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python water_mask.py <water_raster.npy> <output.bin>")
+        print("The .npy raster is a boolean (height, width) array, True = water, north-west origin.")
+        sys.exit(1)
+    build_water_mask(np.load(sys.argv[1]), sys.argv[2])
+    print(f"Wrote {sys.argv[2]} and {_sidecar_path(sys.argv[2])}")